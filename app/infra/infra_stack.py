@@ -1,8 +1,15 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
+import json
+import os
+import shutil
+
+import jsii
 from aws_cdk import (
+    BundlingOptions,
     Duration,
+    ILocalBundling,
     Stack,
     aws_s3 as s3,
     RemovalPolicy,
@@ -13,6 +20,9 @@ from aws_cdk import (
     aws_stepfunctions_tasks as tasks,
     aws_iam as iam,
     aws_sns as sns,
+    aws_sqs as sqs,
+    aws_cloudwatch as cloudwatch,
+    aws_cloudwatch_actions as cloudwatch_actions,
     aws_ssm as ssm,
     aws_sns_subscriptions as subscriptions,
     aws_bedrock as bedrock,
@@ -26,18 +36,134 @@ from constructs import Construct
 
 from webapp.utils.config_file import Config
 
+# Package of the prompt builders and speech metrics, shared by the Lambda function and the webapp
+SPEECH_ANALYSIS_PACKAGE = "./speech_analysis"
+
+@jsii.implements(ILocalBundling)
+class LayerPackageBundling:
+    """
+    Copies a Python package to the python folder of a Lambda layer, which
+    needs no Docker as the package only depends on the standard library.
+    """
+
+    def __init__(self, package_path):
+        self.package_path = package_path
+
+    def try_bundle(self, output_dir, *, image, **kwargs):
+        shutil.copytree(self.package_path, os.path.join(output_dir, "python", os.path.basename(self.package_path)),
+                        ignore=shutil.ignore_patterns("__pycache__"))
+        return True
+
 class InfraStack(Stack):
 
-    def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str,
+                 upload_mode: str = Config.UPLOAD_MODE,
+                 result_cache_ttl_days: int = Config.RESULT_CACHE_TTL_DAYS,
+                 prompt_cache_ttl_days: int = Config.PROMPT_CACHE_TTL_DAYS,
+                 transcription_completion: str = Config.TRANSCRIPTION_COMPLETION,
+                 transcription_poll_delays: list = Config.TRANSCRIPTION_POLL_DELAYS_SECONDS,
+                 pipeline_mode: str = Config.PIPELINE_MODE,
+                 speech_analyses: list = Config.SPEECH_ANALYSES,
+                 chunk_max_words: int = Config.CHUNK_MAX_WORDS,
+                 chunk_max_seconds: int = Config.CHUNK_MAX_SECONDS,
+                 chunk_overlap_words: int = Config.CHUNK_OVERLAP_WORDS,
+                 chunk_max_concurrency: int = Config.CHUNK_MAX_CONCURRENCY,
+                 speech_metrics_layer_arn: str = Config.SPEECH_METRICS_LAYER_ARN,
+                 lambda_warm_start: str = Config.LAMBDA_WARM_START,
+                 lambda_provisioned_concurrency: int = Config.LAMBDA_PROVISIONED_CONCURRENCY,
+                 payload_inline_max_bytes: int = Config.PAYLOAD_INLINE_MAX_BYTES,
+                 bedrock_prompt_caching: bool = Config.BEDROCK_PROMPT_CACHING,
+                 batch_inference: bool = Config.BATCH_INFERENCE,
+                 batch_min_records: int = Config.BATCH_MIN_RECORDS,
+                 admission_control: bool = Config.ADMISSION_CONTROL,
+                 max_in_flight_executions: int = Config.MAX_IN_FLIGHT_EXECUTIONS,
+                 throttling_retry_max_attempts: int = Config.THROTTLING_RETRY_MAX_ATTEMPTS,
+                 bedrock_fallback_model_id: str = Config.BEDROCK_FALLBACK_MODEL_ID,
+                 bedrock_model_routes: list = Config.BEDROCK_MODEL_ROUTES,
+                 **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        # Browsers uploading with presigned requests need CORS on the bucket
+        cors_rules = None
+        if upload_mode == "direct":
+            cors_rules = [s3.CorsRule(allowed_methods=[s3.HttpMethods.POST, s3.HttpMethods.PUT],
+                                      allowed_origins=Config.WEBAPP_ORIGINS,
+                                      allowed_headers=["*"],
+                                      exposed_headers=["ETag"],
+                                      max_age=3000)]
+
+        # Cached results and Bedrock responses are evicted once they are older than their cache TTL
+        lifecycle_rules = []
+        if result_cache_ttl_days:
+            lifecycle_rules.append(s3.LifecycleRule(id="ExpireResultCache",
+                                                    prefix="result-cache/",
+                                                    expiration=Duration.days(result_cache_ttl_days)))
+        if prompt_cache_ttl_days:
+            lifecycle_rules.append(s3.LifecycleRule(id="ExpirePromptCache",
+                                                    prefix="bedrock_prompts/cache/",
+                                                    expiration=Duration.days(prompt_cache_ttl_days)))
+
         # Create an S3 bucket
         bucket = s3.Bucket(self, "PublicSpeakingMentorAIAssistantBucket",
                           event_bridge_enabled=True,
+                          cors=cors_rules,
+                          lifecycle_rules=lifecycle_rules or None,
                           removal_policy=RemovalPolicy.DESTROY,  # Set the removal policy
                           auto_delete_objects=True  # Automatically delete objects when the bucket is deleted
         )
 
+        # Log level, truncation and sampling of the verbose dumps of the Lambda functions
+        log_environment = {
+            "LOG_LEVEL": Config.LAMBDA_LOG_LEVEL,
+            "LOG_MAX_CHARS": str(Config.LAMBDA_LOG_MAX_CHARS),
+            "LOG_SAMPLE_RATE": str(Config.LAMBDA_LOG_SAMPLE_RATE)
+        }
+
+        # The prompt builders and speech metrics, imported by the webapp too, are deployed as a layer
+        speech_analysis_layer = _lambda.LayerVersion(self, "SpeechAnalysisLayer",
+            description="Prompt builders and speech metrics of Public Speaking GenAI Assistant",
+            compatible_runtimes=[_lambda.Runtime.PYTHON_3_12],
+            code=_lambda.Code.from_asset(SPEECH_ANALYSIS_PACKAGE, bundling=BundlingOptions(
+                image=_lambda.Runtime.PYTHON_3_12.bundling_image,
+                command=["bash", "-c", "mkdir -p /asset-output/python/speech_analysis && cp -r /asset-input/. /asset-output/python/speech_analysis"],
+                local=LayerPackageBundling(SPEECH_ANALYSIS_PACKAGE)
+            ))
+        )
+        layers = [speech_analysis_layer]
+
+        # NumPy, needed to measure the delivery metrics, comes from a Lambda layer
+        if speech_metrics_layer_arn:
+            layers.append(_lambda.LayerVersion.from_layer_version_arn(self, "SpeechMetricsLayer", speech_metrics_layer_arn))
+
+        # Create an SNS topic
+        topic = sns.Topic(self, "PublicSpeakingMentorAIAssistantTopic")
+
+        # Models prompts can be routed to besides the default one, each with the state name
+        # suffix of its branches, taken from the name of its first route
+        routed_models = {}
+        for route in bedrock_model_routes:
+            if route["model_id"] != Config.BEDROCK_MODEL_ID:
+                routed_models.setdefault(route["model_id"], route["name"].title().replace("_", "").replace("-", ""))
+        routing_environment = {}
+        if bedrock_model_routes:
+            model_routes_parameter = ssm.StringParameter(self, "BedrockModelRoutesParameter",
+                description="Routes of the Public Speaking Mentor AI Assistant prompts to a Bedrock model by transcript length and analysis depth",
+                parameter_name="/psmb/bedrock_model_routes",
+                string_value=json.dumps(bedrock_model_routes),
+                tier=ssm.ParameterTier.STANDARD
+            )
+            routing_environment = {
+                "MODEL_ROUTES_PARAMETER": model_routes_parameter.parameter_name,
+                "BEDROCK_MODEL_ID": Config.BEDROCK_MODEL_ID,
+                "BEDROCK_ROUTED_MODEL_IDS": ",".join(routed_models)
+            }
+
+        # With SnapStart or provisioned concurrency, the init phase also imports
+        # NumPy and creates every client, as it runs before the invocations
+        warm_start_environment = {}
+        if lambda_warm_start != "none":
+            warm_start_environment["INIT_WARM_UP"] = "true"
+
         # Create a Lambda function to handle Bedrock prompt generation & large payload sizes
         prepare_bedrock_prompts_lambda = _lambda.Function(self, "prepare_bdrock_prompts",
                                     description="Lambda function invoked from Step Functions to prepare Bedrock prompts for Public Speaking GenAI Assistant",
@@ -45,6 +171,20 @@ class InfraStack(Stack):
                                     handler="prepare_bedrock_prompts.lambda_handler",
                                     timeout=Duration.seconds(30),
                                     architecture=_lambda.Architecture.ARM_64,
+                                    environment={
+                                        "PROMPT_CACHE_TTL_DAYS": str(prompt_cache_ttl_days),
+                                        "CHUNK_MAX_WORDS": str(chunk_max_words),
+                                        "CHUNK_MAX_SECONDS": str(chunk_max_seconds),
+                                        "CHUNK_OVERLAP_WORDS": str(chunk_overlap_words),
+                                        "PAYLOAD_INLINE_MAX_BYTES": str(payload_inline_max_bytes),
+                                        "BEDROCK_PROMPT_CACHING": str(bedrock_prompt_caching).lower(),
+                                        "BATCH_ANALYSES": ",".join(speech_analyses),
+                                        "SNS_TOPIC_ARN": topic.topic_arn,
+                                        **routing_environment,
+                                        **warm_start_environment,
+                                        **log_environment
+                                    },
+                                    layers=layers,
                                     code=_lambda.Code.from_asset("./infra/lambda"))
         
         # Add inline policy to allow Lamnda to read/write to a specific S3 bucket
@@ -54,14 +194,26 @@ class InfraStack(Stack):
                 resources=[bucket.bucket_arn, f"{bucket.bucket_arn}/*"]
             )
         )
+        topic.grant_publish(prepare_bedrock_prompts_lambda)
+        if bedrock_model_routes:
+            model_routes_parameter.grant_read(prepare_bedrock_prompts_lambda)
+        if lambda_warm_start == "snapstart":
+            # This CDK version only allows SnapStart on Java runtimes, Lambda supports it on Python 3.12
+            prepare_bedrock_prompts_lambda.node.default_child.add_property_override("SnapStart", {"ApplyOn": "PublishedVersions"})
+
+        # The state machine invokes an alias of the published version, which is
+        # where SnapStart snapshots and provisioned concurrency apply
+        prepare_bedrock_prompts_function = prepare_bedrock_prompts_lambda
+        if lambda_warm_start != "none":
+            prepare_bedrock_prompts_function = _lambda.Alias(self, "prepare_bedrock_prompts_live",
+                                    alias_name="live",
+                                    version=prepare_bedrock_prompts_lambda.current_version,
+                                    provisioned_concurrent_executions=lambda_provisioned_concurrency if lambda_warm_start == "provisioned" else None)
 
         # Create an IAM role for the Step Functions state machine
         state_machine_role = iam.Role(self, "PublicSpeakingMentorAIAssistantStateMachineRole",
                                      assumed_by=iam.ServicePrincipal("states.amazonaws.com"))
 
-        # Create an SNS topic
-        topic = sns.Topic(self, "PublicSpeakingMentorAIAssistantTopic")
-
         # Create a customer managed IAM policy for CloudWatchLogsDeliveryFullAccess
         sfn_cloudwatch_logs_delivery_policy = iam.ManagedPolicy(self, "CloudWatchLogsDeliveryFullAccessPolicy",
                                                             managed_policy_name="CloudWatchLogsDeliveryFullAccess",
@@ -85,7 +237,51 @@ class InfraStack(Stack):
         # Attach the necessary IAM policies to the role
         state_machine_role.add_managed_policy(sfn_cloudwatch_logs_delivery_policy)
 
+        # Throttled calls are retried with jittered exponential backoff, so the executions throttled
+        # together do not all retry at the same time. Other transient errors get a few quick retries,
+        # and invalid requests, such as a Bedrock ValidationException, are not retried as they would
+        # fail the same way again
+        throttling_errors = {
+            "Bedrock": ["Bedrock.ThrottlingException", "Bedrock.ServiceQuotaExceededException", "Bedrock.ModelNotReadyException"],
+            "Transcribe": ["Transcribe.LimitExceededException"],
+            "Lambda": ["Lambda.TooManyRequestsException"]
+        }
+        # LambdaInvoke already retries the service errors of Lambda
+        transient_errors = {
+            "Bedrock": ["Bedrock.InternalServerException", "Bedrock.ServiceUnavailableException", "Bedrock.ModelTimeoutException"],
+            "Transcribe": ["Transcribe.InternalFailureException"],
+            "Lambda": []
+        }
+
+        def add_retries(task, service):
+            task.add_retry(errors=throttling_errors[service],
+                           interval=Duration.seconds(Config.RETRY_INTERVAL_SECONDS),
+                           max_delay=Duration.seconds(Config.RETRY_MAX_DELAY_SECONDS),
+                           backoff_rate=2,
+                           max_attempts=throttling_retry_max_attempts,
+                           jitter_strategy=sfn.JitterType.FULL)
+            if transient_errors[service]:
+                task.add_retry(errors=transient_errors[service],
+                               interval=Duration.seconds(1),
+                               backoff_rate=2,
+                               max_attempts=2,
+                               jitter_strategy=sfn.JitterType.FULL)
+            return task
+
         # Define the Step Functions state machine
+        # Record the execution ARN under the uploaded object key so the webapp can find its execution directly
+        index_execution_task = tasks.CallAwsService(self, "IndexExecution",
+                                                        service="s3",
+                                                        action="putObject",
+                                                        parameters={
+                                                            "Bucket": bucket.bucket_name,
+                                                            "Key": sfn.JsonPath.format("execution-index/{}", sfn.JsonPath.string_at("$.detail.object.key")),
+                                                            "Body": sfn.JsonPath.string_at("$$.Execution.Id"),
+                                                            "ContentType": "text/plain"
+                                                        },
+                                                        iam_resources=[bucket.arn_for_objects("execution-index/*")],
+                                                        result_path=sfn.JsonPath.DISCARD)
+
         start_transcription_task = tasks.CallAwsService(self, "StartTranscriptionJob",
                                                         service="transcribe",
                                                         action="startTranscriptionJob",
@@ -101,92 +297,490 @@ class InfraStack(Stack):
                                                         iam_resources=["*"],
                                                         # role=state_machine_role,
                                                         result_path="$.TranscriptionResult") 
+        add_retries(start_transcription_task, "Transcribe")
 
-        wait_for_transcription_task = sfn.Wait(self, "WaitForTranscriptionJobToComplete",
-                                  time=sfn.WaitTime.duration(Duration.seconds(10)))
-        
-        get_transcription_task = tasks.CallAwsService(self, "GetTranscriptionJobStatus",
-                                                        service="transcribe",
-                                                        action="getTranscriptionJob",
-                                                        parameters={
+        evaluate_transcription_task = sfn.Choice(self, "EvaluateTranscriptionJobStatus")
+        transcription_failed = sfn.Fail(self, "TranscriptionFailed", error="TranscriptionFailed", cause="Transcription job failed")
+
+        if transcription_completion == "callback":
+            # The execution waits with a task token until Transcribe reports the end of the job
+            transcription_callback_lambda = _lambda.Function(self, "transcription_callback",
+                                        description="Lambda function resuming Public Speaking GenAI Assistant executions when their transcription job ends",
+                                        runtime=_lambda.Runtime.PYTHON_3_12,
+                                        handler="transcription_callback.lambda_handler",
+                                        timeout=Duration.seconds(30),
+                                        architecture=_lambda.Architecture.ARM_64,
+                                        environment={
+                                            "BUCKET_NAME": bucket.bucket_name,
+                                            **log_environment
+                                        },
+                                        code=_lambda.Code.from_asset("./infra/lambda"))
+            transcription_callback_lambda.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["s3:PutObject", "s3:GetObject", "s3:DeleteObject"],
+                    resources=[bucket.arn_for_objects("transcription-callbacks/*")]
+                )
+            )
+            # Without ListBucket, S3 answers AccessDenied instead of NoSuchKey for the jobs with no stored token
+            transcription_callback_lambda.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["s3:ListBucket"],
+                    resources=[bucket.bucket_arn],
+                    conditions={"StringLike": {"s3:prefix": ["transcription-callbacks/*"]}}
+                )
+            )
+            # Task tokens are sent to any state machine to avoid a dependency cycle with the state machine
+            transcription_callback_lambda.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["transcribe:GetTranscriptionJob", "states:SendTaskSuccess", "states:SendTaskFailure"],
+                    resources=["*"]
+                )
+            )
+
+            wait_for_transcription_task = tasks.LambdaInvoke(self, "WaitForTranscriptionJobCallback",
+                                                        lambda_function=transcription_callback_lambda,
+                                                        integration_pattern=sfn.IntegrationPattern.WAIT_FOR_TASK_TOKEN,
+                                                        payload=sfn.TaskInput.from_object({
+                                                            "TaskToken": sfn.JsonPath.task_token,
                                                             "TranscriptionJobName": sfn.JsonPath.string_at("$.TranscriptionResult.TranscriptionJob.TranscriptionJobName")
-                                                        },
-                                                        iam_resources=["*"],
+                                                        }),
+                                                        task_timeout=sfn.Timeout.duration(Duration.minutes(Config.TRANSCRIPTION_CALLBACK_TIMEOUT_MINUTES)),
                                                         result_path="$.TranscriptionResult")
+            add_retries(wait_for_transcription_task, "Lambda")
 
-        evaluate_transcription_task = sfn.Choice(self, "EvaluateTranscriptionJobStatus")
-        transcription_failed = sfn.Fail(self, "TranscriptionFailed", error="TranscriptionFailed", cause="Transcription job failed")
+            # A job state change event may be lost: once the wait times out the job is checked,
+            # and the execution waits again with a new token while the job is still running
+            check_transcription_task = tasks.CallAwsService(self, "CheckTranscriptionJobStatus",
+                                                            service="transcribe",
+                                                            action="getTranscriptionJob",
+                                                            parameters={
+                                                                "TranscriptionJobName": sfn.JsonPath.string_at("$.TranscriptionResult.TranscriptionJob.TranscriptionJobName")
+                                                            },
+                                                            iam_resources=["*"],
+                                                            result_path="$.TranscriptionResult")
+            add_retries(check_transcription_task, "Transcribe")
+            wait_for_transcription_task.add_catch(check_transcription_task, errors=[sfn.Errors.TIMEOUT],
+                                                  result_path=sfn.JsonPath.DISCARD)
+            check_transcription_task.next(evaluate_transcription_task)
+
+            # Transcribe sends an event to EventBridge when a job completes or fails
+            transcription_rule = events.Rule(self, "TranscriptionJobStateChangeRule",
+                               event_pattern=events.EventPattern(
+                                   source=["aws.transcribe"],
+                                   detail_type=["Transcribe Job State Change"],
+                                   detail={
+                                       "TranscriptionJobStatus": ["COMPLETED", "FAILED"]
+                                   }
+                               ))
+            transcription_rule.add_target(targets.LambdaFunction(transcription_callback_lambda))
+
+            transcription_chain = start_transcription_task\
+                .next(wait_for_transcription_task)\
+                .next(evaluate_transcription_task)
+            # Only a job checked after a timeout can still be queued or in progress
+            evaluate_transcription_task.otherwise(wait_for_transcription_task)
+        else:
+            # Poll the job after each delay in turn, staying at the last one for long recordings
+            start_transcription_polling = sfn.Pass(self, "StartTranscriptionPolling",
+                                                   result=sfn.Result.from_object({
+                                                       "attempt": 0,
+                                                       "wait_seconds": transcription_poll_delays[0]
+                                                   }),
+                                                   result_path="$.TranscriptionPoll")
+
+            wait_for_transcription_task = sfn.Wait(self, "WaitForTranscriptionJobToComplete",
+                                      time=sfn.WaitTime.seconds_path("$.TranscriptionPoll.wait_seconds"))
+
+            get_transcription_task = tasks.CallAwsService(self, "GetTranscriptionJobStatus",
+                                                            service="transcribe",
+                                                            action="getTranscriptionJob",
+                                                            parameters={
+                                                                "TranscriptionJobName": sfn.JsonPath.string_at("$.TranscriptionResult.TranscriptionJob.TranscriptionJobName")
+                                                            },
+                                                            iam_resources=["*"],
+                                                            result_path="$.TranscriptionResult")
+            add_retries(get_transcription_task, "Transcribe")
+
+            poll_delays = ", ".join(str(delay) for delay in transcription_poll_delays)
+            back_off_transcription_polling = sfn.Pass(self, "BackOffTranscriptionPolling",
+                                                      parameters={
+                                                          "attempt.$": "States.MathAdd($.TranscriptionPoll.attempt, 1)",
+                                                          "wait_seconds.$": f"States.ArrayGetItem(States.Array({poll_delays}), States.MathAdd($.TranscriptionPoll.attempt, 1))"
+                                                      },
+                                                      result_path="$.TranscriptionPoll")
+            back_off_transcription_polling.next(wait_for_transcription_task)
+            transcription_poll_delay_at_max = sfn.Choice(self, "IsTranscriptionPollDelayAtMax")\
+                .when(sfn.Condition.number_greater_than_equals("$.TranscriptionPoll.attempt", len(transcription_poll_delays) - 1), wait_for_transcription_task)\
+                .otherwise(back_off_transcription_polling)
+
+            transcription_chain = start_transcription_task\
+                .next(start_transcription_polling)\
+                .next(wait_for_transcription_task)\
+                .next(get_transcription_task)\
+                .next(evaluate_transcription_task)
+            evaluate_transcription_task.otherwise(transcription_poll_delay_at_max)
 
-        create_speech_feedback_bedrock_prompt_task = tasks.LambdaInvoke(self, "CreateBedrockPrompt-SpeechFeedback",
-                                                        lambda_function=prepare_bedrock_prompts_lambda,
-                                                        payload=sfn.TaskInput.from_json_path_at("$"),
-                                                        result_path="$.feedback_response",
-                                                        result_selector={
-                                                            "s3uri.$": "$.Payload"
-                                                        })
-        
-        create_speech_rewrite_bedrock_prompt_task = tasks.LambdaInvoke(self, "CreateBedrockPrompt-SpeechRewrite",
-                                                        lambda_function=prepare_bedrock_prompts_lambda,
-                                                        payload=sfn.TaskInput.from_json_path_at("$"),
-                                                        result_path="$.rewrite_response",
-                                                        result_selector={
-                                                            "s3uri.$": "$.Payload"
-                                                        })
-        
         combine_llm_chaining_output_task = tasks.LambdaInvoke(self, "CombineLLMChainingOutput",
-                                                        lambda_function=prepare_bedrock_prompts_lambda,
+                                                        lambda_function=prepare_bedrock_prompts_function,
                                                         payload=sfn.TaskInput.from_json_path_at("$"),
                                                         output_path="$.Payload"
                                                         )
+        add_retries(combine_llm_chaining_output_task, "Lambda")
         
-        model = bedrock.FoundationModel.from_foundation_model_id(self, "Model", bedrock.FoundationModelIdentifier.ANTHROPIC_CLAUDE_3_5_SONNET_20240620_V1_0)
-        
-        get_speech_feedback = tasks.BedrockInvokeModel(self, "GetSpeechFeedback",
-                                                        model=model,
-                                                        input=tasks.BedrockInvokeModelInputProps(
-                                                            s3_input_uri=sfn.JsonPath.string_at("$.feedback_response.s3uri.input")
-                                                        ),
-                                                        output=tasks.BedrockInvokeModelOutputProps(
-                                                            s3_output_uri=sfn.JsonPath.string_at("$.feedback_response.s3uri.output")
-                                                        ),
-                                                        content_type='application/json',
-                                                        result_path="$.feedback_response.bedrock_response")
-        
-        get_speech_rewrite = tasks.BedrockInvokeModel(self, "GetSpeechRewrite",
-                                                      model=model,
-                                                      input=tasks.BedrockInvokeModelInputProps(
-                                                            s3_input_uri=sfn.JsonPath.string_at("$.rewrite_response.s3uri.input")
-                                                        ),
-                                                        output=tasks.BedrockInvokeModelOutputProps(
-                                                            s3_output_uri=sfn.JsonPath.string_at("$.rewrite_response.s3uri.output")
-                                                        ),
-                                                        content_type='application/json',
-                                                        result_path="$.rewrite_response.bedrock_response"
-                                                     )
+        model = bedrock.FoundationModel.from_foundation_model_id(self, "Model", bedrock.FoundationModelIdentifier(Config.BEDROCK_MODEL_ID))
+        routed_model_resources = {
+            model_id: bedrock.FoundationModel.from_foundation_model_id(self, f"{suffix}Model", bedrock.FoundationModelIdentifier(model_id))
+            for model_id, suffix in routed_models.items()
+        }
+        fallback_model = None
+        if bedrock_fallback_model_id:
+            fallback_model = bedrock.FoundationModel.from_foundation_model_id(self, "FallbackModel", bedrock.FoundationModelIdentifier(bedrock_fallback_model_id))
+
+        def invoke_model(state_id, result_path, fallbacks, model=model, **props):
+            # Calls that are still throttled after the retries are sent to the fallback model,
+            # which then continues to the same state as the model would have
+            task = add_retries(tasks.BedrockInvokeModel(self, state_id, model=model, content_type='application/json',
+                                                        result_path=result_path, **props), "Bedrock")
+            if fallback_model:
+                fallback = add_retries(tasks.BedrockInvokeModel(self, f"{state_id}Fallback", model=fallback_model,
+                                                                content_type='application/json',
+                                                                result_path=result_path, **props), "Bedrock")
+                task.add_catch(fallback,
+                               errors=throttling_errors["Bedrock"] + ["Bedrock.ServiceUnavailableException"],
+                               result_path=result_path)
+                fallbacks.append(fallback)
+            return task
+
+        def get_bedrock_response(name, prompt_path, result_path, inline_prompt=False, inline_response=False, routed=False):
+            # Bedrock responses found in the prompt cache are used without calling Bedrock again.
+            # Prompts returned with a body are passed to Bedrock in the state, the others through S3.
+            # Routed prompts are sent to the model of their route, the others to the default model
+            fallbacks = []
+            models = routed_models if routed else {}
 
+            def routed_to(model_id):
+                return [sfn.Condition.is_present(f"{prompt_path}.route.model_id"),
+                        sfn.Condition.string_equals(f"{prompt_path}.route.model_id", model_id)]
+
+            s3_props = {
+                "input": tasks.BedrockInvokeModelInputProps(
+                    s3_input_uri=sfn.JsonPath.string_at(f"{prompt_path}.input")
+                ),
+                "output": tasks.BedrockInvokeModelOutputProps(
+                    s3_output_uri=sfn.JsonPath.string_at(f"{prompt_path}.output")
+                )
+            }
+            get_response = invoke_model(f"Get{name}", result_path, fallbacks, **s3_props)
+            use_cached_response = sfn.Pass(self, f"UseCached{name}",
+                                           parameters={"Body.$": f"{prompt_path}.output"},
+                                           result_path=result_path)
+            response_cached = sfn.Choice(self, f"Is{name}Cached")\
+                .when(sfn.Condition.boolean_equals(f"{prompt_path}.cached", True), use_cached_response)
+            if payload_inline_max_bytes and inline_prompt:
+                # The response stays in the state too when it is read by a single step,
+                # unless Bedrock must write it to the prompt cache
+                output = None
+                if prompt_cache_ttl_days or not inline_response:
+                    output = tasks.BedrockInvokeModelOutputProps(
+                        s3_output_uri=sfn.JsonPath.string_at(f"{prompt_path}.output")
+                    )
+                inline_props = {"body": sfn.TaskInput.from_json_path_at(f"{prompt_path}.body"), "output": output}
+                for model_id, suffix in models.items():
+                    response_cached.when(sfn.Condition.and_(sfn.Condition.is_present(f"{prompt_path}.body"), *routed_to(model_id)),
+                                         invoke_model(f"Get{name}Inline{suffix}", result_path, fallbacks,
+                                                      routed_model_resources[model_id], **inline_props))
+                get_inline_response = invoke_model(f"Get{name}Inline", result_path, fallbacks, **inline_props)
+                response_cached.when(sfn.Condition.is_present(f"{prompt_path}.body"), get_inline_response)
+            for model_id, suffix in models.items():
+                response_cached.when(sfn.Condition.and_(*routed_to(model_id)),
+                                     invoke_model(f"Get{name}{suffix}", result_path, fallbacks,
+                                                  routed_model_resources[model_id], **s3_props))
+            response = response_cached.otherwise(get_response).afterwards()
+            if not fallbacks:
+                return response
+            # The model and fallback branches meet again before the next state
+            got_response = sfn.Pass(self, f"Got{name}")
+            response.next(got_response)
+            for fallback in fallbacks:
+                fallback.next(got_response)
+            return sfn.Chain.custom(response_cached, [got_response], got_response)
+        
         sns_publish = tasks.SnsPublish(self, "PublishToSNS",
                                       topic=topic,
                                       message=sfn.TaskInput.from_json_path_at("$"),
                                       result_path=sfn.JsonPath.DISCARD)
 
+        if chunk_max_words:
+            # Long transcripts are analysed in chunks (map) whose feedback is merged (reduce). The sequential
+            # pipeline gets the prompts of the chunks from its feedback step, the parallel one from SegmentTranscript
+            chunks_path = "$.segments.chunks" if pipeline_mode == "parallel" else "$.feedback_response.s3uri.chunks"
+
+            # Chunks are only made of long transcripts, so their prompts are always in S3
+            chunk_feedback_cached = get_bedrock_response("ChunkFeedback", "$.chunk", "$.chunk.bedrock_response")
+
+            select_chunk_feedback_output = sfn.Pass(self, "SelectChunkFeedbackOutput",
+                                                    parameters={
+                                                        "index.$": "$.chunk.index",
+                                                        "label.$": "$.chunk.label",
+                                                        "cached.$": "$.chunk.cached",
+                                                        "Body.$": "$.chunk.bedrock_response.Body"
+                                                    })
+
+            analyse_transcript_chunks = sfn.Map(self, "AnalyseTranscriptChunks",
+                                                items_path=chunks_path,
+                                                item_selector={
+                                                    "chunk": sfn.JsonPath.object_at("$$.Map.Item.Value")
+                                                },
+                                                max_concurrency=chunk_max_concurrency,
+                                                result_path="$.chunks_response")
+            analyse_transcript_chunks.item_processor(chunk_feedback_cached.next(select_chunk_feedback_output))
+
+            reduce_chunk_feedback_task = tasks.LambdaInvoke(self, "ReduceChunkFeedback",
+                                                            lambda_function=prepare_bedrock_prompts_function,
+                                                            payload=sfn.TaskInput.from_json_path_at("$"),
+                                                            output_path="$.Payload")
+            add_retries(reduce_chunk_feedback_task, "Lambda")
+            analyse_long_speech = analyse_transcript_chunks.next(reduce_chunk_feedback_task).next(sns_publish)
+
+        if pipeline_mode == "parallel":
+            # Independent analyses run side by side instead of each waiting for the previous one
+            list_speech_analyses = sfn.Pass(self, "ListSpeechAnalyses",
+                                            result=sfn.Result.from_array(speech_analyses),
+                                            result_path="$.analyses")
+
+            create_speech_analysis_bedrock_prompt_task = tasks.LambdaInvoke(self, "CreateBedrockPrompt-SpeechAnalysis",
+                                                            lambda_function=prepare_bedrock_prompts_function,
+                                                            payload=sfn.TaskInput.from_json_path_at("$"),
+                                                            result_path="$.analysis_response",
+                                                            result_selector={
+                                                                "s3uri.$": "$.Payload"
+                                                            })
+
+            # The responses of all the analyses are collected by the map, so they stay in S3
+            speech_analysis_cached = get_bedrock_response("SpeechAnalysis",
+                                                          "$.analysis_response.s3uri",
+                                                          "$.analysis_response.bedrock_response",
+                                                          inline_prompt=True, routed=True)
+
+            add_retries(create_speech_analysis_bedrock_prompt_task, "Lambda")
+
+            # Each analysis returns only its name, the location of its Bedrock response and whether it was cached
+            select_speech_analysis_output = sfn.Pass(self, "SelectSpeechAnalysisOutput",
+                                                     parameters={
+                                                         "analysis.$": "$.analysis",
+                                                         "cached.$": "$.analysis_response.s3uri.cached",
+                                                         "Body.$": "$.analysis_response.bedrock_response.Body"
+                                                     })
+
+            analyse_speech = sfn.Map(self, "AnalyseSpeech",
+                                     items_path="$.analyses",
+                                     item_selector={
+                                         "analysis": sfn.JsonPath.string_at("$$.Map.Item.Value"),
+                                         "detail": sfn.JsonPath.object_at("$.detail")
+                                     },
+                                     max_concurrency=len(speech_analyses),
+                                     result_path="$.analyses_response")
+            analyse_speech.item_processor(create_speech_analysis_bedrock_prompt_task
+                .next(speech_analysis_cached)\
+                .next(select_speech_analysis_output))
+
+            analysis_chain = list_speech_analyses\
+                .next(analyse_speech)\
+                .next(combine_llm_chaining_output_task)\
+                .next(sns_publish)
+
+            if chunk_max_words:
+                segment_transcript_task = tasks.LambdaInvoke(self, "SegmentTranscript",
+                                                                lambda_function=prepare_bedrock_prompts_function,
+                                                                payload=sfn.TaskInput.from_object({
+                                                                    "segment_transcript": True,
+                                                                    "detail": sfn.JsonPath.object_at("$.detail")
+                                                                }),
+                                                                result_path="$.segments",
+                                                                result_selector={
+                                                                    "chunks.$": "$.Payload.chunks"
+                                                                })
+                add_retries(segment_transcript_task, "Lambda")
+
+                # Short transcripts get no chunks and go through the analysis pipeline
+                is_long_speech = sfn.Choice(self, "IsLongSpeech")\
+                    .when(sfn.Condition.is_present(f"{chunks_path}[1]"), analyse_long_speech)\
+                    .otherwise(analysis_chain)
+                analysis_chain = segment_transcript_task.next(is_long_speech)
+        else:
+            create_speech_feedback_bedrock_prompt_task = tasks.LambdaInvoke(self, "CreateBedrockPrompt-SpeechFeedback",
+                                                            lambda_function=prepare_bedrock_prompts_function,
+                                                            payload=sfn.TaskInput.from_json_path_at("$"),
+                                                            result_path="$.feedback_response",
+                                                            result_selector={
+                                                                "s3uri.$": "$.Payload"
+                                                            })
+        
+            create_speech_rewrite_bedrock_prompt_task = tasks.LambdaInvoke(self, "CreateBedrockPrompt-SpeechRewrite",
+                                                            lambda_function=prepare_bedrock_prompts_function,
+                                                            payload=sfn.TaskInput.from_json_path_at("$"),
+                                                            result_path="$.rewrite_response",
+                                                            result_selector={
+                                                                "s3uri.$": "$.Payload"
+                                                            })
+        
+            add_retries(create_speech_feedback_bedrock_prompt_task, "Lambda")
+            add_retries(create_speech_rewrite_bedrock_prompt_task, "Lambda")
+
+            speech_feedback_cached = get_bedrock_response("SpeechFeedback",
+                                                          "$.feedback_response.s3uri",
+                                                          "$.feedback_response.bedrock_response",
+                                                          inline_prompt=True, inline_response=True, routed=True)
+            speech_rewrite_cached = get_bedrock_response("SpeechRewrite",
+                                                         "$.rewrite_response.s3uri",
+                                                         "$.rewrite_response.bedrock_response",
+                                                         inline_prompt=True, inline_response=True, routed=True)
+
+            # The rewrite prompt includes the speech feedback, so the two calls run one after the other
+            analysis_chain = speech_feedback_cached\
+                .next(create_speech_rewrite_bedrock_prompt_task)\
+                .next(speech_rewrite_cached)\
+                .next(combine_llm_chaining_output_task)\
+                .next(sns_publish)
+
+            if chunk_max_words:
+                # The feedback step, which counts the words anyway, returns the prompts of the chunks
+                # instead of the feedback prompt when the transcript is over the word limit
+                analysis_chain = sfn.Choice(self, "IsLongSpeech")\
+                    .when(sfn.Condition.is_present(f"{chunks_path}[1]"), analyse_long_speech)\
+                    .otherwise(analysis_chain)
+            analysis_chain = create_speech_feedback_bedrock_prompt_task.next(analysis_chain)
+
+        if batch_inference:
+            # Batch uploads queue their prompts, and wait for the batch state machine to send back their results
+            queue_batch_prompts_task = tasks.LambdaInvoke(self, "QueueBatchPrompts",
+                                                          lambda_function=prepare_bedrock_prompts_function,
+                                                          integration_pattern=sfn.IntegrationPattern.WAIT_FOR_TASK_TOKEN,
+                                                          payload=sfn.TaskInput.from_object({
+                                                              "batch_task_token": sfn.JsonPath.task_token,
+                                                              "detail": sfn.JsonPath.object_at("$.detail")
+                                                          }),
+                                                          task_timeout=sfn.Timeout.duration(Duration.hours(Config.BATCH_TIMEOUT_HOURS)))
+            add_retries(queue_batch_prompts_task, "Lambda")
+            is_batch_upload = sfn.Choice(self, "IsBatchUpload")\
+                .when(sfn.Condition.string_matches("$.detail.object.key", f"{Config.BATCH_PREFIX}*"),
+                      queue_batch_prompts_task.next(sns_publish))\
+                .otherwise(analysis_chain)
+            analysis_chain = is_batch_upload
+
+            # Role Bedrock assumes to read the input and write the output of the batch jobs
+            batch_role = iam.Role(self, "BatchInferenceRole",
+                                  assumed_by=iam.ServicePrincipal("bedrock.amazonaws.com"))
+            bucket.grant_read_write(batch_role, "bedrock_batch/*")
+
+            batch_inference_lambda = _lambda.Function(self, "batch_inference",
+                                        description="Lambda function submitting the Bedrock batch inference jobs of Public Speaking GenAI Assistant and sending back their results",
+                                        runtime=_lambda.Runtime.PYTHON_3_12,
+                                        handler="batch_inference.lambda_handler",
+                                        timeout=Duration.minutes(5),
+                                        architecture=_lambda.Architecture.ARM_64,
+                                        environment={
+                                            "BUCKET_NAME": bucket.bucket_name,
+                                            "BEDROCK_MODEL_ID": Config.BEDROCK_MODEL_ID,
+                                            "BATCH_ROLE_ARN": batch_role.role_arn,
+                                            "BATCH_MIN_RECORDS": str(batch_min_records),
+                                            "BATCH_MAX_WAIT_MINUTES": str(Config.BATCH_MAX_WAIT_MINUTES),
+                                            **log_environment
+                                        },
+                                        layers=[speech_analysis_layer],
+                                        code=_lambda.Code.from_asset("./infra/lambda"))
+            bucket.grant_read_write(batch_inference_lambda, "bedrock_batch/*")
+            bucket.grant_delete(batch_inference_lambda, "bedrock_batch/*")
+            # The results are cached by the content hash in the metadata of the upload
+            bucket.grant_read(batch_inference_lambda, "raw-audio-files/*")
+            bucket.grant_put(batch_inference_lambda, "result-cache/*")
+            batch_role.grant_pass_role(batch_inference_lambda)
+            # Task tokens are sent to any state machine to avoid a dependency cycle with the state machine
+            batch_inference_lambda.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["bedrock:CreateModelInvocationJob", "bedrock:GetModelInvocationJob",
+                             "states:SendTaskSuccess", "states:SendTaskFailure"],
+                    resources=["*"]
+                )
+            )
+
+            submit_batch_task = tasks.LambdaInvoke(self, "SubmitBatch",
+                                                   lambda_function=batch_inference_lambda,
+                                                   payload=sfn.TaskInput.from_object({"action": "submit"}),
+                                                   output_path="$.Payload")
+            fan_out_batch_results_task = tasks.LambdaInvoke(self, "FanOutBatchResults",
+                                                            lambda_function=batch_inference_lambda,
+                                                            payload=sfn.TaskInput.from_object({
+                                                                "action": "fan_out",
+                                                                "batch_id": sfn.JsonPath.string_at("$.batch_id")
+                                                            }),
+                                                            output_path="$.Payload")
+
+            wait_for_batch_job = sfn.Wait(self, "WaitForBatchJob",
+                                          time=sfn.WaitTime.duration(Duration.minutes(Config.BATCH_JOB_POLL_MINUTES)))
+            get_batch_job_status_task = tasks.LambdaInvoke(self, "GetBatchJobStatus",
+                                                           lambda_function=batch_inference_lambda,
+                                                           payload=sfn.TaskInput.from_object({
+                                                               "action": "status",
+                                                               "batch_id": sfn.JsonPath.string_at("$.batch_id"),
+                                                               "job_arn": sfn.JsonPath.string_at("$.job_arn")
+                                                           }),
+                                                           result_path="$.job",
+                                                           result_selector={
+                                                               "status.$": "$.Payload.status",
+                                                               "ended.$": "$.Payload.ended"
+                                                           })
+            for batch_task in (submit_batch_task, fan_out_batch_results_task, get_batch_job_status_task):
+                add_retries(batch_task, "Lambda")
+            is_batch_job_ended = sfn.Choice(self, "IsBatchJobEnded")\
+                .when(sfn.Condition.boolean_equals("$.job.ended", True), fan_out_batch_results_task)\
+                .otherwise(wait_for_batch_job)
+
+            # Too few prompts for a job are sent to Bedrock with as many calls at a time as the chunks
+            # of a long speech; a failed call only fails the recording of its prompt
+            invoke_batch_record = tasks.BedrockInvokeModel(self, "InvokeBatchRecord",
+                                                           model=model,
+                                                           input=tasks.BedrockInvokeModelInputProps(
+                                                               s3_input_uri=sfn.JsonPath.string_at("$.input")
+                                                           ),
+                                                           output=tasks.BedrockInvokeModelOutputProps(
+                                                               s3_output_uri=sfn.JsonPath.string_at("$.output")
+                                                           ),
+                                                           content_type='application/json',
+                                                           result_path=sfn.JsonPath.DISCARD)
+            add_retries(invoke_batch_record, "Bedrock")
+            invoke_batch_record.add_catch(sfn.Pass(self, "SkipFailedBatchRecord"), result_path=sfn.JsonPath.DISCARD)
+            invoke_batch_records = sfn.Map(self, "InvokeBatchRecords",
+                                           items_path="$.records",
+                                           max_concurrency=chunk_max_concurrency,
+                                           result_path=sfn.JsonPath.DISCARD)
+            invoke_batch_records.item_processor(invoke_batch_record)
+
+            batch_chain = submit_batch_task.next(sfn.Choice(self, "BatchMode")
+                .when(sfn.Condition.string_equals("$.mode", "job"),
+                      wait_for_batch_job.next(get_batch_job_status_task).next(is_batch_job_ended))
+                .when(sfn.Condition.string_equals("$.mode", "on_demand"),
+                      invoke_batch_records.next(fan_out_batch_results_task))
+                .otherwise(sfn.Succeed(self, "NoBatchToSubmit")))
+
+            batch_state_machine = sfn.StateMachine(self, "BatchInferenceStateMachine",
+                                                   timeout=Duration.hours(Config.BATCH_TIMEOUT_HOURS),
+                                                   definition_body=sfn.DefinitionBody.from_chainable(batch_chain))
+            batch_schedule = events.Rule(self, "BatchInferenceSchedule",
+                                         schedule=events.Schedule.rate(Duration.minutes(Config.BATCH_SCHEDULE_MINUTES)))
+            batch_schedule.add_target(targets.SfnStateMachine(batch_state_machine))
+
         # Create Stepfunctions Chain
-        chain = start_transcription_task\
-            .next(wait_for_transcription_task)\
-            .next(get_transcription_task)\
-            .next(evaluate_transcription_task
-                .when(sfn.Condition.string_equals("$.TranscriptionResult.TranscriptionJob.TranscriptionJobStatus", "COMPLETED"),
-                    create_speech_feedback_bedrock_prompt_task.next(get_speech_feedback
-                        .next(create_speech_rewrite_bedrock_prompt_task)\
-                        .next(get_speech_rewrite)\
-                        .next(combine_llm_chaining_output_task)\
-                        .next(sns_publish))
-                        )
-                .when(sfn.Condition.string_equals("$.TranscriptionResult.TranscriptionJob.TranscriptionJobStatus", "FAILED"), transcription_failed)
-                .otherwise(wait_for_transcription_task))
+        evaluate_transcription_task\
+            .when(sfn.Condition.string_equals("$.TranscriptionResult.TranscriptionJob.TranscriptionJobStatus", "COMPLETED"), analysis_chain)\
+            .when(sfn.Condition.string_equals("$.TranscriptionResult.TranscriptionJob.TranscriptionJobStatus", "FAILED"), transcription_failed)
+
+        chain = index_execution_task.next(transcription_chain)
 
         state_machine = sfn.StateMachine(self, "PublicSpeakingMentorAIAssistantStateMachine",
                                          role=state_machine_role,
-                                         timeout=Duration.hours(2),
+                                         # Batch uploads can wait for their batch job for up to BATCH_TIMEOUT_HOURS
+                                         timeout=Duration.hours(2 + (Config.BATCH_TIMEOUT_HOURS if batch_inference else 0)),
                                          definition_body=sfn.DefinitionBody.from_chainable(chain))
 
         # Create an EventBridge rule to trigger the Step Functions state machine
@@ -203,7 +797,77 @@ class InfraStack(Stack):
                                    }
                                }
                            ))
-        rule.add_target(targets.SfnStateMachine(state_machine))
+        if admission_control:
+            # Uploads wait in a queue, and a dispatcher starts their executions while there are free slots
+            # Messages no dispatch could handle, such as events that are not uploads, are kept for inspection
+            # and can be moved back to the admission queue with a redrive, see the README
+            admission_dead_letter_queue = sqs.Queue(self, "AdmissionDeadLetterQueue",
+                                                    retention_period=Duration.days(14),
+                                                    enforce_ssl=True)
+            admission_dead_letter_alarm = cloudwatch.Alarm(self, "AdmissionDeadLetterAlarm",
+                                        alarm_description="Uploads could not be admitted and are in the admission dead-letter queue",
+                                        metric=admission_dead_letter_queue.metric_approximate_number_of_messages_visible(
+                                            period=Duration.minutes(5)
+                                        ),
+                                        threshold=1,
+                                        evaluation_periods=1,
+                                        comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+                                        treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING)
+            admission_dead_letter_alarm.add_alarm_action(cloudwatch_actions.SnsAction(topic))
+            admission_queue = sqs.Queue(self, "AdmissionQueue",
+                                        visibility_timeout=Duration.seconds(60),
+                                        retention_period=Duration.days(4),
+                                        enforce_ssl=True,
+                                        dead_letter_queue=sqs.DeadLetterQueue(
+                                            max_receive_count=Config.ADMISSION_MAX_RECEIVE_COUNT,
+                                            queue=admission_dead_letter_queue
+                                        ))
+            admission_dispatcher_lambda = _lambda.Function(self, "admission_dispatcher",
+                                        description="Lambda function starting Public Speaking GenAI Assistant executions of queued uploads within the concurrency limit",
+                                        runtime=_lambda.Runtime.PYTHON_3_12,
+                                        handler="admission_control.lambda_handler",
+                                        timeout=Duration.seconds(60),
+                                        architecture=_lambda.Architecture.ARM_64,
+                                        # A single dispatch at a time, so two of them never fill the same slot
+                                        reserved_concurrent_executions=1,
+                                        environment={
+                                            "ADMISSION_QUEUE_URL": admission_queue.queue_url,
+                                            "STATE_MACHINE_ARN": state_machine.state_machine_arn,
+                                            "BUCKET_NAME": bucket.bucket_name,
+                                            "MAX_IN_FLIGHT_EXECUTIONS": str(max_in_flight_executions),
+                                            "BATCH_PREFIX": Config.BATCH_PREFIX,
+                                            **log_environment
+                                        },
+                                        code=_lambda.Code.from_asset("./infra/lambda"))
+            admission_queue.grant_consume_messages(admission_dispatcher_lambda)
+            state_machine.grant_start_execution(admission_dispatcher_lambda)
+            admission_dispatcher_lambda.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["states:ListExecutions"],
+                    resources=[state_machine.state_machine_arn]
+                )
+            )
+            bucket.grant_read_write(admission_dispatcher_lambda, "admission-queue/*")
+
+            rule.add_target(targets.SqsQueue(admission_queue))
+            rule.add_target(targets.LambdaFunction(admission_dispatcher_lambda))
+            # Slots are filled as soon as an execution ends, and uploads whose event
+            # reached the queue after its dispatch are admitted by the next scheduled one
+            execution_ended_rule = events.Rule(self, "ExecutionEndedRule",
+                                               event_pattern=events.EventPattern(
+                                                   source=["aws.states"],
+                                                   detail_type=["Step Functions Execution Status Change"],
+                                                   detail={
+                                                       "stateMachineArn": [state_machine.state_machine_arn],
+                                                       "status": ["SUCCEEDED", "FAILED", "TIMED_OUT", "ABORTED"]
+                                                   }
+                                               ))
+            execution_ended_rule.add_target(targets.LambdaFunction(admission_dispatcher_lambda))
+            admission_schedule = events.Rule(self, "AdmissionSchedule",
+                                             schedule=events.Schedule.rate(Duration.minutes(1)))
+            admission_schedule.add_target(targets.LambdaFunction(admission_dispatcher_lambda))
+        else:
+            rule.add_target(targets.SfnStateMachine(state_machine))
 
         # Define prefix that will be used in some resource names
         prefix = Config.STACK_NAME
@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+import logger
+from clients import get_client
+
+sqs = get_client('sqs')
+sfn = get_client('stepfunctions')
+s3 = get_client('s3')
+
+queue_url = os.environ.get('ADMISSION_QUEUE_URL')
+state_machine_arn = os.environ.get('STATE_MACHINE_ARN')
+bucket_name = os.environ.get('BUCKET_NAME')
+
+# Executions running at once; the uploads of a burst wait in the queue for a free slot
+max_in_flight = int(os.environ.get('MAX_IN_FLIGHT_EXECUTIONS', '10'))
+# Messages received by a dispatch, the others are received by the next one
+max_received = int(os.environ.get('ADMISSION_MAX_RECEIVED', '1000'))
+# Messages stay hidden from other consumers while a dispatch saves their uploads
+visibility_timeout_seconds = 60
+receive_wait_seconds = 1
+
+raw_audio_prefix = 'raw-audio-files/'
+batch_prefix = os.environ.get('BATCH_PREFIX', 'raw-audio-files/batch/')
+# Executions of batch uploads wait for their batch job without using Transcribe or
+# Bedrock, so they are named with this prefix and not counted as in flight
+batch_execution_prefix = 'batch-'
+
+# Position of each waiting upload, read by the webapp while its execution has not started
+queue_positions_key = 'admission-queue/positions.json'
+# Uploads waiting for a slot, with the input of their execution. Their messages are
+# deleted once saved here, so each message is received once and a dispatch reads
+# every waiting upload with a single GetObject
+waiting_uploads_key = 'admission-queue/waiting.json'
+
+
+def get_user_id(object_key):
+    prefix = batch_prefix if object_key.startswith(batch_prefix) else raw_audio_prefix
+    return object_key.removeprefix(prefix).split('/')[0]
+
+
+def get_execution_name(object_key):
+    # The same name for every delivery of an upload: starting it again with the
+    # same input returns the running execution instead of starting a second one
+    prefix = batch_execution_prefix if object_key.startswith(batch_prefix) else ''
+    return f"{prefix}{hashlib.sha256(object_key.encode('utf-8')).hexdigest()}"
+
+
+def count_in_flight():
+    count = 0
+    for page in sfn.get_paginator('list_executions').paginate(stateMachineArn=state_machine_arn, statusFilter='RUNNING'):
+        count += sum(not execution['name'].startswith(batch_execution_prefix) for execution in page['executions'])
+        if count >= max_in_flight:
+            break
+    return count
+
+
+def receive_uploads():
+    """
+    Returns the uploads of the messages sent since the last dispatch, each
+    with the receipt handles of all its messages, as SQS may deliver the
+    event of an upload twice.
+    """
+    uploads = {}
+    received = 0
+    while received < max_received:
+        messages = sqs.receive_message(QueueUrl=queue_url,
+                                       MaxNumberOfMessages=10,
+                                       WaitTimeSeconds=receive_wait_seconds,
+                                       VisibilityTimeout=visibility_timeout_seconds,
+                                       AttributeNames=['SentTimestamp']).get('Messages', [])
+        if not messages:
+            break
+        received += len(messages)
+        for message in messages:
+            try:
+                object_key = json.loads(message['Body'])['detail']['object']['key']
+            except (ValueError, KeyError, TypeError) as e:
+                # Not released, so it goes to the dead-letter queue once received too many times
+                logger.error("Invalid admission message", message_id=message['MessageId'], error=str(e))
+                continue
+            upload = uploads.setdefault(object_key, {
+                "object_key": object_key,
+                "user_id": get_user_id(object_key),
+                "sent_at": int(message['Attributes']['SentTimestamp']),
+                "input": message['Body'],
+                "receipt_handles": []
+            })
+            upload['receipt_handles'].append(message['ReceiptHandle'])
+    return list(uploads.values())
+
+
+def load_waiting():
+    try:
+        response = s3.get_object(Bucket=bucket_name, Key=waiting_uploads_key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            return []
+        raise
+    return json.loads(response['Body'].read())
+
+
+def save_waiting(uploads):
+    waiting = [{key: upload[key] for key in ('object_key', 'user_id', 'sent_at', 'input')} for upload in uploads]
+    s3.put_object(Bucket=bucket_name, Key=waiting_uploads_key, Body=json.dumps(waiting))
+
+
+def fair_order(uploads):
+    # Round robin between users: the oldest upload of each user, then their
+    # second oldest, and so on, so one user's burst does not hold back the others
+    ranks = {}
+    ranked = []
+    for upload in uploads:
+        rank = ranks.get(upload['user_id'], 0)
+        ranks[upload['user_id']] = rank + 1
+        ranked.append((rank, upload['sent_at'], upload))
+    return [upload for _, _, upload in sorted(ranked, key=lambda item: item[:2])]
+
+
+def in_batches(items, size=10):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def start_execution(upload):
+    try:
+        execution = sfn.start_execution(stateMachineArn=state_machine_arn,
+                                        name=get_execution_name(upload['object_key']),
+                                        input=upload['input'])
+        logger.info("Execution started", object_key=upload['object_key'], execution_arn=execution['executionArn'])
+    except sfn.exceptions.ExecutionAlreadyExists:
+        # An earlier dispatch started it, and has ended, but could not remove the upload from the waiting ones
+        logger.info("Execution already started", object_key=upload['object_key'])
+
+
+def delete_messages(uploads):
+    receipt_handles = [receipt_handle for upload in uploads for receipt_handle in upload['receipt_handles']]
+    for batch in in_batches(receipt_handles):
+        sqs.delete_message_batch(QueueUrl=queue_url, Entries=[
+            {"Id": str(i), "ReceiptHandle": receipt_handle} for i, receipt_handle in enumerate(batch)
+        ])
+
+
+def save_queue_positions(uploads):
+    positions = {
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "waiting": len(uploads),
+        "positions": {upload['object_key']: position for position, upload in enumerate(uploads, start=1)}
+    }
+    s3.put_object(Bucket=bucket_name, Key=queue_positions_key, Body=json.dumps(positions))
+
+
+def dispatch():
+    """
+    Starts the executions of the waiting uploads, in fair order, while
+    fewer than max_in_flight are running, and records the queue position
+    of the uploads left waiting.
+    """
+    waiting = {upload['object_key']: upload for upload in load_waiting()}
+    received = receive_uploads()
+    if received:
+        for upload in received:
+            waiting.setdefault(upload['object_key'], upload)
+        # The uploads are saved before their messages are deleted, so none is lost if the dispatch fails
+        save_waiting(waiting.values())
+        delete_messages(received)
+    uploads = sorted(waiting.values(), key=lambda upload: upload['sent_at'])
+    # Batch uploads only queue their prompts, so they are started without waiting for a slot
+    batch = [upload for upload in uploads if upload['object_key'].startswith(batch_prefix)]
+    uploads = fair_order([upload for upload in uploads if not upload['object_key'].startswith(batch_prefix)])
+    in_flight = count_in_flight()
+    free_slots = max(max_in_flight - in_flight, 0)
+    admitted, waiting = batch + uploads[:free_slots], uploads[free_slots:]
+    started = 0
+    failed = []
+    for upload in admitted:
+        try:
+            start_execution(upload)
+            started += 1
+        except Exception as e:
+            # The upload waits for the next dispatch, ahead of the others
+            logger.error("Error starting execution", object_key=upload['object_key'], error=str(e))
+            failed.append(upload)
+    waiting = failed + waiting
+    save_waiting(waiting)
+    save_queue_positions(waiting)
+    logger.info("Uploads dispatched", in_flight=in_flight, received=len(received), started=started,
+                failed=len(failed), waiting=len(waiting))
+    return {"started": started, "waiting": len(waiting)}
+
+
+def lambda_handler(event, context):
+    # Invoked on a schedule, for each upload and whenever an execution ends
+    logger.start_invocation(context)
+    logger.debug("Event", event=event)
+    return dispatch()
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import logger
+from clients import get_client
+from prepare_bedrock_prompts import batch_pending_prefix, format_speech_analyses, s3, save_result_to_cache
+from token_usage import publish_usage_report
+
+bedrock = get_client('bedrock')
+sfn = get_client('stepfunctions')
+
+bucket_name = os.environ.get('BUCKET_NAME')
+model_id = os.environ.get('BEDROCK_MODEL_ID')
+batch_role_arn = os.environ.get('BATCH_ROLE_ARN')
+
+# Bedrock only runs batch inference jobs of at least batch_min_records records.
+# Queued prompts wait for more until the oldest has waited batch_max_wait_minutes,
+# then fewer prompts are sent to Bedrock one by one by the batch state machine
+batch_min_records = int(os.environ.get('BATCH_MIN_RECORDS', '100'))
+batch_max_wait_minutes = int(os.environ.get('BATCH_MAX_WAIT_MINUTES', '60'))
+
+# Input, output and manifest of each batch, the manifest mapping its records to their recordings
+batch_jobs_prefix = 'bedrock_batch/jobs/'
+ended_job_statuses = ['Completed', 'PartiallyCompleted', 'Failed', 'Stopped', 'Expired']
+
+
+def get_batch_key(batch_id, name):
+    return f'{batch_jobs_prefix}{batch_id}/{name}'
+
+
+def get_record_id(object_key, analysis):
+    # Record IDs of batch inference input are 11 alphanumeric characters
+    return hashlib.sha256(f'{object_key}#{analysis}'.encode('utf-8')).hexdigest()[:11]
+
+
+def read_json(key):
+    return json.loads(s3.get_object(Bucket=bucket_name, Key=key)['Body'].read())
+
+
+def put_json(key, value):
+    s3.put_object(Bucket=bucket_name, Key=key, Body=json.dumps(value))
+
+
+def list_keys(prefix):
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket_name, Prefix=prefix):
+        for item in page.get('Contents', []):
+            yield item['Key']
+
+
+def list_pending():
+    return [(key, read_json(key)) for key in list_keys(batch_pending_prefix)]
+
+
+def submit_batch(now=None):
+    """
+    Gathers the queued prompts into a batch. Returns its mode: "job" for a
+    batch inference job, "on_demand" with the records the state machine
+    sends to Bedrock one by one, or "none" when the prompts keep waiting.
+    """
+    now = now or datetime.now(timezone.utc)
+    pending = list_pending()
+    if not pending:
+        return {"mode": "none"}
+    record_count = sum(len(recording['prompts']) for _, recording in pending)
+    oldest = min(datetime.fromisoformat(recording['queued_at']) for _, recording in pending)
+    if record_count < batch_min_records and now - oldest < timedelta(minutes=batch_max_wait_minutes):
+        logger.info("Waiting for more batch prompts", records=record_count, recordings=len(pending))
+        return {"mode": "none"}
+
+    batch_id = f"{now.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    logger.context['batch_id'] = batch_id
+    manifest = {"recordings": {}, "records": {}}
+    lines = []
+    for _, recording in pending:
+        record_ids = []
+        for analysis, payload in recording['prompts'].items():
+            record_id = get_record_id(recording['object_key'], analysis)
+            manifest['records'][record_id] = {"object_key": recording['object_key'], "analysis": analysis}
+            lines.append({"recordId": record_id, "modelInput": payload})
+            record_ids.append(record_id)
+        manifest['recordings'][recording['object_key']] = {"task_token": recording['task_token'], "record_ids": record_ids}
+
+    if record_count >= batch_min_records:
+        input_key = get_batch_key(batch_id, 'input.jsonl')
+        s3.put_object(Bucket=bucket_name, Key=input_key, Body='\n'.join(json.dumps(line) for line in lines))
+        job = bedrock.create_model_invocation_job(
+            jobName=f'psmb-{batch_id}',
+            roleArn=batch_role_arn,
+            modelId=model_id,
+            inputDataConfig={"s3InputDataConfig": {"s3Uri": f's3://{bucket_name}/{input_key}', "s3InputFormat": "JSONL"}},
+            outputDataConfig={"s3OutputDataConfig": {"s3Uri": f's3://{bucket_name}/{get_batch_key(batch_id, "output/")}'}}
+        )
+        manifest['job_arn'] = job['jobArn']
+        result = {"mode": "job", "batch_id": batch_id, "job_arn": job['jobArn']}
+    else:
+        records = []
+        for line in lines:
+            input_key = get_batch_key(batch_id, f"records/{line['recordId']}.json")
+            put_json(input_key, line['modelInput'])
+            records.append({
+                "input": f's3://{bucket_name}/{input_key}',
+                "output": f's3://{bucket_name}/{get_batch_key(batch_id, "records/" + line["recordId"] + ".out.json")}'
+            })
+        result = {"mode": "on_demand", "batch_id": batch_id, "records": records}
+
+    # The prompts leave the queue once the manifest can resume their executions
+    put_json(get_batch_key(batch_id, 'manifest.json'), manifest)
+    keys = [key for key, _ in pending]
+    for start in range(0, len(keys), 1000):
+        s3.delete_objects(Bucket=bucket_name, Delete={"Objects": [{"Key": key} for key in keys[start:start + 1000]]})
+    logger.info("Batch submitted", mode=result['mode'], records=record_count, recordings=len(pending))
+    return result
+
+
+def get_job_status(job_arn):
+    status = bedrock.get_model_invocation_job(jobIdentifier=job_arn)['status']
+    logger.info("Batch job status", job_arn=job_arn, status=status)
+    return {"status": status, "ended": status in ended_job_statuses}
+
+
+def read_job_results(batch_id):
+    # Bedrock writes one output line per input line, with the response or the error of the record
+    results = {}
+    for key in list_keys(get_batch_key(batch_id, 'output/')):
+        if not key.endswith('.jsonl.out'):
+            continue
+        for line in s3.get_object(Bucket=bucket_name, Key=key)['Body'].iter_lines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if 'modelOutput' in record:
+                results[record['recordId']] = record['modelOutput']
+            else:
+                logger.warning("Batch record failed", record_id=record.get('recordId'), error=record.get('error'))
+    return results
+
+
+def read_on_demand_results(batch_id, manifest):
+    results = {}
+    for record_id in manifest['records']:
+        try:
+            results[record_id] = read_json(get_batch_key(batch_id, f'records/{record_id}.out.json'))
+        except s3.exceptions.NoSuchKey:
+            logger.warning("Batch record failed", record_id=record_id)
+    return results
+
+
+def resume_execution(object_key, task_token, final_output):
+    try:
+        if final_output is None:
+            sfn.send_task_failure(taskToken=task_token, error="BatchInferenceFailed",
+                                  cause="Bedrock did not answer every prompt of the recording")
+        else:
+            sfn.send_task_success(taskToken=task_token, output=json.dumps(final_output))
+    except (sfn.exceptions.TaskDoesNotExist, sfn.exceptions.TaskTimedOut, sfn.exceptions.InvalidToken) as e:
+        # The execution has timed out or been stopped while the batch ran
+        logger.warning("No execution waiting for batch results", object_key=object_key, error=str(e))
+
+
+def fan_out(batch_id):
+    """
+    Combines the responses of each recording of a batch into its speech
+    recommendations and resumes the execution of the recording with them.
+    """
+    manifest = read_json(get_batch_key(batch_id, 'manifest.json'))
+    results = read_job_results(batch_id) if 'job_arn' in manifest else read_on_demand_results(batch_id, manifest)
+
+    failed = 0
+    for object_key, recording in manifest['recordings'].items():
+        final_output = None
+        if all(record_id in results for record_id in recording['record_ids']):
+            final_output = format_speech_analyses([
+                (manifest['records'][record_id]['analysis'], results[record_id]) for record_id in recording['record_ids']
+            ])
+            save_result_to_cache(final_output, bucket_name, object_key)
+        else:
+            failed += 1
+        resume_execution(object_key, recording['task_token'], final_output)
+
+    publish_usage_report([(record_id, response, False) for record_id, response in results.items()])
+    logger.info("Batch results sent", recordings=len(manifest['recordings']), failed=failed)
+    return {"recordings": len(manifest['recordings']), "failed": failed}
+
+
+def lambda_handler(event, context):
+    logger.start_invocation(context, action=event['action'], batch_id=event.get('batch_id'))
+    logger.debug("Event", event=event)
+
+    if event['action'] == 'submit':
+        return submit_batch()
+    elif event['action'] == 'status':
+        return get_job_status(event['job_arn'])
+    elif event['action'] == 'fan_out':
+        return fan_out(event['batch_id'])
+    raise ValueError(f"Unknown batch action {event['action']}")
@@ -0,0 +1,24 @@
+import os
+
+import boto3
+from botocore.config import Config
+
+# AWS clients are created once per execution environment, in the init phase or
+# on first use, and reused by every invocation it serves. Connections are kept
+# alive between invocations, and throttled calls are retried with the adaptive
+# mode, which also slows the client down while the service is throttling.
+client_config = Config(
+    max_pool_connections=int(os.environ.get('CLIENT_MAX_POOL_CONNECTIONS', '10')),
+    tcp_keepalive=True,
+    connect_timeout=5,
+    read_timeout=30,
+    retries={"mode": "adaptive", "max_attempts": int(os.environ.get('CLIENT_MAX_ATTEMPTS', '5'))}
+)
+
+clients = {}
+
+
+def get_client(service_name):
+    if service_name not in clients:
+        clients[service_name] = boto3.client(service_name, config=client_config)
+    return clients[service_name]
@@ -0,0 +1,158 @@
+import codecs
+import json
+
+# Incremental reader of large JSON documents, such as the Transcribe output of
+# a long recording, that only decodes the values it is asked for. Containers
+# are walked one member at a time and every other value is decoded and
+# dropped on its own, so memory stays bounded by the read buffer and the
+# largest single value instead of the whole document.
+
+chunk_size = 64 * 1024
+whitespace = " \t\n\r"
+decoder = json.JSONDecoder()
+
+
+class JsonStream:
+    """
+    Pull reader over a binary file object, like the Body of an S3 object.
+
+    iter_object yields the keys of an object and iter_array the positions of
+    an array; the caller must consume the value of each one with read_value,
+    skip_value or a nested iter_object or iter_array before the next.
+    """
+
+    def __init__(self, fileobj, chunk_size=chunk_size):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def _fill(self):
+        # Appends the next chunk, dropping the part of the buffer already consumed
+        data = self.fileobj.read(self.chunk_size)
+        self.bytes_read += len(data)
+        self.eof = not data
+        self.buffer = self.buffer[self.position:] + self.utf8.decode(data, final=self.eof)
+        self.position = 0
+
+    def _peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in whitespace:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                raise ValueError("Unexpected end of JSON document")
+            self._fill()
+
+    def _expect(self, characters):
+        character = self._peek()
+        if character not in characters:
+            raise ValueError(f"Expected one of {characters!r} at byte {self.bytes_read}, found {character!r}")
+        self.position += 1
+        return character
+
+    def read_value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof:
+                self._fill()
+                continue
+            self.position = end
+            return value
+
+    def skip_value(self):
+        character = self._peek()
+        if character == "{":
+            for _ in self.iter_object():
+                self.skip_value()
+        elif character == "[":
+            for _ in self.iter_array():
+                self.skip_value()
+        else:
+            self.read_value()
+
+    def iter_object(self):
+        self._expect("{")
+        if self._peek() == "}":
+            self.position += 1
+            return
+        while True:
+            key = self.read_value()
+            self._expect(":")
+            yield key
+            if self._expect(",}") == "}":
+                return
+
+    def iter_array(self):
+        self._expect("[")
+        if self._peek() == "]":
+            self.position += 1
+            return
+        position = 0
+        while True:
+            yield position
+            position += 1
+            if self._expect(",]") == "]":
+                return
+
+
+def iter_fields(stream, path):
+    """
+    Yields the keys of the object at path, a tuple of keys from the root,
+    skipping every other member on the way. The caller must consume the
+    value of each key.
+    """
+    for key in stream.iter_object():
+        if path and key == path[0]:
+            yield from iter_fields(stream, path[1:])
+            return
+        elif not path:
+            yield key
+        else:
+            stream.skip_value()
+
+
+def iter_values(stream):
+    for _ in stream.iter_array():
+        yield stream.read_value()
+
+
+def read_transcription(fileobj, items=True):
+    """
+    Reads the transcript of a Transcribe output and, if items is set, its
+    per-word items, in the same shape as the output. Transcribe writes the
+    items after the transcripts, so they are an iterator read from the
+    stream as it is consumed. Everything else, such as the audio segments
+    that repeat the transcript and items, is skipped or never downloaded.
+    """
+    stream = JsonStream(fileobj)
+    results = {}
+    for key in iter_fields(stream, ("results",)):
+        if key == "transcripts":
+            results["transcripts"] = stream.read_value()
+        elif key == "items" and items:
+            if "transcripts" in results:
+                results["items"] = iter_values(stream)
+                break
+            results["items"] = list(iter_values(stream))
+        else:
+            stream.skip_value()
+        if "transcripts" in results and not items:
+            break
+    return {"results": results}
+
+
+def read_transcript(fileobj):
+    return read_transcription(fileobj, items=False)["results"]["transcripts"][0]["transcript"]
@@ -0,0 +1,73 @@
+import json
+import os
+import random
+import time
+
+# Log lines are JSON objects, so they can be queried with CloudWatch Logs
+# Insights, and their values are truncated so that a long transcript or
+# Bedrock payload costs a bounded amount of log ingestion.
+
+levels = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+# Verbose dumps of events and payloads are DEBUG lines, logged for every
+# invocation at log level DEBUG and for a sample_rate share of the others
+log_level = levels.get(os.environ.get('LOG_LEVEL', 'INFO').upper(), levels['INFO'])
+max_chars = int(os.environ.get('LOG_MAX_CHARS', '1000'))
+sample_rate = float(os.environ.get('LOG_SAMPLE_RATE', '0'))
+
+# Fields added to every line of the current invocation
+context = {}
+invocation_level = log_level
+
+
+def start_invocation(lambda_context=None, **fields):
+    global invocation_level
+    context.clear()
+    if lambda_context is not None:
+        context["request_id"] = lambda_context.aws_request_id
+    context.update(fields)
+    sampled = sample_rate and random.random() < sample_rate
+    invocation_level = levels['DEBUG'] if sampled else log_level
+    if sampled:
+        context["sampled"] = True
+
+
+def truncate(value, limit=None):
+    # Strings and serialised containers longer than the limit keep their start and their size
+    limit = max_chars if limit is None else limit
+    text = value if isinstance(value, str) else json.dumps(value, default=str, ensure_ascii=False)
+    if not limit or len(text) <= limit:
+        return value
+    return f"{text[:limit]}... ({len(text)} characters)"
+
+
+def is_enabled(level):
+    return levels[level] >= invocation_level
+
+
+def log(level, message, **fields):
+    if not is_enabled(level):
+        return
+    print(json.dumps({
+        "timestamp": round(time.time(), 3),
+        "level": level,
+        "message": message,
+        **context,
+        **{name: truncate(value) for name, value in fields.items()}
+    }, default=str, ensure_ascii=False))
+
+
+def debug(message, **fields):
+    log('DEBUG', message, **fields)
+
+
+def info(message, **fields):
+    log('INFO', message, **fields)
+
+
+def warning(message, **fields):
+    log('WARNING', message, **fields)
+
+
+def error(message, **fields):
+    log('ERROR', message, **fields)
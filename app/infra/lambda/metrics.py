@@ -0,0 +1,49 @@
+import json
+import time
+from contextlib import contextmanager
+
+# CloudWatch namespace of the metrics published by the Lambda functions
+namespace = "PublicSpeakingMentorAIAssistant"
+
+
+def put_metrics(metrics, dimensions=None, unit="Count"):
+    # Metrics are printed in the CloudWatch Embedded Metric Format, so Lambda
+    # publishes them from its logs without any PutMetricData call
+    dimensions = dimensions or {}
+    print(json.dumps({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": namespace,
+                "Dimensions": [list(dimensions.keys())],
+                "Metrics": [{"Name": name, "Unit": unit} for name in metrics]
+            }]
+        },
+        **dimensions,
+        **metrics
+    }))
+
+
+class PhaseTimer:
+    """
+    Time spent in each phase of an invocation, such as S3 reads, payload
+    builds and S3 writes, published as one EMF record when it ends.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.durations = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + (self.clock() - start) * 1000
+
+    def publish(self, dimensions=None):
+        if self.durations:
+            put_metrics({f"{name}Duration": round(ms, 3) for name, ms in self.durations.items()},
+                        dimensions, unit="Milliseconds")
+        self.durations = {}
@@ -0,0 +1,76 @@
+import json
+import os
+import time
+
+import logger
+from clients import get_client
+from speech_analysis.bedrock_prompts import max_tokens
+
+# Prompts on a whole transcript are routed to a model and max_tokens by the
+# length of the transcript and the analysis depth chosen at upload. The routes
+# are the JSON value of an SSM parameter, so they can be tuned without a
+# deployment, and are read again after routes_ttl_seconds. The first route
+# whose max_words and depths match the speech is taken, so they are listed
+# from the smallest model up:
+#   [{"name": "short", "max_words": 600, "depths": ["quick", "standard"],
+#     "model_id": "anthropic.claude-3-haiku-20240307-v1:0", "max_tokens": 2000}]
+# Speeches matching no route go to default_model_id.
+model_routes_parameter = os.environ.get('MODEL_ROUTES_PARAMETER')
+default_model_id = os.environ.get('BEDROCK_MODEL_ID')
+# The state machine has a branch, and permissions, for each of these models only
+routed_model_ids = [model_id for model_id in os.environ.get('BEDROCK_ROUTED_MODEL_IDS', '').split(',') if model_id]
+routes_ttl_seconds = 300
+
+analysis_depths = ["quick", "standard", "detailed"]
+default_analysis_depth = "standard"
+
+routes = None
+routes_loaded_at = 0.0
+
+
+def is_enabled():
+    return bool(model_routes_parameter)
+
+
+def load_routes():
+    global routes, routes_loaded_at
+    if routes is not None and time.monotonic() - routes_loaded_at < routes_ttl_seconds:
+        return routes
+    try:
+        value = get_client('ssm').get_parameter(Name=model_routes_parameter)['Parameter']['Value']
+        routes = json.loads(value)
+    except Exception as e:
+        # The last routes read, or none, keep routing until the parameter can be read again
+        logger.error("Error reading the model routes", parameter=model_routes_parameter, error=str(e))
+        routes = routes or []
+    routes_loaded_at = time.monotonic()
+    return routes
+
+
+def matches(route, words, depth):
+    return words <= route.get('max_words', words) and depth in route.get('depths', analysis_depths)
+
+
+def select_route(route_table, words, depth=default_analysis_depth):
+    """
+    Returns the routing decision for a speech of a number of words: the name
+    of the route, the model ID and the max_tokens of its prompts.
+    """
+    if depth not in analysis_depths:
+        depth = default_analysis_depth
+    route = next((route for route in route_table if matches(route, words, depth)), {})
+    model_id = route.get('model_id', default_model_id)
+    if model_id != default_model_id and model_id not in routed_model_ids:
+        logger.warning("Model of the route not deployed, using the default model", route=route.get('name'), model_id=model_id)
+        model_id = default_model_id
+    return {
+        "name": route.get('name', 'default'),
+        "model_id": model_id,
+        "max_tokens": route.get('max_tokens', max_tokens)
+    }
+
+
+def get_route(words, depth=default_analysis_depth):
+    route = select_route(load_routes(), words, depth)
+    logger.info("Prompt routed", words=words, depth=depth, **route)
+    return route
@@ -0,0 +1,62 @@
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+
+import logger
+from metrics import put_metrics
+
+# Bedrock responses are stored under this prefix by hash of the prompt payload
+prompt_cache_prefix = "bedrock_prompts/cache/"
+
+
+def get_prompt_cache_key(payload, model_id=None):
+    # The payload holds the transcript, system prompt, anthropic_version and
+    # max_tokens, so changing any of them changes the key. Routed prompts also
+    # key on their model, as the same prompt can be routed to another one
+    if model_id:
+        payload = {**payload, "model_id": model_id}
+    serialized = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class PromptCache:
+    """
+    Bedrock responses stored in S3 by hash of the normalised prompt payload.
+
+    A miss points the Bedrock task output at the cache key, so the response
+    Bedrock writes becomes the cache entry. A hit lets the state machine skip
+    the Bedrock call. Entries older than ttl_days count as misses and are
+    overwritten; the bucket lifecycle rule on the prefix evicts the rest.
+    """
+
+    def __init__(self, s3_client, bucket_name, ttl_days):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.ttl_days = ttl_days
+
+    @property
+    def enabled(self):
+        return self.ttl_days > 0
+
+    def get_output_key(self, cache_key):
+        return f"{prompt_cache_prefix}{cache_key}.json"
+
+    def is_cached(self, cache_key):
+        try:
+            response = self.s3_client.head_object(Bucket=self.bucket_name, Key=self.get_output_key(cache_key))
+        except Exception as e:
+            if getattr(e, "response", {}).get("Error", {}).get("Code") not in ("404", "NoSuchKey"):
+                logger.error("Error reading prompt cache entry", cache_key=cache_key, error=str(e))
+            return False
+        return datetime.now(timezone.utc) - response["LastModified"] < timedelta(days=self.ttl_days)
+
+    def lookup(self, payload, prompt_name, model_id=None):
+        """
+        Returns the cache key of a payload and whether Bedrock already answered
+        it, and publishes the hit or miss metric of the prompt.
+        """
+        cache_key = get_prompt_cache_key(payload, model_id)
+        cached = self.is_cached(cache_key)
+        logger.info(f"Prompt cache {'hit' if cached else 'miss'}", prompt=prompt_name, cache_key=cache_key)
+        put_metrics({"PromptCacheHit": int(cached), "PromptCacheMiss": int(not cached)}, {"Prompt": prompt_name})
+        return cache_key, cached
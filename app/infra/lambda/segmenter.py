@@ -0,0 +1,113 @@
+import re
+
+from speech_analysis.speech_metrics import format_time
+
+# Sentences end with one of these, as in the punctuation added by Transcribe
+sentence_end = re.compile(r"[.!?]$")
+
+
+def words_from_text(transcript):
+    return [{"content": word, "start_time": None, "end_time": None} for word in transcript.split()]
+
+
+def words_from_items(items):
+    # Transcribe items are either words with timings or punctuation to append to the previous word
+    words = []
+    for item in items:
+        content = item["alternatives"][0]["content"]
+        if item["type"] == "punctuation":
+            if words:
+                words[-1]["content"] += content
+            continue
+        words.append({
+            "content": content,
+            "start_time": float(item["start_time"]),
+            "end_time": float(item["end_time"])
+        })
+    return words
+
+
+def split_sentences(words, max_words):
+    """
+    Groups words into sentences of at most max_words words, each sentence
+    being the list of its word positions.
+    """
+    sentences = []
+    sentence = []
+    for position, word in enumerate(words):
+        sentence.append(position)
+        if sentence_end.search(word["content"]) or len(sentence) == max_words:
+            sentences.append(sentence)
+            sentence = []
+    if sentence:
+        sentences.append(sentence)
+    return sentences
+
+
+def make_chunk(index, words, sentences):
+    first, last = sentences[0][0], sentences[-1][-1]
+    chunk = {
+        "index": index,
+        "text": " ".join(words[position]["content"] for position in range(first, last + 1)),
+        "first_word": first,
+        "last_word": last
+    }
+    start_time, end_time = words[first]["start_time"], words[last]["end_time"]
+    if start_time is not None and end_time is not None:
+        chunk["label"] = f"{format_time(start_time)}-{format_time(end_time)}"
+    else:
+        chunk["label"] = f"words {first + 1}-{last + 1}"
+    return chunk
+
+
+def segment_words(words, max_words, overlap_words, max_seconds=None):
+    """
+    Splits words into chunks of whole sentences of at most max_words words
+    and, when the words have timings, at most max_seconds of speech. Each
+    chunk starts with up to overlap_words words of the end of the previous
+    one, so feedback on a sentence cut by a boundary keeps its context.
+    """
+    overlap_words = min(overlap_words, max_words // 2)
+    chunks = []
+    current = []
+    current_words = 0
+    new_words = 0
+
+    def is_too_long(sentence):
+        if current_words + len(sentence) > max_words:
+            return True
+        start_time, end_time = words[current[0][0]]["start_time"], words[sentence[-1]]["end_time"]
+        return bool(max_seconds) and start_time is not None and end_time - start_time > max_seconds
+
+    # Run-on sentences, or transcripts without punctuation, are cut at the
+    # overlap size so that chunk boundaries can still overlap
+    for sentence in split_sentences(words, overlap_words or max_words):
+        if new_words and is_too_long(sentence):
+            chunks.append(make_chunk(len(chunks), words, current))
+            # Carry the last sentences of the chunk over to the next one
+            overlap = []
+            overlap_count = 0
+            for previous in reversed(current):
+                if overlap_count + len(previous) > overlap_words:
+                    break
+                overlap.insert(0, previous)
+                overlap_count += len(previous)
+            current, current_words, new_words = overlap, overlap_count, 0
+        # Drop overlap sentences that leave no room for the next sentence
+        while current and new_words == 0 and is_too_long(sentence):
+            current_words -= len(current.pop(0))
+        current.append(sentence)
+        current_words += len(sentence)
+        new_words += len(sentence)
+
+    if new_words:
+        chunks.append(make_chunk(len(chunks), words, current))
+    return chunks
+
+
+def segment_transcription(transcription, max_words, overlap_words, max_seconds=None):
+    # Use the word timings of the Transcribe output when they are available
+    words = words_from_items(transcription["results"].get("items") or [])
+    if not words:
+        words = words_from_text(transcription["results"]["transcripts"][0]["transcript"])
+    return segment_words(words, max_words, overlap_words, max_seconds)
@@ -0,0 +1,44 @@
+import logger
+from metrics import put_metrics
+
+# Input tokens of a Bedrock response are split between the tokens read from
+# the Bedrock prompt cache, the tokens written to it and the other ones
+usage_fields = ["input_tokens", "cache_read_input_tokens", "cache_creation_input_tokens", "output_tokens"]
+
+
+def get_usage(response):
+    usage = response.get("usage") or {}
+    return {field: int(usage.get(field) or 0) for field in usage_fields}
+
+
+def usage_report(responses):
+    """
+    Token accounting of the Bedrock calls of an execution, from a list of
+    (prompt name, Bedrock response, cached) tuples. Responses from the S3
+    prompt cache cost no tokens in this execution, so they are only counted.
+    """
+    report = {"prompts": {}, **{field: 0 for field in usage_fields}, "responses_from_cache": 0}
+    for prompt_name, response, cached in responses:
+        if cached:
+            report["responses_from_cache"] += 1
+            continue
+        usage = get_usage(response)
+        report["prompts"][prompt_name] = usage
+        for field in usage_fields:
+            report[field] += usage[field]
+    total_input_tokens = report["input_tokens"] + report["cache_read_input_tokens"] + report["cache_creation_input_tokens"]
+    report["total_input_tokens"] = total_input_tokens
+    report["cached_input_tokens_percent"] = round(report["cache_read_input_tokens"] / total_input_tokens * 100, 1) if total_input_tokens else 0.0
+    return report
+
+
+def publish_usage_report(responses):
+    report = usage_report(responses)
+    logger.info("Bedrock token usage", **report)
+    put_metrics({
+        "InputTokens": report["input_tokens"],
+        "CacheReadInputTokens": report["cache_read_input_tokens"],
+        "CacheWriteInputTokens": report["cache_creation_input_tokens"],
+        "OutputTokens": report["output_tokens"]
+    })
+    return report
@@ -0,0 +1,71 @@
+import json
+import os
+
+from botocore.exceptions import ClientError
+
+import logger
+from clients import get_client
+
+s3 = get_client('s3')
+transcribe = get_client('transcribe')
+sfn = get_client('stepfunctions')
+
+# Prefix where the task token of each execution waiting for its transcription job is stored
+callback_prefix = 'transcription-callbacks/'
+terminal_job_statuses = ['COMPLETED', 'FAILED']
+
+
+def get_callback_key(job_name):
+    return f'{callback_prefix}{job_name}'
+
+
+def send_job_result(task_token, job):
+    # The execution resumes with the same output as a GetTranscriptionJob call,
+    # so the state machine evaluates the job status as it does when polling
+    try:
+        sfn.send_task_success(taskToken=task_token, output=json.dumps({"TranscriptionJob": job}, default=str))
+        logger.info("Resumed execution waiting for transcription job", job_name=job['TranscriptionJobName'])
+    except (sfn.exceptions.TaskDoesNotExist, sfn.exceptions.TaskTimedOut, sfn.exceptions.InvalidToken) as e:
+        # Already resumed by the other path, or the execution has ended
+        logger.warning("No task waiting for transcription job", job_name=job['TranscriptionJobName'], error=str(e))
+
+
+def register_callback(event, bucket_name):
+    # Invoked by the state machine with the task token to send back once the job has ended
+    job_name = event['TranscriptionJobName']
+    s3.put_object(Bucket=bucket_name, Key=get_callback_key(job_name), Body=event['TaskToken'])
+    logger.info("Waiting for transcription job", job_name=job_name)
+
+    # The job may have ended before the token was stored, and its event found no token
+    job = transcribe.get_transcription_job(TranscriptionJobName=job_name)['TranscriptionJob']
+    if job['TranscriptionJobStatus'] in terminal_job_statuses:
+        send_job_result(event['TaskToken'], job)
+        s3.delete_object(Bucket=bucket_name, Key=get_callback_key(job_name))
+
+
+def handle_job_state_change(event, bucket_name):
+    # Invoked by EventBridge when a transcription job completes or fails
+    job_name = event['detail']['TranscriptionJobName']
+    # The rule matches every job of the account, most of which have no stored token
+    try:
+        response = s3.get_object(Bucket=bucket_name, Key=get_callback_key(job_name))
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in ('NoSuchKey', '404'):
+            raise
+        logger.info("No execution waiting for transcription job", job_name=job_name)
+        return
+    task_token = response['Body'].read().decode('utf-8')
+    job = transcribe.get_transcription_job(TranscriptionJobName=job_name)['TranscriptionJob']
+    send_job_result(task_token, job)
+    s3.delete_object(Bucket=bucket_name, Key=get_callback_key(job_name))
+
+
+def lambda_handler(event, context):
+    logger.start_invocation(context)
+    logger.debug("Event", event=event)
+    bucket_name = os.environ['BUCKET_NAME']
+
+    if 'TaskToken' in event:
+        register_callback(event, bucket_name)
+    else:
+        handle_job_state_change(event, bucket_name)
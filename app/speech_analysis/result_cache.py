@@ -0,0 +1,23 @@
+# Keys of the result cache, by content hash of the recording. The Lambda
+# function writes the entries and the webapp reads them, so both compute
+# the content hash the same way.
+
+import base64
+
+# Prefix where the state machine stores the result of each analysed recording
+result_cache_prefix = "result-cache/"
+
+
+def get_content_hash(checksum):
+    """
+    Returns the content hash of a recording from the SHA-256 checksum of its
+    upload: the hex digest, followed by the part count for multipart uploads,
+    as S3 checksums each part and then the part checksums.
+    """
+    digest, _, part_count = checksum.partition("-")
+    content_hash = base64.b64decode(digest).hex()
+    return f"{content_hash}-{part_count}" if part_count else content_hash
+
+
+def get_result_cache_key(content_hash):
+    return f"{result_cache_prefix}{content_hash}.json"
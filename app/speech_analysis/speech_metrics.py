@@ -0,0 +1,174 @@
+# Delivery metrics measured from the word timings of the Transcribe output,
+# so the model is given the counts instead of counting them itself.
+# This module only depends on NumPy so that the webapp can measure the same
+# metrics when it streams feedback.
+
+import importlib.util
+import re
+
+# NumPy is imported on first use, so the steps that do not measure the metrics
+# do not pay for its import on a cold start. Metrics are only measured, and
+# the word items only read, when it is available.
+np = None
+enabled = importlib.util.find_spec("numpy") is not None
+
+
+def load_numpy():
+    global np
+    if np is None and enabled:
+        import numpy
+        np = numpy
+    return np
+
+filler_words = ["um", "umm", "uh", "uhh", "ah", "ahh", "er", "erm", "hmm", "mm"]
+
+# Silences between two words of at least pause_seconds are pauses
+pause_seconds = 1.0
+pause_bins = [1.0, 2.0, 5.0]
+pace_window_seconds = 60
+low_confidence = 0.5
+# Phrases of repeated_phrase_words words said at least min_phrase_repeats times
+repeated_phrase_words = 3
+min_phrase_repeats = 3
+max_listed = 5
+
+
+def format_time(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def word_arrays(items):
+    # A single pass, as the items may be read from the Transcribe output as they are consumed
+    contents, starts, ends, confidences = [], [], [], []
+    for item in items:
+        if item["type"] != "pronunciation":
+            continue
+        alternative = item["alternatives"][0]
+        contents.append(re.sub(r"[^\w']", "", alternative["content"].lower()))
+        starts.append(float(item["start_time"]))
+        ends.append(float(item["end_time"]))
+        confidences.append(float(alternative.get("confidence", 1.0)))
+    return np.array(contents, dtype=str), np.array(starts), np.array(ends), np.array(confidences)
+
+
+def pace_metrics(starts, ends):
+    # Words per minute in each window of the speech; a last window shorter
+    # than half a window is too short to give a meaningful pace
+    duration = ends[-1] - starts[0]
+    windows = ((starts - starts[0]) // pace_window_seconds).astype(int)
+    counts = np.bincount(windows)
+    window_seconds = np.full(len(counts), float(pace_window_seconds))
+    window_seconds[-1] = max(duration - (len(counts) - 1) * pace_window_seconds, 1.0)
+    pace = counts / window_seconds * 60
+    if len(pace) > 1 and window_seconds[-1] < pace_window_seconds / 2:
+        pace = pace[:-1]
+    return {
+        "duration_seconds": round(float(duration), 1),
+        "words_per_minute": round(float(len(starts) / max(duration, 1.0) * 60)),
+        "words_per_minute_by_window": [round(float(value)) for value in pace],
+    }
+
+
+def pause_metrics(starts, ends):
+    gaps = starts[1:] - ends[:-1]
+    pauses = gaps[gaps >= pause_seconds]
+    metrics = {
+        "pauses": int(len(pauses)),
+        "pauses_by_length": [int(count) for count in np.histogram(pauses, bins=pause_bins + [np.inf])[0]],
+        "median_gap_seconds": round(float(np.median(gaps)), 2) if len(gaps) else 0.0,
+    }
+    if len(pauses):
+        longest = int(np.argmax(gaps))
+        metrics["longest_pause_seconds"] = round(float(gaps[longest]), 1)
+        metrics["longest_pause_at"] = format_time(ends[longest])
+    return metrics
+
+
+def filler_metrics(contents):
+    is_filler = np.isin(contents, filler_words)
+    fillers, counts = np.unique(contents[is_filler], return_counts=True)
+    order = np.argsort(-counts, kind="stable")
+    return is_filler, {
+        "filler_words": int(is_filler.sum()),
+        "filler_words_per_100_words": round(float(is_filler.mean() * 100), 1),
+        "fillers": {str(fillers[i]): int(counts[i]) for i in order},
+    }
+
+
+def repetition_metrics(contents, starts, is_filler):
+    # Fillers are skipped, so "the um the" is a repeated word
+    positions = np.flatnonzero(~is_filler & (contents != ""))
+    words = contents[positions]
+    repeated = np.flatnonzero(words[1:] == words[:-1]) + 1
+    metrics = {
+        "repeated_words": int(len(repeated)),
+        "repeated_words_at": [f"{words[i]} ({format_time(starts[positions[i]])})" for i in repeated[:max_listed]],
+        "repeated_phrases": {},
+    }
+
+    n = repeated_phrase_words
+    if len(words) < n:
+        return metrics
+    # Each phrase gets an integer key from the vocabulary ids of its words
+    _, ids = np.unique(words, return_inverse=True)
+    vocabulary_size = int(ids.max()) + 1
+    keys = ids[:len(ids) - n + 1].astype(np.int64)
+    for offset in range(1, n):
+        keys = keys * vocabulary_size + ids[offset:len(ids) - n + 1 + offset]
+    _, first_positions, counts = np.unique(keys, return_index=True, return_counts=True)
+    frequent = np.flatnonzero(counts >= min_phrase_repeats)
+    frequent = frequent[np.argsort(-counts[frequent], kind="stable")][:max_listed]
+    metrics["repeated_phrases"] = {
+        " ".join(words[first_positions[i]:first_positions[i] + n]): int(counts[i]) for i in frequent
+    }
+    return metrics
+
+
+def compute_speech_metrics(transcription):
+    """
+    Returns the delivery metrics of a Transcribe output: pace over time,
+    pauses, filler words, repetitions and transcription confidence. Returns
+    None when NumPy is not available or the output has no word timings.
+    """
+    items = transcription["results"].get("items")
+    if not enabled or not items:
+        return None
+    load_numpy()
+    contents, starts, ends, confidences = word_arrays(items)
+    if not len(contents):
+        return None
+
+    is_filler, fillers = filler_metrics(contents)
+    return {
+        "words": int(len(contents)),
+        **pace_metrics(starts, ends),
+        **pause_metrics(starts, ends),
+        **fillers,
+        **repetition_metrics(contents, starts, is_filler),
+        "low_confidence_words_percent": round(float((confidences < low_confidence).mean() * 100), 1),
+    }
+
+
+def format_speech_metrics(metrics):
+    # Short plain text for the prompt, one line per metric
+    lines = [
+        f"Duration: {format_time(metrics['duration_seconds'])}, {metrics['words']} words, "
+        f"{metrics['words_per_minute']} words per minute overall",
+        f"Words per minute in each minute: {', '.join(map(str, metrics['words_per_minute_by_window']))}",
+        f"Pauses of {pause_seconds:g} s or more: {metrics['pauses']} "
+        f"({', '.join(f'{count} of {low:g}-{high:g} s' for count, low, high in zip(metrics['pauses_by_length'], pause_bins, pause_bins[1:]))}, "
+        f"{metrics['pauses_by_length'][-1]} over {pause_bins[-1]:g} s)",
+    ]
+    if metrics["pauses"]:
+        lines.append(f"Longest pause: {metrics['longest_pause_seconds']} s at {metrics['longest_pause_at']}")
+    fillers = ", ".join(f"{filler} {count}" for filler, count in metrics["fillers"].items()) or "none"
+    lines.append(f"Filler words: {metrics['filler_words']} ({metrics['filler_words_per_100_words']} per 100 words): {fillers}")
+    lines.append(f"Immediately repeated words: {metrics['repeated_words']}"
+                 + (f" ({', '.join(metrics['repeated_words_at'])})" if metrics["repeated_words_at"] else ""))
+    if metrics["repeated_phrases"]:
+        phrases = ", ".join(f'"{phrase}" {count} times' for phrase, count in metrics["repeated_phrases"].items())
+        lines.append(f"Repeated phrases: {phrases}")
+    lines.append(f"Words transcribed with low confidence, possibly mumbled: {metrics['low_confidence_words_percent']}%")
+    return "\n".join(f"- {line}" for line in lines)
@@ -0,0 +1,87 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Cold and warm invocations of the prompts Lambda function, with the S3 client
+replaced by the in-memory stub so only the function's own work is timed.
+
+Each scenario runs in a fresh interpreter, as a new execution environment:
+the init phase imports the handler module, then the feedback prompt of a
+transcript with word items is created once (cold) and again (warm). With
+INIT_WARM_UP, as with SnapStart or provisioned concurrency, NumPy and the
+clients are loaded during the init phase instead of the first invocation.
+The last table compares a client created per call with the reused one.
+
+Run from the app directory:
+
+    python -m tests.benchmark.bench_lambda_cold_start
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import boto3
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "infra", "lambda")
+WARM_INVOCATIONS = 20
+
+INVOCATION_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import prepare_bedrock_prompts
+init_ms = (time.perf_counter() - start) * 1000
+
+from tests.unit.stubs import FakeS3Client
+from tests.unit.test_speech_metrics import transcription
+
+s3 = FakeS3Client()
+s3.put_object(Bucket="psmb-bucket", Key="transcribed-text-files/raw-audio-files/user/speech.mp4-temp.json",
+              Body=json.dumps(transcription(["Um,", "good", "morning", "everyone."] * 500)))
+prepare_bedrock_prompts.s3 = s3
+event = {"detail": {"bucket": {"name": "psmb-bucket"}, "object": {"key": "raw-audio-files/user/speech.mp4"}}}
+
+timings = []
+for _ in range(1 + int(sys.argv[1])):
+    start = time.perf_counter()
+    prepare_bedrock_prompts.lambda_handler(event, None)
+    timings.append((time.perf_counter() - start) * 1000)
+print(json.dumps({"init_ms": init_ms, "cold_ms": timings[0], "warm_ms": sum(timings[1:]) / len(timings[1:])}))
+"""
+
+
+def run_scenario(warm_up):
+    environment = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([LAMBDA_DIR, os.getcwd()]),
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "LOG_LEVEL": "ERROR",
+        "INIT_WARM_UP": "true" if warm_up else "false",
+    }
+    output = subprocess.run([sys.executable, "-c", INVOCATION_SCRIPT, str(WARM_INVOCATIONS)],
+                            env=environment, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def client_per_call_ms(calls=20):
+    # send_sns_notification used to create its client on every call
+    session = boto3.Session(region_name="us-east-1", aws_access_key_id="testing", aws_secret_access_key="testing")
+    start = time.perf_counter()
+    for _ in range(calls):
+        session.client("sns")
+    return (time.perf_counter() - start) * 1000 / calls
+
+
+def main():
+    print(f"{'scenario':>12} {'init (ms)':>10} {'cold invocation (ms)':>21} {'warm invocation (ms)':>21}")
+    for name, warm_up in [("lazy init", False), ("warm-up", True)]:
+        result = run_scenario(warm_up)
+        print(f"{name:>12} {result['init_ms']:>10.1f} {result['cold_ms']:>21.1f} {result['warm_ms']:>21.1f}")
+    print(f"new SNS client per call: {client_per_call_ms():.1f} ms, reused client: 0.0 ms")
+
+
+if __name__ == "__main__":
+    main()
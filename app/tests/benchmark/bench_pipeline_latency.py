@@ -0,0 +1,99 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Latency comparison of the sequential and parallel analysis pipelines.
+
+Both state machines are synthesized and their definitions walked from the
+first state after the transcription, with stubbed Lambda and Bedrock timings:
+a Bedrock call takes a fixed time to first token plus its output tokens at a
+fixed throughput. Map iterations are scheduled on MaxConcurrency workers.
+
+Run from the app directory:
+
+    python -m tests.benchmark.bench_pipeline_latency
+"""
+import heapq
+
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+
+from infra.infra_stack import InfraStack
+from tests.unit.test_infra_stack import get_state_machine_definition
+
+LAMBDA_SECONDS = 0.4
+TIME_TO_FIRST_TOKEN_SECONDS = 1.5
+OUTPUT_TOKENS_PER_SECOND = 50
+# Output tokens of each Bedrock call, by state name or by parallel analysis
+OUTPUT_TOKENS = {
+    "GetSpeechFeedback": 900,
+    "GetSpeechRewrite": 1200,
+    "delivery": 350,
+    "language": 350,
+    "structure": 250,
+    "rewrite": 1200,
+}
+BEDROCK_STATES = ["GetSpeechFeedback", "GetSpeechRewrite", "GetSpeechAnalysis"]
+
+
+def task_seconds(name, item):
+    if name in BEDROCK_STATES:
+        tokens = OUTPUT_TOKENS[item if name == "GetSpeechAnalysis" else name]
+        return TIME_TO_FIRST_TOKEN_SECONDS + tokens / OUTPUT_TOKENS_PER_SECOND
+    if name == "PublishToSNS":
+        return 0.1
+    return LAMBDA_SECONDS
+
+
+def map_seconds(state, items, cached):
+    # Greedy scheduling of the iterations on MaxConcurrency workers
+    workers = [0.0] * (state.get("MaxConcurrency") or len(items))
+    processor = state["ItemProcessor"]
+    for item in items:
+        start = heapq.heappop(workers)
+        heapq.heappush(workers, start + walk(processor["States"], processor["StartAt"], cached, item))
+    return max(workers)
+
+
+def walk(states, name, cached, item=None):
+    """
+    Returns the seconds spent from the given state to the end of the branch.
+    Choices on the prompt cache follow the hit or the miss branch.
+    """
+    seconds = 0.0
+    map_items = []
+    while name:
+        state = states[name]
+        if state["Type"] == "Task":
+            seconds += task_seconds(name, item)
+        elif state["Type"] == "Map":
+            seconds += map_seconds(state, map_items, cached)
+        elif state["Type"] == "Pass" and isinstance(state.get("Result"), list):
+            # ListSpeechAnalyses gives the Map its items
+            map_items = state["Result"]
+        if state["Type"] == "Choice":
+            name = state["Choices"][0]["Next"] if cached else state["Default"]
+        else:
+            name = state.get("Next")
+    return seconds
+
+
+def pipeline_seconds(pipeline_mode, cached):
+    # Speeches short enough to be analysed whole
+    stack = InfraStack(core.App(), f"Bench{pipeline_mode.title()}", pipeline_mode=pipeline_mode, chunk_max_words=0)
+    states = get_state_machine_definition(assertions.Template.from_stack(stack))["States"]
+    first_state = states["EvaluateTranscriptionJobStatus"]["Choices"][0]["Next"]
+    return walk(states, first_state, cached)
+
+
+def main():
+    print(f"{'pipeline':>12} {'cache miss (s)':>15} {'cache hit (s)':>14}")
+    results = {}
+    for pipeline_mode in ("sequential", "parallel"):
+        results[pipeline_mode] = pipeline_seconds(pipeline_mode, cached=False)
+        print(f"{pipeline_mode:>12} {results[pipeline_mode]:>15.1f} {pipeline_seconds(pipeline_mode, cached=True):>14.1f}")
+    print(f"parallel pipeline speed-up on a cache miss: {results['sequential'] / results['parallel']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Time taken to measure the delivery metrics of synthetic Transcribe outputs
+of increasing length, from reading the items to formatting the prompt text.
+
+Run from the app directory:
+
+    python -m tests.benchmark.bench_speech_metrics
+"""
+import random
+import time
+
+from speech_analysis import speech_metrics
+from tests.unit.test_speech_metrics import transcription
+
+FILLERS = ["um", "uh", "ah"]
+REPEATS = 5
+
+
+def synthetic_words(word_count, seed=7):
+    # A vocabulary of 2000 words, with a filler word every 20 words on average
+    rng = random.Random(seed)
+    return [rng.choice(FILLERS) if rng.random() < 0.05 else f"w{rng.randrange(2000)}" for _ in range(word_count)]
+
+
+def main():
+    print(f"{'words':>8} {'metrics (ms)':>13} {'format (ms)':>12}")
+    for word_count in (1_000, 10_000, 100_000):
+        data = transcription(synthetic_words(word_count))
+        timings = []
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            metrics = speech_metrics.compute_speech_metrics(data)
+            measured = time.perf_counter()
+            speech_metrics.format_speech_metrics(metrics)
+            timings.append((measured - start, time.perf_counter() - measured))
+        metrics_seconds, format_seconds = min(timings)
+        print(f"{word_count:>8} {metrics_seconds * 1000:>13.1f} {format_seconds * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Benchmark of the webapp start-up: time to import the webapp utilities in a
+fresh interpreter with no AWS configuration, and time to the first AWS
+client once one is needed.
+
+Run from the app directory:
+
+    python -m tests.benchmark.bench_startup
+"""
+import os
+import subprocess
+import sys
+
+REPEATS = 5
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import webapp.utils.stepfn as stepfn
+imported = time.perf_counter()
+stepfn.get_registry().client("stepfunctions", region_name="us-east-1")
+client_created = time.perf_counter()
+print(imported - start, client_created - imported)
+"""
+
+
+def offline_env():
+    # No credentials, region or config files: any network lookup would fail
+    env = {key: value for key, value in os.environ.items() if not key.startswith("AWS_")}
+    env["AWS_CONFIG_FILE"] = os.devnull
+    env["AWS_SHARED_CREDENTIALS_FILE"] = os.devnull
+    env["AWS_EC2_METADATA_DISABLED"] = "true"
+    return env
+
+
+def run_once():
+    output = subprocess.check_output(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        cwd=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        env=offline_env(),
+        universal_newlines=True,
+    )
+    import_seconds, client_seconds = (float(value) for value in output.split())
+    return import_seconds, client_seconds
+
+
+def main():
+    results = [run_once() for _ in range(REPEATS)]
+    import_ms = sorted(result[0] * 1000 for result in results)
+    client_ms = sorted(result[1] * 1000 for result in results)
+    print(f"Import webapp.utils.stepfn (offline): median {import_ms[len(import_ms) // 2]:.1f} ms")
+    print(f"First AWS client on demand:           median {client_ms[len(client_ms) // 2]:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Peak memory and time of reading a synthetic 50 MB Transcribe output, as the
+Lambda function used to (the whole document decoded with json.loads) and
+with the streaming reader, for the transcript alone and then iterating over
+the word items.
+
+Run from the app directory:
+
+    python -m tests.benchmark.bench_transcription_memory
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from tests.unit.test_json_stream import transcribe_output
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "infra", "lambda"))
+
+import json_stream  # noqa: E402
+
+TARGET_MEGABYTES = 50
+
+
+def write_transcription(path):
+    # Each word takes about 300 bytes with its item and audio segment entry
+    sample = len(json.dumps(transcribe_output(["word"] * 1000)))
+    word_count = TARGET_MEGABYTES * 1024 * 1024 * 1000 // sample
+    with open(path, "w") as output:
+        json.dump(transcribe_output([f"w{i % 5000}" for i in range(word_count)]), output)
+    return word_count
+
+
+def read_whole(fileobj):
+    return json.loads(fileobj.read().decode("utf-8"))["results"]["transcripts"][0]["transcript"]
+
+
+def read_items(fileobj):
+    # Items are read from the stream one at a time as they are consumed
+    return sum(1 for _ in json_stream.read_transcription(fileobj)["results"]["items"])
+
+
+def measure(path, reader):
+    # Timed without tracing, which slows the allocations down
+    with open(path, "rb") as fileobj:
+        start = time.perf_counter()
+        reader(fileobj)
+        elapsed = time.perf_counter() - start
+    with open(path, "rb") as fileobj:
+        tracemalloc.start()
+        reader(fileobj)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return peak / 1024 / 1024, elapsed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "transcription.json")
+        word_count = write_transcription(path)
+        print(f"{os.path.getsize(path) / 1024 / 1024:.0f} MB Transcribe output of {word_count} words")
+        print(f"{'reader':>28} {'peak memory (MB)':>17} {'time (s)':>9}")
+        for name, reader in [
+            ("json.loads, transcript", read_whole),
+            ("streaming, transcript", json_stream.read_transcript),
+            ("streaming, transcript+items", read_items),
+        ]:
+            peak, elapsed = measure(path, reader)
+            print(f"{name:>28} {peak:>17.1f} {elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Benchmark of the upload engine against boto3's default upload_fileobj, using
+moto as a local S3 stand-in for files of 10 MB to 200 MB. With moto the
+numbers measure client-side overhead (hashing, part handling, threading)
+rather than network throughput.
+
+Run from the app directory:
+
+    python -m tests.benchmark.bench_upload
+"""
+import io
+import os
+import time
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from moto import mock_aws
+
+from webapp.utils.upload import MB, UploadEngine
+
+BUCKET = "psmb-benchmark"
+SIZES_MB = [10, 50, 100, 200]
+CONFIGS = [
+    ("8 MB parts x 8", TransferConfig(multipart_threshold=16 * MB, multipart_chunksize=8 * MB, max_concurrency=8)),
+    ("16 MB parts x 4", TransferConfig(multipart_threshold=16 * MB, multipart_chunksize=16 * MB, max_concurrency=4)),
+]
+
+
+def timed(upload):
+    start = time.perf_counter()
+    upload()
+    return time.perf_counter() - start
+
+
+def main():
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        print(f"{'size':>8} {'upload_fileobj':>16} " + " ".join(f"{name:>16}" for name, _ in CONFIGS))
+        for size_mb in SIZES_MB:
+            data = os.urandom(size_mb * MB)
+            row = [timed(lambda: client.upload_fileobj(io.BytesIO(data), BUCKET, "baseline"))]
+            for _, config in CONFIGS:
+                engine = UploadEngine(client, config)
+                row.append(timed(lambda: engine.upload(io.BytesIO(data), BUCKET, "engine", len(data))))
+            print(f"{size_mb:>6}MB " + " ".join(f"{seconds:>15.2f}s" for seconds in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Benchmark of get_workflow_status_markdown over synthetic execution histories.
+
+Run from the app directory:
+
+    python -m tests.benchmark.bench_workflow_status_markdown
+"""
+import sys
+import time
+
+from webapp.utils.execution_history import get_workflow_status_markdown
+
+SIZES = [10000, 15000, 20000, 25000]
+REPEATS = 3
+
+
+def build_history(size, wait_loops=True):
+    """
+    Builds a history of the given size. With wait_loops the history looks like
+    a long transcription wait loop (Wait -> GetTranscriptionJobStatus -> Choice),
+    otherwise it is a single task followed by one long previousEventId chain,
+    which is the worst case for resolving the owning task of each event.
+    """
+    events = [{"id": 1, "type": "ExecutionStarted", "previousEventId": 0}]
+    if wait_loops:
+        while len(events) < size:
+            last = events[-1]["id"]
+            events.append({"id": last + 1, "type": "WaitStateEntered", "previousEventId": last})
+            events.append({"id": last + 2, "type": "WaitStateExited", "previousEventId": last + 1})
+            events.append({"id": last + 3, "type": "TaskStateEntered", "previousEventId": last + 2,
+                           "stateEnteredEventDetails": {"name": "GetTranscriptionJobStatus"}})
+            events.append({"id": last + 4, "type": "TaskScheduled", "previousEventId": last + 3})
+            events.append({"id": last + 5, "type": "TaskStarted", "previousEventId": last + 4})
+            events.append({"id": last + 6, "type": "TaskSucceeded", "previousEventId": last + 5})
+            events.append({"id": last + 7, "type": "TaskStateExited", "previousEventId": last + 6})
+    else:
+        events.append({"id": 2, "type": "TaskStateEntered", "previousEventId": 1,
+                       "stateEnteredEventDetails": {"name": "CombineLLMChainingOutput"}})
+        while len(events) < size:
+            last = events[-1]["id"]
+            events.append({"id": last + 1, "type": "TaskStarted", "previousEventId": last})
+    return events[:size]
+
+
+def time_markdown(events):
+    execution = {"status": "RUNNING"}
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        get_workflow_status_markdown(execution, events)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    linear = True
+    for wait_loops in (True, False):
+        label = "wait loop" if wait_loops else "single chain"
+        print(f"History shape: {label}")
+        print(f"{'events':>8} {'total ms':>10} {'us/event':>10}")
+        per_event = []
+        for size in SIZES:
+            elapsed = time_markdown(build_history(size, wait_loops))
+            per_event.append(elapsed / size)
+            print(f"{size:>8} {elapsed * 1000:>10.2f} {elapsed / size * 1e6:>10.3f}")
+        # Linear behaviour keeps the cost per event roughly flat as the history grows
+        ratio = per_event[-1] / per_event[0]
+        print(f"Cost per event at {SIZES[-1]} vs {SIZES[0]} events: {ratio:.2f}x\n")
+        linear = linear and ratio < 2
+    return 0 if linear else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
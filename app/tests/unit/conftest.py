@@ -0,0 +1,48 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import importlib
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "infra", "lambda")
+
+BUCKET = "psmb-bucket"
+
+
+@pytest.fixture
+def aws_credentials(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+
+
+@pytest.fixture
+def lambda_modules(monkeypatch):
+    """
+    Makes the modules of the Lambda function importable, as they are in its
+    package and the speech analysis layer.
+    """
+    monkeypatch.syspath_prepend(LAMBDA_DIR)
+    yield
+    for name in ("prepare_bedrock_prompts", "prompt_cache", "metrics", "logger", "segmenter", "json_stream", "clients",
+                 "token_usage", "batch_inference", "model_routing", "transcription_callback", "admission_control",
+                 "speech_analysis.bedrock_prompts", "speech_analysis.speech_metrics", "speech_analysis.result_cache"):
+        sys.modules.pop(name, None)
+
+
+@pytest.fixture
+def prepare_bedrock_prompts(aws_credentials, lambda_modules, monkeypatch):
+    """
+    The Lambda handler module, with its S3 client pointed at a mocked bucket.
+    """
+    with mock_aws():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket=BUCKET)
+        module = importlib.import_module("prepare_bedrock_prompts")
+        monkeypatch.setattr(module, "s3", s3_client)
+        yield module
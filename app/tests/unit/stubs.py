@@ -0,0 +1,252 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Local stand-ins for the AWS clients used by the unit tests.
+"""
+import io
+import json
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+from webapp.utils.config_file import Config
+
+# Sentences end with one of these, as in the punctuation added by Transcribe
+SENTENCE_END = re.compile(r"[.!?]$")
+
+
+def client_error(code, operation_name):
+    return ClientError({"Error": {"Code": code, "Message": code}}, operation_name)
+
+
+class FakeStepFunctionsClient:
+    """
+    In-memory stand-in for the Step Functions client that serves the
+    execution history in pages, newest first when reverseOrder is set.
+    """
+
+    def __init__(self, page_size=2):
+        self.status = "RUNNING"
+        self.events = []
+        self.page_size = page_size
+        self.history_events_returned = 0
+        self.history_calls = 0
+        self.describe_calls = 0
+        # Number of upcoming history calls that fail with a ThrottlingException
+        self.throttled_calls = 0
+        # Error raised by every history call when set
+        self.history_error = None
+
+    def add_event(self, event_type, previous_event_id=0, name=None):
+        event = {"id": len(self.events) + 1, "type": event_type, "previousEventId": previous_event_id}
+        if name:
+            event["stateEnteredEventDetails"] = {"name": name}
+        self.events.append(event)
+        return event["id"]
+
+    def describe_execution(self, executionArn):
+        self.describe_calls += 1
+        return {"executionArn": executionArn, "status": self.status}
+
+    def get_execution_history(self, executionArn, reverseOrder=False, includeExecutionData=True, nextToken=None):
+        self.history_calls += 1
+        if self.throttled_calls:
+            self.throttled_calls -= 1
+            raise client_error("ThrottlingException", "GetExecutionHistory")
+        if self.history_error:
+            raise self.history_error
+        events = list(reversed(self.events)) if reverseOrder else list(self.events)
+        start = int(nextToken or 0)
+        page = events[start:start + self.page_size]
+        self.history_events_returned += len(page)
+        response = {"events": page}
+        if start + self.page_size < len(events):
+            response["nextToken"] = str(start + self.page_size)
+        return response
+
+
+def add_task(client, name, previous_event_id=0):
+    entered = client.add_event("TaskStateEntered", previous_event_id, name)
+    scheduled = client.add_event("TaskScheduled", entered)
+    return client.add_event("TaskSucceeded", scheduled)
+
+
+class FakeBody(io.BytesIO):
+    """
+    Streaming body of an S3 object, read whole or in chunks.
+    """
+
+
+class FakeS3Client:
+    """
+    In-memory stand-in for the S3 client, safe to share between threads.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _count(self, operation_name):
+        with self._lock:
+            self.calls[operation_name] = self.calls.get(operation_name, 0) + 1
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        self._count("PutObject")
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        with self._lock:
+            self.objects[(Bucket, Key)] = {"Body": Body, "LastModified": datetime.now(timezone.utc), **kwargs}
+        return {}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._count("HeadObject")
+        with self._lock:
+            stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise client_error("404", "HeadObject")
+        response = {"LastModified": stored["LastModified"], "Metadata": stored.get("Metadata", {})}
+        if kwargs.get("ChecksumMode") == "ENABLED" and stored.get("ChecksumSHA256"):
+            response["ChecksumSHA256"] = stored["ChecksumSHA256"]
+        return response
+
+    def get_object(self, Bucket, Key):
+        self._count("GetObject")
+        with self._lock:
+            stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise client_error("NoSuchKey", "GetObject")
+        return {"Body": FakeBody(stored["Body"])}
+
+
+class FakeBedrockRuntimeClient:
+    """
+    Stand-in for the Bedrock runtime client that streams a canned response
+    in chunks, waiting first_token_delay seconds before the first one and
+    chunk_delay seconds between the others.
+    """
+
+    def __init__(self, responses, chunk_size=8, first_token_delay=0.0, chunk_delay=0.0):
+        self.responses = list(responses)
+        self.chunk_size = chunk_size
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.payloads = []
+
+    def _events(self, text):
+        yield {"chunk": {"bytes": json.dumps({"type": "message_start"}).encode("utf-8")}}
+        time.sleep(self.first_token_delay)
+        for start in range(0, len(text), self.chunk_size):
+            if start:
+                time.sleep(self.chunk_delay)
+            delta = {"type": "content_block_delta", "index": 0,
+                     "delta": {"type": "text_delta", "text": text[start:start + self.chunk_size]}}
+            yield {"chunk": {"bytes": json.dumps(delta).encode("utf-8")}}
+        yield {"chunk": {"bytes": json.dumps({"type": "message_stop"}).encode("utf-8")}}
+
+    def invoke_model_with_response_stream(self, modelId, body, contentType=None, accept=None):
+        self.payloads.append(json.loads(body))
+        return {"body": self._events(self.responses.pop(0)), "contentType": "application/json"}
+
+
+class FakeBedrockBatchClient:
+    """
+    Local stand-in for the Bedrock batch inference API. A job answers every
+    record of its JSONL input when it is created, and writes the output file
+    Bedrock would write; records answered with None get an error instead.
+    """
+
+    def __init__(self, s3_client, respond, status="Completed"):
+        self.s3_client = s3_client
+        self.respond = respond
+        self.status = status
+        self.jobs = {}
+
+    @staticmethod
+    def _split_s3_uri(s3_uri):
+        bucket, _, key = s3_uri.removeprefix("s3://").partition("/")
+        return bucket, key
+
+    def create_model_invocation_job(self, jobName, roleArn, modelId, inputDataConfig, outputDataConfig):
+        input_bucket, input_key = self._split_s3_uri(inputDataConfig["s3InputDataConfig"]["s3Uri"])
+        output_bucket, output_prefix = self._split_s3_uri(outputDataConfig["s3OutputDataConfig"]["s3Uri"])
+        job_id = f"job{len(self.jobs) + 1}"
+        lines = []
+        body = self.s3_client.get_object(Bucket=input_bucket, Key=input_key)["Body"].read().decode("utf-8")
+        for line in body.splitlines():
+            record = json.loads(line)
+            output = self.respond(record["modelInput"])
+            if output is None:
+                record["error"] = {"errorCode": 400, "errorMessage": "Malformed input"}
+            else:
+                record["modelOutput"] = output
+            lines.append(json.dumps(record))
+        self.s3_client.put_object(Bucket=output_bucket, Key=f"{output_prefix}{job_id}/{input_key.rsplit('/', 1)[-1]}.out",
+                                  Body="\n".join(lines))
+        self.s3_client.put_object(Bucket=output_bucket, Key=f"{output_prefix}{job_id}/manifest.json.out", Body="{}")
+        job_arn = f"arn:aws:bedrock:us-east-1:123456789012:model-invocation-job/{job_id}"
+        self.jobs[job_arn] = {"jobName": jobName, "roleArn": roleArn, "modelId": modelId, "records": len(lines)}
+        return {"jobArn": job_arn}
+
+    def get_model_invocation_job(self, jobIdentifier):
+        return {"jobArn": jobIdentifier, "status": self.status}
+
+
+def make_result(result_id, words, is_partial):
+    """
+    Builds a transcription result from (content, start_time, end_time) words.
+    """
+    return {
+        "result_id": result_id,
+        "is_partial": is_partial,
+        "start_time": words[0][1],
+        "end_time": words[-1][2],
+        "transcript": " ".join(content for content, _, _ in words),
+        "items": [{"content": content, "start_time": start_time, "end_time": end_time}
+                  for content, start_time, end_time in words],
+    }
+
+
+class FakeTranscriber:
+    """
+    Stand-in for Transcribe streaming that "hears" a known script: each word
+    is transcribed once the audio received covers its end time. The words of
+    the sentence being spoken are sent as partial results, and each sentence
+    as a final result once it ends or the audio stream does.
+    """
+
+    def __init__(self, words, sample_rate=Config.LIVE_SAMPLE_RATE_HZ):
+        self.words = words
+        self.sample_rate = sample_rate
+
+    @classmethod
+    def from_text(cls, text, words_per_minute=150, sample_rate=Config.LIVE_SAMPLE_RATE_HZ):
+        seconds_per_word = 60 / words_per_minute
+        words = [(content, position * seconds_per_word, (position + 1) * seconds_per_word)
+                 for position, content in enumerate(text.split())]
+        return cls(words, sample_rate)
+
+    def transcribe(self, audio_chunks):
+        audio_seconds = 0.0
+        heard = 0
+        segment = []
+        segment_index = 0
+        for chunk in audio_chunks:
+            audio_seconds += len(chunk) / (2 * self.sample_rate)
+            if heard == len(self.words) or self.words[heard][2] > audio_seconds:
+                continue
+            while heard < len(self.words) and self.words[heard][2] <= audio_seconds:
+                segment.append(self.words[heard])
+                heard += 1
+                if SENTENCE_END.search(segment[-1][0]):
+                    yield make_result(str(segment_index), segment, is_partial=False)
+                    segment = []
+                    segment_index += 1
+            if segment:
+                yield make_result(str(segment_index), segment, is_partial=True)
+        if segment:
+            yield make_result(str(segment_index), segment, is_partial=False)
@@ -0,0 +1,191 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import importlib
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from webapp.utils.admission_queue import AdmissionQueue
+
+BUCKET = "psmb-bucket"
+MAX_IN_FLIGHT = 3
+
+
+@pytest.fixture
+def admission_control(aws_credentials, lambda_modules, monkeypatch):
+    """
+    The dispatcher, with a mocked SQS queue and state machine.
+    """
+    with mock_aws():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket=BUCKET)
+        sqs_client = boto3.client("sqs", region_name="us-east-1")
+        queue_url = sqs_client.create_queue(QueueName="AdmissionQueue")["QueueUrl"]
+        sfn_client = boto3.client("stepfunctions", region_name="us-east-1")
+        state_machine_arn = sfn_client.create_state_machine(
+            name="PublicSpeakingMentorAIAssistantStateMachine",
+            definition=json.dumps({"StartAt": "Done", "States": {"Done": {"Type": "Succeed"}}}),
+            roleArn="arn:aws:iam::123456789012:role/StateMachineRole")["stateMachineArn"]
+
+        module = importlib.import_module("admission_control")
+        monkeypatch.setattr(module, "s3", s3_client)
+        monkeypatch.setattr(module, "sqs", sqs_client)
+        monkeypatch.setattr(module, "sfn", sfn_client)
+        monkeypatch.setattr(module, "queue_url", queue_url)
+        monkeypatch.setattr(module, "state_machine_arn", state_machine_arn)
+        monkeypatch.setattr(module, "bucket_name", BUCKET)
+        monkeypatch.setattr(module, "max_in_flight", MAX_IN_FLIGHT)
+        monkeypatch.setattr(module, "receive_wait_seconds", 0)
+        yield module
+
+
+def upload(admission_control, object_key):
+    # The upload rule sends the Object Created event to the queue
+    event = {"detail-type": "Object Created", "detail": {"bucket": {"name": BUCKET}, "object": {"key": object_key}}}
+    admission_control.sqs.send_message(QueueUrl=admission_control.queue_url, MessageBody=json.dumps(event))
+
+
+def running_keys(admission_control):
+    executions = admission_control.sfn.list_executions(stateMachineArn=admission_control.state_machine_arn,
+                                                       statusFilter="RUNNING")["executions"]
+    return [json.loads(admission_control.sfn.describe_execution(executionArn=execution["executionArn"])["input"])
+            ["detail"]["object"]["key"] for execution in executions]
+
+
+def finish_all(admission_control):
+    for execution in admission_control.sfn.list_executions(stateMachineArn=admission_control.state_machine_arn,
+                                                           statusFilter="RUNNING")["executions"]:
+        admission_control.sfn.stop_execution(executionArn=execution["executionArn"])
+
+
+def test_user_ids_and_execution_names_come_from_the_object_key(admission_control):
+    assert admission_control.get_user_id("raw-audio-files/user-1/abc/speech.mp3") == "user-1"
+    assert admission_control.get_user_id("raw-audio-files/batch/trainer-1/abc/speech.mp3") == "trainer-1"
+    name = admission_control.get_execution_name("raw-audio-files/user-1/abc/speech.mp3")
+    assert name == admission_control.get_execution_name("raw-audio-files/user-1/abc/speech.mp3")
+    assert len(name) <= 80
+    assert admission_control.get_execution_name("raw-audio-files/batch/trainer-1/abc/speech.mp3").startswith("batch-")
+
+
+def test_flood_of_uploads_is_admitted_fairly_within_the_limit(admission_control):
+    # One user floods the queue before two others upload a recording each
+    flood = [f"raw-audio-files/user-1/{i:03d}/speech.mp3" for i in range(20)]
+    for object_key in flood:
+        upload(admission_control, object_key)
+    upload(admission_control, "raw-audio-files/user-2/abc/speech.mp3")
+    upload(admission_control, "raw-audio-files/user-3/abc/speech.mp3")
+    # SQS may deliver an event twice
+    upload(admission_control, flood[1])
+
+    assert admission_control.dispatch() == {"started": MAX_IN_FLIGHT, "waiting": 19}
+    assert sorted(running_keys(admission_control)) == sorted([
+        flood[0], "raw-audio-files/user-2/abc/speech.mp3", "raw-audio-files/user-3/abc/speech.mp3"
+    ])
+    # The waiting uploads are saved, so their messages are not received again
+    assert "Messages" not in admission_control.sqs.receive_message(QueueUrl=admission_control.queue_url)
+
+    # Nothing is started while every slot is taken, and the positions follow the arrival order
+    assert admission_control.dispatch() == {"started": 0, "waiting": 19}
+    queue = AdmissionQueue(admission_control.s3, BUCKET)
+    assert queue.get_position(flood[1]) == {"position": 1, "waiting": 19}
+    assert queue.get_position(flood[19]) == {"position": 19, "waiting": 19}
+    assert queue.get_position(flood[0]) is None
+
+    # Every upload is started exactly once as the executions end
+    started = set(running_keys(admission_control))
+    while True:
+        finish_all(admission_control)
+        result = admission_control.dispatch()
+        assert result["started"] <= MAX_IN_FLIGHT
+        running = running_keys(admission_control)
+        assert len(running) <= MAX_IN_FLIGHT
+        assert started.isdisjoint(running)
+        started.update(running)
+        if not result["waiting"]:
+            break
+    assert started == set(flood) | {"raw-audio-files/user-2/abc/speech.mp3", "raw-audio-files/user-3/abc/speech.mp3"}
+    assert queue.get_position(flood[19]) is None
+
+
+def test_uploads_received_after_others_wait_behind_them(admission_control):
+    keys = [f"raw-audio-files/user-1/{i:03d}/speech.mp3" for i in range(MAX_IN_FLIGHT + 2)]
+    for object_key in keys[:-1]:
+        upload(admission_control, object_key)
+    assert admission_control.dispatch() == {"started": MAX_IN_FLIGHT, "waiting": 1}
+
+    upload(admission_control, keys[-1])
+    assert admission_control.dispatch() == {"started": 0, "waiting": 2}
+    queue = AdmissionQueue(admission_control.s3, BUCKET)
+    assert queue.get_position(keys[-2]) == {"position": 1, "waiting": 2}
+    assert queue.get_position(keys[-1]) == {"position": 2, "waiting": 2}
+
+    finish_all(admission_control)
+    assert admission_control.dispatch() == {"started": 2, "waiting": 0}
+
+
+def test_executions_of_batch_uploads_do_not_take_a_slot(admission_control):
+    for i in range(MAX_IN_FLIGHT):
+        upload(admission_control, f"raw-audio-files/batch/trainer-1/{i:03d}/speech.mp3")
+    upload(admission_control, "raw-audio-files/user-1/abc/speech.mp3")
+    assert admission_control.dispatch() == {"started": MAX_IN_FLIGHT + 1, "waiting": 0}
+
+    assert admission_control.count_in_flight() == 1
+    upload(admission_control, "raw-audio-files/user-2/abc/speech.mp3")
+    assert admission_control.dispatch() == {"started": 1, "waiting": 0}
+
+
+class FailingStepFunctionsClient:
+    """
+    Wraps the Step Functions client and fails the first start of the chosen uploads.
+    """
+
+    def __init__(self, client, failing_keys):
+        self.client = client
+        self.failing_keys = set(failing_keys)
+
+    def start_execution(self, **kwargs):
+        object_key = json.loads(kwargs["input"])["detail"]["object"]["key"]
+        if object_key in self.failing_keys:
+            self.failing_keys.remove(object_key)
+            raise ConnectionError(f"Connection lost while starting {object_key}")
+        return self.client.start_execution(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def test_upload_failing_to_start_waits_for_the_next_dispatch(admission_control, monkeypatch):
+    keys = [f"raw-audio-files/user-{i}/abc/speech.mp3" for i in range(2)]
+    for object_key in keys:
+        upload(admission_control, object_key)
+    monkeypatch.setattr(admission_control, "sfn", FailingStepFunctionsClient(admission_control.sfn, [keys[0]]))
+
+    assert admission_control.dispatch() == {"started": 1, "waiting": 1}
+    assert running_keys(admission_control) == [keys[1]]
+    assert AdmissionQueue(admission_control.s3, BUCKET).get_position(keys[0]) == {"position": 1, "waiting": 1}
+
+    assert admission_control.dispatch() == {"started": 1, "waiting": 0}
+    assert sorted(running_keys(admission_control)) == keys
+
+
+def test_upload_whose_execution_already_ran_is_removed_from_the_queue(admission_control):
+    # A previous dispatch started the execution, which has ended, but did not delete the message
+    object_key = "raw-audio-files/user-1/abc/speech.mp3"
+    upload(admission_control, object_key)
+    message = admission_control.sqs.receive_message(QueueUrl=admission_control.queue_url, VisibilityTimeout=0)["Messages"][0]
+    admission_control.sfn.start_execution(stateMachineArn=admission_control.state_machine_arn,
+                                          name=admission_control.get_execution_name(object_key), input=message["Body"])
+    finish_all(admission_control)
+
+    assert admission_control.dispatch() == {"started": 1, "waiting": 0}
+    assert "Messages" not in admission_control.sqs.receive_message(QueueUrl=admission_control.queue_url)
+
+
+def test_invalid_message_does_not_stop_the_dispatch(admission_control):
+    admission_control.sqs.send_message(QueueUrl=admission_control.queue_url, MessageBody="not an event")
+    upload(admission_control, "raw-audio-files/user-1/abc/speech.mp3")
+
+    assert admission_control.dispatch() == {"started": 1, "waiting": 0}
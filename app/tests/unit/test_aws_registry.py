@@ -0,0 +1,79 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from webapp.utils.aws_registry import AwsRegistry
+
+
+class FakeClient:
+    def __init__(self, service_name, calls):
+        self.service_name = service_name
+        self.calls = calls
+
+    def get_caller_identity(self):
+        self.calls.append("GetCallerIdentity")
+        return {"Account": "123456789012"}
+
+    def get_parameter(self, Name):
+        self.calls.append(f"GetParameter {Name}")
+        return {"Parameter": {"Value": f"value-of-{Name}"}}
+
+    def get_secret_value(self, SecretId):
+        self.calls.append(f"GetSecretValue {SecretId}")
+        return {"SecretString": '{"pool_id": "us-east-1_abc"}'}
+
+
+class FakeSession:
+    region_name = "us-east-1"
+
+    def __init__(self):
+        self.calls = []
+        self.clients_created = 0
+
+    def client(self, service_name, region_name=None):
+        self.clients_created += 1
+        return FakeClient(service_name, self.calls)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_clients_are_created_once_per_service_and_region():
+    session = FakeSession()
+    registry = AwsRegistry(session=session)
+
+    assert registry.client("ssm") is registry.client("ssm")
+    assert registry.client("cognito-idp", region_name="eu-west-1") is not registry.client("cognito-idp")
+    assert session.clients_created == 3
+
+
+def test_values_are_cached_until_they_expire():
+    session = FakeSession()
+    clock = FakeClock()
+    registry = AwsRegistry(session=session, ttl_seconds=60, clock=clock)
+
+    for _ in range(10):
+        assert registry.get_account_id() == "123456789012"
+        assert registry.get_parameter("/psmb/s3_bucket") == "value-of-/psmb/s3_bucket"
+        assert registry.get_secret("PSMBParamCognitoSecret") == {"pool_id": "us-east-1_abc"}
+    assert len(session.calls) == 3
+
+    clock.now = 61
+    registry.get_parameter("/psmb/s3_bucket")
+    assert session.calls[-1] == "GetParameter /psmb/s3_bucket"
+    assert len(session.calls) == 4
+
+
+def test_invalidate_forces_a_reload():
+    session = FakeSession()
+    registry = AwsRegistry(session=session)
+
+    registry.get_parameter("/psmb/statemachine_arn")
+    registry.values.invalidate()
+    registry.get_parameter("/psmb/statemachine_arn")
+
+    assert session.calls == ["GetParameter /psmb/statemachine_arn"] * 2
@@ -0,0 +1,134 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import hashlib
+import importlib
+import json
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from tests.unit.stubs import FakeBedrockBatchClient
+
+BUCKET = "psmb-bucket"
+ANALYSES = ["delivery", "rewrite"]
+
+
+class FakeStepFunctionsClient:
+    def __init__(self):
+        self.exceptions = boto3.client("stepfunctions", region_name="us-east-1").exceptions
+        self.outputs_by_token = {}
+        self.errors_by_token = {}
+
+    def send_task_success(self, taskToken, output):
+        self.outputs_by_token[taskToken] = json.loads(output)
+
+    def send_task_failure(self, taskToken, error, cause):
+        self.errors_by_token[taskToken] = error
+
+
+def respond(payload):
+    # Answers each prompt with the instructions it was given, which name its analysis
+    return {"content": [{"type": "text", "text": payload["messages"][0]["content"][1]["text"][:20]}],
+            "usage": {"input_tokens": 100, "output_tokens": 50}}
+
+
+@pytest.fixture
+def batch_inference(aws_credentials, lambda_modules, monkeypatch):
+    monkeypatch.setenv("BUCKET_NAME", BUCKET)
+    monkeypatch.setenv("BATCH_ANALYSES", ",".join(ANALYSES))
+    with mock_aws():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket=BUCKET)
+        module = importlib.import_module("batch_inference")
+        prepare_bedrock_prompts = importlib.import_module("prepare_bedrock_prompts")
+        monkeypatch.setattr(prepare_bedrock_prompts, "s3", s3_client)
+        monkeypatch.setattr(module, "s3", s3_client)
+        monkeypatch.setattr(module, "sfn", FakeStepFunctionsClient())
+        monkeypatch.setattr(module, "bedrock", FakeBedrockBatchClient(s3_client, respond))
+        monkeypatch.setattr(module, "batch_min_records", 6)
+        yield module
+
+
+def upload(batch_inference, name, checksum=False):
+    # Uploads a transcribed recording of the batch and queues its prompts
+    s3_client = batch_inference.s3
+    object_key = f"raw-audio-files/batch/trainer-1/abc/{name}.mp3"
+    checksum_algorithm = {"ChecksumAlgorithm": "SHA256"} if checksum else {}
+    s3_client.put_object(Bucket=BUCKET, Key=object_key, Body=f"audio of {name}".encode("utf-8"), **checksum_algorithm)
+    s3_client.put_object(Bucket=BUCKET, Key=f"transcribed-text-files/{object_key}-temp.json",
+                         Body=json.dumps({"results": {"transcripts": [{"transcript": f"Hello, I am {name}."}]}}))
+    detail = {"bucket": {"name": BUCKET}, "object": {"key": object_key}}
+    prepare_bedrock_prompts = importlib.import_module("prepare_bedrock_prompts")
+    assert prepare_bedrock_prompts.lambda_handler({"batch_task_token": f"token-{name}", "detail": detail}, None) == {"queued": 2}
+    return object_key
+
+
+def pending_keys(batch_inference):
+    return list(batch_inference.list_keys(batch_inference.batch_pending_prefix))
+
+
+def test_batch_upload_queues_a_prompt_per_analysis(batch_inference):
+    upload(batch_inference, "alice")
+
+    [(key, pending)] = batch_inference.list_pending()
+    assert key == "bedrock_batch/pending/batch/trainer-1/abc/alice.mp3.json"
+    assert pending["task_token"] == "token-alice"
+    assert list(pending["prompts"]) == ANALYSES
+    assert "<speech>Hello, I am alice.</speech>" in pending["prompts"]["rewrite"]["messages"][0]["content"][0]["text"]
+
+
+def test_job_results_are_sent_back_to_each_recording(batch_inference):
+    for name in ["alice", "bob"]:
+        upload(batch_inference, name, checksum=True)
+    assert batch_inference.submit_batch() == {"mode": "none"}
+
+    upload(batch_inference, "carol")
+    batch = batch_inference.submit_batch()
+
+    assert batch["mode"] == "job"
+    assert batch_inference.bedrock.jobs[batch["job_arn"]]["records"] == 6
+    assert pending_keys(batch_inference) == []
+    assert batch_inference.get_job_status(batch["job_arn"]) == {"status": "Completed", "ended": True}
+
+    assert batch_inference.lambda_handler({"action": "fan_out", "batch_id": batch["batch_id"]}, None) == {"recordings": 3, "failed": 0}
+    outputs = batch_inference.sfn.outputs_by_token
+    assert set(outputs) == {"token-alice", "token-bob", "token-carol"}
+    assert outputs["token-alice"].index("### Delivery\n\n Focus only on the de") < \
+        outputs["token-alice"].index("### Speech Rewrite Suggestion\n\n Rewrite the speech t")
+    content_hash = hashlib.sha256(b"audio of bob").hexdigest()
+    cached = json.loads(batch_inference.s3.get_object(Bucket=BUCKET, Key=f"result-cache/{content_hash}.json")["Body"].read())
+    assert cached["output"] == outputs["token-bob"]
+
+
+def test_recordings_with_a_failed_record_fail(batch_inference):
+    batch_inference.bedrock.respond = lambda payload: None if "Hello, I am bob." in json.dumps(payload) else respond(payload)
+    for name in ["alice", "bob", "carol"]:
+        upload(batch_inference, name)
+
+    batch = batch_inference.submit_batch()
+
+    assert batch_inference.fan_out(batch["batch_id"]) == {"recordings": 3, "failed": 1}
+    assert batch_inference.sfn.errors_by_token == {"token-bob": "BatchInferenceFailed"}
+    assert set(batch_inference.sfn.outputs_by_token) == {"token-alice", "token-carol"}
+
+
+def test_too_few_prompts_are_sent_one_by_one_after_the_max_wait(batch_inference):
+    upload(batch_inference, "alice")
+    later = datetime.now(timezone.utc) + timedelta(minutes=batch_inference.batch_max_wait_minutes)
+
+    batch = batch_inference.submit_batch(now=later)
+
+    assert batch["mode"] == "on_demand"
+    assert batch_inference.bedrock.jobs == {}
+    assert len(batch["records"]) == 2
+    # The state machine invokes Bedrock with each record, which writes its response to the record output
+    s3_client = batch_inference.s3
+    for record in batch["records"]:
+        payload = json.loads(s3_client.get_object(Bucket=BUCKET, Key=record["input"].removeprefix(f"s3://{BUCKET}/"))["Body"].read())
+        s3_client.put_object(Bucket=BUCKET, Key=record["output"].removeprefix(f"s3://{BUCKET}/"), Body=json.dumps(respond(payload)))
+
+    assert batch_inference.fan_out(batch["batch_id"]) == {"recordings": 1, "failed": 0}
+    assert "### Speech Rewrite Suggestion" in batch_inference.sfn.outputs_by_token["token-alice"]
@@ -0,0 +1,80 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import importlib
+import json
+import time
+
+import pytest
+
+from tests.unit.stubs import FakeBedrockRuntimeClient, FakeS3Client
+from webapp.utils import bedrock_stream
+
+BUCKET = "psmb-bucket"
+TRANSCRIPT = "Good  morning everyone,\n thank you for coming. Um, today I will talk about public speaking."
+FEEDBACK = "Your opening is warm, but drop the filler words. " * 4
+REWRITE = "Good morning everyone, and thank you for coming. Today, let's talk about public speaking."
+
+
+def test_feedback_is_yielded_before_the_response_is_complete():
+    client = FakeBedrockRuntimeClient([FEEDBACK], first_token_delay=0.05, chunk_delay=0.02)
+    stream = bedrock_stream.FeedbackStream(client, TRANSCRIPT)
+
+    start = time.monotonic()
+    parts = iter(stream.feedback())
+    next(parts)
+    time_to_first_token = time.monotonic() - start
+    rest = "".join(parts)
+    total_time = time.monotonic() - start
+
+    assert time_to_first_token < total_time / 2
+    assert len(rest) < len(FEEDBACK) and FEEDBACK.endswith(rest)
+    assert stream.speech_feedback == FEEDBACK
+
+
+def test_streamed_prompts_are_the_lambda_prompts(lambda_modules):
+    prompts = importlib.import_module("speech_analysis.bedrock_prompts")
+    client = FakeBedrockRuntimeClient([FEEDBACK, REWRITE])
+    stream = bedrock_stream.FeedbackStream(client, TRANSCRIPT)
+
+    assert "".join(stream.feedback()) == FEEDBACK
+    assert "".join(stream.rewrite()) == REWRITE
+
+    transcript = prompts.normalize_transcript(TRANSCRIPT)
+    assert client.payloads == [
+        prompts.create_bedrock_payload_speech_feedback(transcript),
+        prompts.create_bedrock_payload_speech_rewrite(transcript, FEEDBACK),
+    ]
+    assert {"role": "assistant", "content": FEEDBACK} in client.payloads[1]["messages"]
+
+
+def test_streams_set_prompt_caching_without_changing_the_lambda_default(lambda_modules):
+    prompts = importlib.import_module("speech_analysis.bedrock_prompts")
+    default_prompt_caching = prompts.default_prompt_caching
+    cached = bedrock_stream.FeedbackStream(FakeBedrockRuntimeClient([FEEDBACK]), TRANSCRIPT, prompt_caching=True)
+    uncached = bedrock_stream.FeedbackStream(FakeBedrockRuntimeClient([FEEDBACK]), TRANSCRIPT, prompt_caching=False)
+
+    "".join(cached.feedback())
+    "".join(uncached.feedback())
+
+    assert "cache_control" in json.dumps(cached.client.payloads[0])
+    assert "cache_control" not in json.dumps(uncached.client.payloads[0])
+    assert prompts.default_prompt_caching == default_prompt_caching
+
+
+def test_rewrite_needs_the_streamed_feedback():
+    stream = bedrock_stream.FeedbackStream(FakeBedrockRuntimeClient([REWRITE]), TRANSCRIPT)
+
+    with pytest.raises(RuntimeError):
+        next(stream.rewrite())
+
+
+def test_wait_for_transcription():
+    s3_client = FakeS3Client()
+    transcription = {"results": {"transcripts": [{"transcript": TRANSCRIPT}]}}
+    s3_client.put_object(Bucket=BUCKET, Key=bedrock_stream.get_transcript_key("speech.mp3"),
+                         Body=json.dumps(transcription))
+
+    assert bedrock_stream.wait_for_transcription(s3_client, BUCKET, "speech.mp3") == transcription
+    assert bedrock_stream.wait_for_transcription(s3_client, BUCKET, "other.mp3", timeout=0.05, poll_interval=0.01) is None
+    assert s3_client.calls["GetObject"] > 2
@@ -0,0 +1,24 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import importlib
+
+
+def test_clients_are_created_once_with_the_tuned_config(aws_credentials, lambda_modules):
+    clients = importlib.import_module("clients")
+
+    s3 = clients.get_client("s3")
+
+    assert clients.get_client("s3") is s3
+    assert clients.get_client("sns") is not s3
+    assert s3.meta.config.retries["mode"] == "adaptive"
+    assert s3.meta.config.tcp_keepalive
+
+
+def test_warm_up_runs_in_the_init_phase(aws_credentials, lambda_modules, monkeypatch):
+    monkeypatch.setenv("INIT_WARM_UP", "true")
+
+    prepare_bedrock_prompts = importlib.import_module("prepare_bedrock_prompts")
+
+    assert "sns" in importlib.import_module("clients").clients
+    assert prepare_bedrock_prompts.speech_metrics.np is not None
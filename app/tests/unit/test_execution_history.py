@@ -0,0 +1,69 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from tests.unit.stubs import FakeStepFunctionsClient, add_task
+from webapp.utils.execution_history import ExecutionTracker, find_task_id, get_workflow_status_markdown
+
+
+def test_tracker_markdown_matches_full_history():
+    client = FakeStepFunctionsClient()
+    client.add_event("ExecutionStarted")
+    last = add_task(client, "StartTranscriptionJob", 1)
+    wait = client.add_event("WaitStateEntered", last)
+    client.add_event("WaitStateExited", wait)
+
+    tracker = ExecutionTracker("arn", client)
+    execution = tracker.update()
+
+    assert tracker.get_status_markdown() == get_workflow_status_markdown(execution, client.events)
+    assert tracker.last_event_id == len(client.events)
+
+
+def test_tracker_only_fetches_new_events():
+    client = FakeStepFunctionsClient()
+    client.add_event("ExecutionStarted")
+    last = add_task(client, "StartTranscriptionJob", 1)
+    for _ in range(20):
+        wait = client.add_event("WaitStateEntered", last)
+        last = client.add_event("WaitStateExited", wait)
+        last = add_task(client, "GetTranscriptionJobStatus", last)
+
+    tracker = ExecutionTracker("arn", client)
+    tracker.update()
+    assert client.history_events_returned == len(client.events)
+
+    client.history_events_returned = 0
+    add_task(client, "CreateBedrockPrompt-SpeechFeedback", last)
+    client.status = "SUCCEEDED"
+    execution = tracker.update()
+
+    # Three new events plus the already seen event that ends the page walk
+    assert client.history_events_returned == 4
+    assert tracker.is_completed()
+    assert tracker.get_status_markdown() == get_workflow_status_markdown(execution, client.events)
+
+
+def test_tracker_without_history_only_describes_execution():
+    client = FakeStepFunctionsClient()
+    add_task(client, "StartTranscriptionJob")
+
+    tracker = ExecutionTracker("arn", client)
+    tracker.update(include_history=False)
+
+    assert client.history_events_returned == 0
+    assert not tracker.is_completed()
+
+
+def test_find_task_id_resolves_long_chains_without_recursion():
+    events = [{"id": 1, "type": "TaskStateEntered", "previousEventId": 0,
+               "stateEnteredEventDetails": {"name": "GetSpeechFeedback"}}]
+    for event_id in range(2, 25001):
+        events.append({"id": event_id, "type": "TaskStarted", "previousEventId": event_id - 1})
+    events_by_id = {event["id"]: event for event in events}
+
+    task_by_event_id = {}
+    task = find_task_id(events[-1], events_by_id, task_by_event_id)
+
+    assert task["task_id"] == 1
+    assert len(task_by_event_id) == len(events)
+    assert find_task_id(events[100], events_by_id, task_by_event_id) is task
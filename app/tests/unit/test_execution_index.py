@@ -0,0 +1,85 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.unit.stubs import FakeS3Client
+from webapp.utils.execution_index import ExecutionIndex, get_execution_index_key, get_upload_key
+
+BUCKET = "psmb-bucket"
+
+
+def start_execution_later(s3_client, object_key, execution_arn):
+    # Simulates EventBridge starting the state machine, whose first state writes the index entry
+    def write_index():
+        s3_client.put_object(Bucket=BUCKET, Key=get_execution_index_key(object_key), Body=execution_arn)
+    timer = threading.Timer(random.uniform(0, 0.2), write_index)
+    timer.start()
+    return timer
+
+
+def test_upload_keys_are_unique_per_session_and_upload():
+    first = get_upload_key("user-1", "speech.mp3")
+    second = get_upload_key("user-1", "speech.mp3")
+
+    assert first.startswith("raw-audio-files/user-1/")
+    assert first.endswith("/speech.mp3")
+    assert first != second
+
+
+def test_missing_index_entry_times_out():
+    index = ExecutionIndex(FakeS3Client(), BUCKET)
+
+    assert index.get_execution_arn("raw-audio-files/user-1/abc/speech.mp3", timeout=0.05, poll_interval=0.01) is None
+
+
+def test_concurrent_sessions_each_find_their_own_execution():
+    s3_client = FakeS3Client()
+    index = ExecutionIndex(s3_client, BUCKET)
+    sessions = 200
+
+    def simulate_session(session_number):
+        user_id = f"user-{session_number}"
+        # Every session uploads a file with the same name at roughly the same time
+        object_key = get_upload_key(user_id, "rehearsal.mp4")
+        expected_arn = f"arn:aws:states:us-east-1:123456789012:execution:psmb:{session_number}"
+        timer = start_execution_later(s3_client, object_key, expected_arn)
+        execution_arn = index.get_execution_arn(object_key, timeout=5, poll_interval=0.05)
+        timer.join()
+        return object_key, expected_arn, execution_arn
+
+    with ThreadPoolExecutor(max_workers=50) as executor:
+        results = list(executor.map(simulate_session, range(sessions)))
+
+    for _, expected_arn, execution_arn in results:
+        assert execution_arn == expected_arn
+
+    # Each lookup only reads its own index entry, a handful of times while it waits for the execution
+    assert s3_client.calls["GetObject"] <= sessions * 4
+
+    # Resolved executions are served from memory afterwards
+    reads = s3_client.calls["GetObject"]
+    object_key, expected_arn, _ = results[0]
+    assert index.get_execution_arn(object_key) == expected_arn
+    assert s3_client.calls["GetObject"] == reads
+
+
+def test_least_recently_used_executions_are_evicted():
+    s3_client = FakeS3Client()
+    index = ExecutionIndex(s3_client, BUCKET, max_cached=2)
+    object_keys = [get_upload_key("user-1", "speech.mp3") for _ in range(3)]
+    for i, object_key in enumerate(object_keys):
+        s3_client.put_object(Bucket=BUCKET, Key=get_execution_index_key(object_key), Body=f"arn:execution:{i}")
+
+    index.get_execution_arn(object_keys[0])
+    index.get_execution_arn(object_keys[1])
+    index.get_execution_arn(object_keys[0])
+    index.get_execution_arn(object_keys[2])
+    reads = s3_client.calls["GetObject"]
+
+    assert index.get_execution_arn(object_keys[0]) == "arn:execution:0"
+    assert s3_client.calls["GetObject"] == reads
+    assert index.get_execution_arn(object_keys[1]) == "arn:execution:1"
+    assert s3_client.calls["GetObject"] == reads + 1
@@ -1,9 +1,24 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
+import json
+import pytest
+
 import aws_cdk as core
 import aws_cdk.assertions as assertions
-from infra.infra_stack import InfraStack
+from infra.infra_stack import InfraStack, LayerPackageBundling
+
+def get_state_machine_definition(template, name="PublicSpeakingMentorAIAssistantStateMachine"):
+    state_machine = next(resource for logical_id, resource in template.find_resources("AWS::StepFunctions::StateMachine").items()
+                         if logical_id.startswith(name))
+    definition = state_machine["Properties"]["DefinitionString"]
+    if "Fn::Join" in definition:
+        # Replace CloudFormation references with placeholders to get plain ASL
+        definition = "".join(
+            part if isinstance(part, str) else "aws" if part == {"Ref": "AWS::Partition"} else "TOKEN"
+            for part in definition["Fn::Join"][1]
+        )
+    return json.loads(definition)
 
 def test_s3_bucket_creation():
     app = core.App()
@@ -71,3 +86,459 @@ def test_ssm_parameter_creation():
     template.has_resource_properties("AWS::SSM::Parameter", {
         "Name": "/psmb/statemachine_arn"
     })
+
+def test_state_machine_indexes_execution_by_object_key():
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant")
+    template = assertions.Template.from_stack(stack)
+    definition = get_state_machine_definition(template)
+
+    assert definition["StartAt"] == "IndexExecution"
+    index_state = definition["States"]["IndexExecution"]
+    assert index_state["Resource"] == "arn:aws:states:::aws-sdk:s3:putObject"
+    assert index_state["Parameters"]["Key.$"] == "States.Format('execution-index/{}', $.detail.object.key)"
+    assert index_state["Parameters"]["Body.$"] == "$$.Execution.Id"
+    assert index_state["Next"] == "StartTranscriptionJob"
+
+def test_bucket_cors_only_for_direct_uploads():
+    app = core.App()
+    server_stack = InfraStack(app, "ServerUploads")
+    direct_stack = InfraStack(app, "DirectUploads", upload_mode="direct")
+
+    server_bucket = next(iter(assertions.Template.from_stack(server_stack).find_resources("AWS::S3::Bucket").values()))
+    assert "CorsConfiguration" not in server_bucket["Properties"]
+    assertions.Template.from_stack(direct_stack).has_resource_properties("AWS::S3::Bucket", {
+        "CorsConfiguration": {
+            "CorsRules": [assertions.Match.object_like({
+                "AllowedMethods": ["POST", "PUT"],
+                "ExposedHeaders": ["ETag"]
+            })]
+        }
+    })
+
+def test_result_cache_is_evicted_by_lifecycle_rule():
+    app = core.App()
+    cached_stack = InfraStack(app, "CachedResults", result_cache_ttl_days=7)
+    uncached_stack = InfraStack(app, "UncachedResults", result_cache_ttl_days=0, prompt_cache_ttl_days=0)
+
+    assertions.Template.from_stack(cached_stack).has_resource_properties("AWS::S3::Bucket", {
+        "LifecycleConfiguration": {
+            "Rules": assertions.Match.array_with([{
+                "Id": "ExpireResultCache",
+                "Prefix": "result-cache/",
+                "ExpirationInDays": 7,
+                "Status": "Enabled"
+            }])
+        }
+    })
+    uncached_bucket = next(iter(assertions.Template.from_stack(uncached_stack).find_resources("AWS::S3::Bucket").values()))
+    assert "LifecycleConfiguration" not in uncached_bucket["Properties"]
+
+def test_state_machine_skips_bedrock_on_prompt_cache_hit():
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant", prompt_cache_ttl_days=14)
+    template = assertions.Template.from_stack(stack)
+    states = get_state_machine_definition(template)["States"]
+
+    for prompt, bedrock_task, next_state in [("SpeechFeedback", "GetSpeechFeedback", "CreateBedrockPrompt-SpeechRewrite"),
+                                             ("SpeechRewrite", "GetSpeechRewrite", "CombineLLMChainingOutput")]:
+        choice = states[f"Is{prompt}Cached"]
+        assert states[f"CreateBedrockPrompt-{prompt}"]["Next"] == f"Is{prompt}Cached"
+        assert choice["Default"] == bedrock_task
+        assert choice["Choices"][0]["BooleanEquals"] is True
+        assert states[choice["Choices"][0]["Next"]]["Type"] == "Pass"
+        assert states[choice["Choices"][0]["Next"]]["Next"] == next_state
+        assert states[bedrock_task]["Next"] == next_state
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Environment": {"Variables": {"PROMPT_CACHE_TTL_DAYS": "14"}}
+    })
+    template.has_resource_properties("AWS::S3::Bucket", {
+        "LifecycleConfiguration": {
+            "Rules": assertions.Match.array_with([assertions.Match.object_like({
+                "Prefix": "bedrock_prompts/cache/",
+                "ExpirationInDays": 14
+            })])
+        }
+    })
+
+def test_inline_prompts_are_passed_to_bedrock_in_the_state():
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant", prompt_cache_ttl_days=0, payload_inline_max_bytes=32768)
+    template = assertions.Template.from_stack(stack)
+    states = get_state_machine_definition(template)["States"]
+
+    for prompt, next_state in [("SpeechFeedback", "CreateBedrockPrompt-SpeechRewrite"),
+                               ("SpeechRewrite", "CombineLLMChainingOutput")]:
+        choice = states[f"Is{prompt}Cached"]
+        assert choice["Choices"][1] == {"Variable": f"$.{prompt[6:].lower()}_response.s3uri.body",
+                                        "IsPresent": True, "Next": f"Get{prompt}Inline"}
+        inline_task = states[f"Get{prompt}Inline"]
+        assert inline_task["Parameters"]["Body.$"] == f"$.{prompt[6:].lower()}_response.s3uri.body"
+        # Without the prompt cache, the response is kept in the state
+        assert "Output" not in inline_task["Parameters"]
+        assert inline_task["Next"] == next_state
+        assert choice["Default"] == f"Get{prompt}"
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Environment": {"Variables": {"PAYLOAD_INLINE_MAX_BYTES": "32768"}}
+    })
+
+    cached_stack = InfraStack(core.App(), "PublicSpeakingMentorAIAssistant", prompt_cache_ttl_days=14)
+    cached_states = get_state_machine_definition(assertions.Template.from_stack(cached_stack))["States"]
+    # Bedrock writes the responses to the prompt cache
+    assert cached_states["GetSpeechFeedbackInline"]["Parameters"]["Output"] == {"S3Uri.$": "$.feedback_response.s3uri.output"}
+    assert "GetChunkFeedbackInline" not in cached_states
+
+    s3_only_stack = InfraStack(core.App(), "PublicSpeakingMentorAIAssistant", payload_inline_max_bytes=0)
+    s3_only_states = get_state_machine_definition(assertions.Template.from_stack(s3_only_stack))["States"]
+    assert len(s3_only_states["IsSpeechFeedbackCached"]["Choices"]) == 1
+    assert "GetSpeechFeedbackInline" not in s3_only_states
+
+def test_batch_uploads_wait_for_the_batch_state_machine():
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant", batch_inference=True)
+    template = assertions.Template.from_stack(stack)
+    states = get_state_machine_definition(template)["States"]
+
+    assert states["EvaluateTranscriptionJobStatus"]["Choices"][0]["Next"] == "IsBatchUpload"
+    is_batch_upload = states["IsBatchUpload"]
+    assert is_batch_upload["Choices"][0] == {"Variable": "$.detail.object.key", "StringMatches": "raw-audio-files/batch/*",
+                                             "Next": "QueueBatchPrompts"}
+    assert is_batch_upload["Default"] == "CreateBedrockPrompt-SpeechFeedback"
+    queue = states["QueueBatchPrompts"]
+    assert queue["Resource"].endswith(":states:::lambda:invoke.waitForTaskToken")
+    assert queue["Parameters"]["Payload"]["batch_task_token.$"] == "$$.Task.Token"
+    assert queue["TimeoutSeconds"] == 24 * 3600
+    assert queue["Next"] == "PublishToSNS"
+
+    batch_states = get_state_machine_definition(template, "BatchInferenceStateMachine")["States"]
+    assert batch_states["SubmitBatch"]["Next"] == "BatchMode"
+    assert [choice["Next"] for choice in batch_states["BatchMode"]["Choices"]] == ["WaitForBatchJob", "InvokeBatchRecords"]
+    assert batch_states["IsBatchJobEnded"]["Choices"][0]["Next"] == "FanOutBatchResults"
+    assert batch_states["IsBatchJobEnded"]["Default"] == "WaitForBatchJob"
+    assert batch_states["InvokeBatchRecords"]["Next"] == "FanOutBatchResults"
+    template.has_resource_properties("AWS::Events::Rule", {"ScheduleExpression": "rate(15 minutes)"})
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "batch_inference.lambda_handler",
+        "Environment": {"Variables": assertions.Match.object_like({"BATCH_MIN_RECORDS": "100"})}
+    })
+    template.has_resource_properties("AWS::IAM::Role", {
+        "AssumeRolePolicyDocument": {"Statement": [assertions.Match.object_like({
+            "Principal": {"Service": "bedrock.amazonaws.com"}
+        })]}
+    })
+
+    default_stack = InfraStack(core.App(), "PublicSpeakingMentorAIAssistant")
+    default_template = assertions.Template.from_stack(default_stack)
+    assert "IsBatchUpload" not in get_state_machine_definition(default_template)["States"]
+    default_template.resource_count_is("AWS::StepFunctions::StateMachine", 1)
+
+def test_transcription_completion_by_callback():
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant", transcription_completion="callback")
+    template = assertions.Template.from_stack(stack)
+    states = get_state_machine_definition(template)["States"]
+
+    assert states["StartTranscriptionJob"]["Next"] == "WaitForTranscriptionJobCallback"
+    callback_state = states["WaitForTranscriptionJobCallback"]
+    assert callback_state["Resource"] == "arn:aws:states:::lambda:invoke.waitForTaskToken"
+    assert callback_state["Parameters"]["Payload"]["TaskToken.$"] == "$$.Task.Token"
+    assert callback_state["Next"] == "EvaluateTranscriptionJobStatus"
+    # A lost job event makes the execution check the job and wait again, instead of waiting until its timeout
+    assert callback_state["TimeoutSeconds"] == 15 * 60
+    [catch] = callback_state["Catch"]
+    assert catch["ErrorEquals"] == ["States.Timeout"]
+    assert catch["Next"] == "CheckTranscriptionJobStatus"
+    assert states["CheckTranscriptionJobStatus"]["Next"] == "EvaluateTranscriptionJobStatus"
+    evaluate = states["EvaluateTranscriptionJobStatus"]
+    assert [choice["Next"] for choice in evaluate["Choices"]][1] == "TranscriptionFailed"
+    assert evaluate["Default"] == "WaitForTranscriptionJobCallback"
+    assert "WaitForTranscriptionJobToComplete" not in states
+    template.has_resource_properties("AWS::Events::Rule", {
+        "EventPattern": {
+            "source": ["aws.transcribe"],
+            "detail-type": ["Transcribe Job State Change"],
+            "detail": {"TranscriptionJobStatus": ["COMPLETED", "FAILED"]}
+        }
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "transcription_callback.lambda_handler"
+    })
+    template.has_resource_properties("AWS::IAM::Policy", {
+        "PolicyDocument": {"Statement": assertions.Match.array_with([assertions.Match.object_like({
+            "Action": "s3:ListBucket",
+            "Condition": {"StringLike": {"s3:prefix": ["transcription-callbacks/*"]}}
+        })])}
+    })
+
+def test_transcription_completion_by_adaptive_polling():
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant",
+                       transcription_completion="polling", transcription_poll_delays=[1, 3, 9])
+    template = assertions.Template.from_stack(stack)
+    states = get_state_machine_definition(template)["States"]
+
+    assert states["StartTranscriptionJob"]["Next"] == "StartTranscriptionPolling"
+    assert states["StartTranscriptionPolling"]["Result"] == {"attempt": 0, "wait_seconds": 1}
+    assert states["WaitForTranscriptionJobToComplete"]["SecondsPath"] == "$.TranscriptionPoll.wait_seconds"
+    assert states["EvaluateTranscriptionJobStatus"]["Default"] == "IsTranscriptionPollDelayAtMax"
+    at_max = states["IsTranscriptionPollDelayAtMax"]
+    assert at_max["Choices"][0]["NumericGreaterThanEquals"] == 2
+    assert at_max["Choices"][0]["Next"] == "WaitForTranscriptionJobToComplete"
+    back_off = states[at_max["Default"]]
+    assert back_off["Parameters"]["wait_seconds.$"] == \
+        "States.ArrayGetItem(States.Array(1, 3, 9), States.MathAdd($.TranscriptionPoll.attempt, 1))"
+    assert back_off["Next"] == "WaitForTranscriptionJobToComplete"
+    assert not template.find_resources("AWS::Lambda::Function", {
+        "Properties": {"Handler": "transcription_callback.lambda_handler"}
+    })
+    template.resource_count_is("AWS::Events::Rule", 1)
+
+def test_parallel_pipeline_runs_speech_analyses_in_a_map():
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant",
+                       pipeline_mode="parallel", speech_analyses=["delivery", "rewrite"])
+    template = assertions.Template.from_stack(stack)
+    states = get_state_machine_definition(template)["States"]
+
+    assert states["EvaluateTranscriptionJobStatus"]["Choices"][0]["Next"] == "ListSpeechAnalyses"
+    assert states["ListSpeechAnalyses"]["Result"] == ["delivery", "rewrite"]
+    map_state = states["AnalyseSpeech"]
+    assert map_state["Type"] == "Map"
+    assert map_state["ItemsPath"] == "$.analyses"
+    assert map_state["MaxConcurrency"] == 2
+    assert map_state["ItemSelector"]["analysis.$"] == "$$.Map.Item.Value"
+    assert map_state["ResultPath"] == "$.analyses_response"
+    assert map_state["Next"] == "CombineLLMChainingOutput"
+    iteration_states = map_state["ItemProcessor"]["States"]
+    assert map_state["ItemProcessor"]["StartAt"] == "CreateBedrockPrompt-SpeechAnalysis"
+    assert iteration_states["IsSpeechAnalysisCached"]["Default"] == "GetSpeechAnalysis"
+    assert iteration_states["GetSpeechAnalysis"]["Next"] == "SelectSpeechAnalysisOutput"
+    assert iteration_states["UseCachedSpeechAnalysis"]["Next"] == "SelectSpeechAnalysisOutput"
+    assert "GetSpeechFeedback" not in states and "GetSpeechRewrite" not in states
+
+def test_long_speeches_are_analysed_in_chunks():
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant",
+                       chunk_max_words=2000, chunk_overlap_words=100, chunk_max_concurrency=3)
+    template = assertions.Template.from_stack(stack)
+    states = get_state_machine_definition(template)["States"]
+
+    # The feedback step returns the prompts of the chunks of long transcripts, so short ones take no extra step
+    assert states["EvaluateTranscriptionJobStatus"]["Choices"][0]["Next"] == "CreateBedrockPrompt-SpeechFeedback"
+    assert "SegmentTranscript" not in states
+    assert states["CreateBedrockPrompt-SpeechFeedback"]["Next"] == "IsLongSpeech"
+    is_long_speech = states["IsLongSpeech"]
+    assert is_long_speech["Choices"][0] == {"Variable": "$.feedback_response.s3uri.chunks[1]", "IsPresent": True, "Next": "AnalyseTranscriptChunks"}
+    assert is_long_speech["Default"] == "IsSpeechFeedbackCached"
+    map_state = states["AnalyseTranscriptChunks"]
+    assert map_state["ItemsPath"] == "$.feedback_response.s3uri.chunks"
+    assert map_state["MaxConcurrency"] == 3
+    assert map_state["ItemProcessor"]["StartAt"] == "IsChunkFeedbackCached"
+    assert map_state["Next"] == "ReduceChunkFeedback"
+    assert states["ReduceChunkFeedback"]["Next"] == "PublishToSNS"
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "prepare_bedrock_prompts.lambda_handler",
+        "Environment": {"Variables": assertions.Match.object_like({"CHUNK_MAX_WORDS": "2000", "CHUNK_OVERLAP_WORDS": "100"})}
+    })
+
+def test_parallel_pipeline_segments_long_speeches_first():
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant", pipeline_mode="parallel", chunk_max_words=20000)
+    states = get_state_machine_definition(assertions.Template.from_stack(stack))["States"]
+
+    assert states["EvaluateTranscriptionJobStatus"]["Choices"][0]["Next"] == "SegmentTranscript"
+    assert states["SegmentTranscript"]["Parameters"]["Payload"]["segment_transcript"] is True
+    assert states["IsLongSpeech"]["Choices"][0]["Variable"] == "$.segments.chunks[1]"
+    assert states["IsLongSpeech"]["Default"] == "ListSpeechAnalyses"
+    assert states["AnalyseTranscriptChunks"]["ItemsPath"] == "$.segments.chunks"
+
+def test_chunking_is_disabled_by_default():
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant")
+    states = get_state_machine_definition(assertions.Template.from_stack(stack))["States"]
+
+    assert states["EvaluateTranscriptionJobStatus"]["Choices"][0]["Next"] == "CreateBedrockPrompt-SpeechFeedback"
+    assert "AnalyseTranscriptChunks" not in states
+
+def test_speech_metrics_layer_is_added_to_the_prompt_function():
+    layer_arn = "arn:aws:lambda:us-east-1:336392948345:layer:AWSSDKPandas-Python312-Arm64:13"
+    stack = InfraStack(core.App(), "SpeechMetrics", speech_metrics_layer_arn=layer_arn)
+
+    assertions.Template.from_stack(stack).has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "prepare_bedrock_prompts.lambda_handler",
+        "Layers": [{"Ref": assertions.Match.string_like_regexp("SpeechAnalysisLayer")}, layer_arn]
+    })
+
+def test_speech_analysis_package_is_bundled_as_a_layer(tmp_path):
+    # The package shared with the webapp is imported from the python folder of the layer
+    LayerPackageBundling("./speech_analysis").try_bundle(str(tmp_path), image=None)
+
+    assert (tmp_path / "python" / "speech_analysis" / "bedrock_prompts.py").is_file()
+    assert (tmp_path / "python" / "speech_analysis" / "speech_metrics.py").is_file()
+
+def test_prompt_function_gets_the_topic_arn():
+    template = assertions.Template.from_stack(InfraStack(core.App(), "Notifications"))
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "prepare_bedrock_prompts.lambda_handler",
+        "Environment": {"Variables": assertions.Match.object_like({
+            "SNS_TOPIC_ARN": {"Ref": assertions.Match.string_like_regexp("PublicSpeakingMentorAIAssistantTopic")}
+        })}
+    })
+    template.resource_count_is("AWS::Lambda::Alias", 0)
+
+@pytest.mark.parametrize("warm_start", ["snapstart", "provisioned"])
+def test_warm_start_invokes_a_published_alias(warm_start):
+    stack = InfraStack(core.App(), "WarmStart", lambda_warm_start=warm_start, lambda_provisioned_concurrency=3)
+    template = assertions.Template.from_stack(stack)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "prepare_bedrock_prompts.lambda_handler",
+        "Environment": {"Variables": assertions.Match.object_like({"INIT_WARM_UP": "true"})}
+    })
+    [(alias_id, alias)] = template.find_resources("AWS::Lambda::Alias").items()
+    alias = alias["Properties"]
+    assert alias["Name"] == "live"
+    if warm_start == "provisioned":
+        assert alias["ProvisionedConcurrencyConfig"] == {"ProvisionedConcurrentExecutions": 3}
+    else:
+        assert "ProvisionedConcurrencyConfig" not in alias
+        template.has_resource_properties("AWS::Lambda::Function", {
+            "Handler": "prepare_bedrock_prompts.lambda_handler",
+            "SnapStart": {"ApplyOn": "PublishedVersions"}
+        })
+    state_machine = next(iter(template.find_resources("AWS::StepFunctions::StateMachine").values()))
+    assert {"Ref": alias_id} in state_machine["Properties"]["DefinitionString"]["Fn::Join"][1]
+
+def test_admission_control_queues_uploads_for_the_dispatcher():
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant", admission_control=True, max_in_flight_executions=5)
+    template = assertions.Template.from_stack(stack)
+
+    template.resource_count_is("AWS::SQS::Queue", 2)
+    template.has_resource_properties("AWS::SQS::Queue", {
+        "RedrivePolicy": {
+            "deadLetterTargetArn": {"Fn::GetAtt": [assertions.Match.string_like_regexp("AdmissionDeadLetterQueue"), "Arn"]},
+            "maxReceiveCount": 5
+        }
+    })
+    template.has_resource_properties("AWS::CloudWatch::Alarm", {
+        "MetricName": "ApproximateNumberOfMessagesVisible",
+        "Dimensions": [{"Name": "QueueName", "Value": {
+            "Fn::GetAtt": [assertions.Match.string_like_regexp("AdmissionDeadLetterQueue"), "QueueName"]
+        }}],
+        "AlarmActions": [{"Ref": assertions.Match.string_like_regexp("PublicSpeakingMentorAIAssistantTopic")}]
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "admission_control.lambda_handler",
+        "ReservedConcurrentExecutions": 1,
+        "Environment": {"Variables": assertions.Match.object_like({"MAX_IN_FLIGHT_EXECUTIONS": "5"})}
+    })
+    template.has_resource_properties("AWS::Events::Rule", {
+        "EventPattern": assertions.Match.object_like({"detail-type": ["Step Functions Execution Status Change"]})
+    })
+    template.has_resource_properties("AWS::Events::Rule", {"ScheduleExpression": "rate(1 minute)"})
+    # Uploads no longer start the state machine directly
+    upload_rules = template.find_resources("AWS::Events::Rule", {
+        "Properties": {"EventPattern": {"detail-type": ["Object Created"]}}
+    })
+    [upload_rule] = upload_rules.values()
+    assert not any("RoleArn" in target for target in upload_rule["Properties"]["Targets"])
+
+    default_template = assertions.Template.from_stack(InfraStack(core.App(), "PublicSpeakingMentorAIAssistant"))
+    default_template.resource_count_is("AWS::SQS::Queue", 0)
+
+def test_throttled_calls_are_retried_with_jittered_backoff():
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant", transcription_completion="polling")
+    template = assertions.Template.from_stack(stack)
+    states = get_state_machine_definition(template)["States"]
+
+    for name, throttling_error in [("StartTranscriptionJob", "Transcribe.LimitExceededException"),
+                                   ("GetTranscriptionJobStatus", "Transcribe.LimitExceededException"),
+                                   ("CombineLLMChainingOutput", "Lambda.TooManyRequestsException")]:
+        retry = next(retry for retry in states[name]["Retry"] if throttling_error in retry["ErrorEquals"])
+        assert retry["JitterStrategy"] == "FULL"
+        assert retry["MaxAttempts"] == 6
+        assert retry["BackoffRate"] == 2
+        assert retry["MaxDelaySeconds"] == 60
+
+    get_feedback = states["GetSpeechFeedback"]
+    [throttling, transient] = get_feedback["Retry"]
+    assert throttling["ErrorEquals"] == ["Bedrock.ThrottlingException", "Bedrock.ServiceQuotaExceededException",
+                                         "Bedrock.ModelNotReadyException"]
+    assert throttling["JitterStrategy"] == "FULL"
+    assert transient["ErrorEquals"] == ["Bedrock.InternalServerException", "Bedrock.ServiceUnavailableException",
+                                        "Bedrock.ModelTimeoutException"]
+    assert transient["MaxAttempts"] == 2
+    # Invalid requests fail the execution without being retried
+    assert not any("Bedrock.ValidationException" in retry["ErrorEquals"] or "States.ALL" in retry["ErrorEquals"]
+                   for retry in get_feedback["Retry"])
+    # Without a fallback model, a throttled call fails the execution once the retries are spent
+    assert "Catch" not in get_feedback
+    assert "GetSpeechFeedbackFallback" not in states
+
+
+def test_throttled_bedrock_calls_fall_back_to_another_model():
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant", pipeline_mode="sequential",
+                       bedrock_fallback_model_id="anthropic.claude-3-haiku-20240307-v1:0")
+    template = assertions.Template.from_stack(stack)
+    states = get_state_machine_definition(template)["States"]
+
+    for name in ["GetSpeechFeedback", "GetSpeechFeedbackInline"]:
+        [catch] = states[name]["Catch"]
+        assert catch["ErrorEquals"] == ["Bedrock.ThrottlingException", "Bedrock.ServiceQuotaExceededException",
+                                        "Bedrock.ModelNotReadyException", "Bedrock.ServiceUnavailableException"]
+        assert catch["Next"] == f"{name}Fallback"
+        assert catch["ResultPath"] == "$.feedback_response.bedrock_response"
+        fallback = states[f"{name}Fallback"]
+        assert "anthropic.claude-3-haiku-20240307-v1:0" in fallback["Parameters"]["ModelId"]
+        assert fallback["Retry"][0]["ErrorEquals"][0] == "Bedrock.ThrottlingException"
+        # Both models continue to the same state
+        assert states[name]["Next"] == fallback["Next"] == "GotSpeechFeedback"
+    assert states["GetSpeechFeedbackFallback"]["Parameters"]["Input"] == states["GetSpeechFeedback"]["Parameters"]["Input"]
+    assert states["GotSpeechFeedback"]["Next"] == "CreateBedrockPrompt-SpeechRewrite"
+    assert states["UseCachedSpeechFeedback"]["Next"] == "GotSpeechFeedback"
+
+def test_routed_prompts_branch_to_the_model_of_their_route():
+    fast_model = "anthropic.claude-3-haiku-20240307-v1:0"
+    routes = [{"name": "short", "max_words": 600, "depths": ["quick", "standard"], "model_id": fast_model, "max_tokens": 2000}]
+    app = core.App()
+    stack = InfraStack(app, "PublicSpeakingMentorAIAssistant", pipeline_mode="sequential", bedrock_model_routes=routes)
+    template = assertions.Template.from_stack(stack)
+    states = get_state_machine_definition(template)["States"]
+
+    route_conditions = [{"Variable": "$.feedback_response.s3uri.route.model_id", "IsPresent": True},
+                        {"Variable": "$.feedback_response.s3uri.route.model_id", "StringEquals": fast_model}]
+    choices = states["IsSpeechFeedbackCached"]["Choices"]
+    assert [choice["Next"] for choice in choices] == ["UseCachedSpeechFeedback", "GetSpeechFeedbackInlineShort",
+                                                      "GetSpeechFeedbackInline", "GetSpeechFeedbackShort"]
+    assert choices[1]["And"] == [{"Variable": "$.feedback_response.s3uri.body", "IsPresent": True}] + route_conditions
+    assert choices[3]["And"] == route_conditions
+    assert states["IsSpeechFeedbackCached"]["Default"] == "GetSpeechFeedback"
+    assert fast_model in states["GetSpeechFeedbackShort"]["Parameters"]["ModelId"]
+    assert fast_model in states["GetSpeechFeedbackInlineShort"]["Parameters"]["ModelId"]
+    assert fast_model not in states["GetSpeechFeedback"]["Parameters"]["ModelId"]
+    assert states["GetSpeechFeedbackShort"]["Next"] == states["GetSpeechFeedback"]["Next"] == "CreateBedrockPrompt-SpeechRewrite"
+    assert "GetSpeechRewriteShort" in states
+    # Chunks are only made of long transcripts, and always go to the default model
+    assert not any(name.startswith("GetChunkFeedbackShort") for name in states)
+
+    template.has_resource_properties("AWS::SSM::Parameter", {
+        "Name": "/psmb/bedrock_model_routes",
+        "Value": json.dumps(routes)
+    })
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "prepare_bedrock_prompts.lambda_handler",
+        "Environment": {"Variables": assertions.Match.object_like({
+            "MODEL_ROUTES_PARAMETER": assertions.Match.any_value(),
+            "BEDROCK_ROUTED_MODEL_IDS": fast_model
+        })}
+    })
+
+    default_states = get_state_machine_definition(assertions.Template.from_stack(
+        InfraStack(core.App(), "PublicSpeakingMentorAIAssistant", pipeline_mode="sequential")))["States"]
+    assert [choice["Next"] for choice in default_states["IsSpeechFeedbackCached"]["Choices"]] == \
+        ["UseCachedSpeechFeedback", "GetSpeechFeedbackInline"]
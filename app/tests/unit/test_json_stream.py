@@ -0,0 +1,100 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import importlib
+import io
+import json
+
+import pytest
+
+
+@pytest.fixture
+def json_stream(lambda_modules):
+    return importlib.import_module("json_stream")
+
+
+class TrickleReader(io.BytesIO):
+    """
+    File object returning at most size bytes per read, as a network stream
+    may, so values and UTF-8 characters are split across reads.
+    """
+
+    def __init__(self, data, size=7):
+        super().__init__(data)
+        self.size = size
+
+    def read(self, size=-1):
+        return super().read(self.size)
+
+
+def transcribe_output(words):
+    items = [{"type": "pronunciation", "start_time": f"{i * 0.4:.2f}", "end_time": f"{i * 0.4 + 0.3:.2f}",
+              "alternatives": [{"confidence": "0.99", "content": word}], "id": i}
+             for i, word in enumerate(words)]
+    transcript = " ".join(words)
+    return {
+        "jobName": "job",
+        "accountId": "123456789012",
+        "status": "COMPLETED",
+        "results": {
+            "transcripts": [{"transcript": transcript}],
+            "items": items,
+            "audio_segments": [{"id": 0, "transcript": transcript, "items": list(range(len(words)))}],
+        },
+    }
+
+
+WORDS = ["Bonjour", "à", "tous,", "今日は", "ça", "va", "1.5e3", "true", "null", "\"quoted\"", "back\\slash", "😀"]
+
+
+def test_transcription_is_read_across_chunk_boundaries(json_stream):
+    output = transcribe_output(WORDS * 20)
+    data = json.dumps(output, ensure_ascii=False, indent=1).encode("utf-8")
+
+    transcription = json_stream.read_transcription(TrickleReader(data))
+
+    assert transcription["results"]["transcripts"] == output["results"]["transcripts"]
+    assert list(transcription["results"]["items"]) == output["results"]["items"]
+
+
+def test_items_before_the_transcripts_are_read_whole(json_stream):
+    output = transcribe_output(WORDS)
+    results = {"items": output["results"]["items"], "transcripts": output["results"]["transcripts"]}
+    data = json.dumps({"results": results}).encode("utf-8")
+
+    assert json_stream.read_transcription(TrickleReader(data)) == {"results": results}
+
+
+def test_transcript_is_read_without_the_rest_of_the_document(json_stream):
+    data = json.dumps(transcribe_output(WORDS * 1000)).encode("utf-8")
+    reader = TrickleReader(data, size=1024)
+
+    assert json_stream.read_transcript(reader) == " ".join(WORDS * 1000)
+    # The items and audio segments after the transcripts are never downloaded
+    assert reader.tell() < len(data) / 10
+
+
+def test_values_are_skipped_whole(json_stream):
+    data = json.dumps({"skip": {"a": [1, {"b": [2.5, -3, "}"]}, [], {}], "c": False}, "keep": [1, 2]}).encode("utf-8")
+    stream = json_stream.JsonStream(TrickleReader(data, size=3))
+
+    values = {}
+    for key in stream.iter_object():
+        if key == "keep":
+            values[key] = stream.read_value()
+        else:
+            stream.skip_value()
+
+    assert values == {"keep": [1, 2]}
+
+
+def test_numbers_split_across_reads_are_read_whole(json_stream):
+    stream = json_stream.JsonStream(TrickleReader(b"[12345678, 9]", size=4))
+
+    assert [stream.read_value() for _ in stream.iter_array()] == [12345678, 9]
+
+
+@pytest.mark.parametrize("data", [b'{"results": {"transcripts": [', b'{"results": {"transcripts" 1}}', b'{"results": {"transcripts": [tru]}}'])
+def test_invalid_documents_raise(json_stream, data):
+    with pytest.raises(ValueError):
+        json_stream.read_transcription(TrickleReader(data))
@@ -0,0 +1,101 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import io
+import wave
+
+import pytest
+
+from tests.unit.stubs import FakeBedrockRuntimeClient, FakeTranscriber, make_result
+from webapp.utils import bedrock_stream, live_transcription
+
+SAMPLE_RATE = 16000
+SCRIPT = ("Good morning everyone. Um, thank you for coming. "
+          "Today, uh, I will talk about, you know, public speaking. Um, let's start.")
+
+
+def silence(seconds, chunk_milliseconds=100):
+    chunk = b"\0\0" * (SAMPLE_RATE * chunk_milliseconds // 1000)
+    for _ in range(int(seconds * 1000 / chunk_milliseconds)):
+        yield chunk
+
+
+def test_fake_transcriber_sends_partial_then_final_results():
+    transcriber = FakeTranscriber.from_text(SCRIPT, words_per_minute=150)
+
+    results = list(transcriber.transcribe(silence(60)))
+
+    finals = [result for result in results if not result["is_partial"]]
+    assert " ".join(result["transcript"] for result in finals) == SCRIPT
+    assert [result["result_id"] for result in finals] == ["0", "1", "2", "3"]
+    # Every sentence longer than a chunk of audio is first sent partially
+    assert {result["result_id"] for result in results if result["is_partial"]} == {"0", "1", "2", "3"}
+
+
+def test_transcription_stops_with_the_audio():
+    transcriber = FakeTranscriber.from_text(SCRIPT, words_per_minute=150)
+
+    results = list(transcriber.transcribe(silence(2)))
+
+    assert results[-1] == make_result("1", transcriber.words[3:5], is_partial=False)
+    assert results[-1]["transcript"] == "Um, thank"
+
+
+def test_analysis_is_updated_while_the_speaker_talks():
+    transcriber = FakeTranscriber.from_text(SCRIPT, words_per_minute=150)
+    analyzer = live_transcription.RehearsalAnalyzer()
+    stats = []
+
+    for result in transcriber.transcribe(silence(60)):
+        analyzer.update(result)
+        stats.append(analyzer.stats())
+
+    # Partial results of a sentence replace each other instead of adding up
+    assert [s["filler_words"] for s in stats] == sorted(s["filler_words"] for s in stats)
+    assert stats[len(stats) // 2]["filler_words"] < stats[-1]["filler_words"]
+    # The filler words are those counted by the speech metrics of the state machine
+    assert stats[-1]["fillers"] == {"um": 2, "uh": 1}
+    assert stats[-1]["words"] == len(SCRIPT.split())
+    assert stats[-1]["words_per_minute"] == pytest.approx(150)
+    assert analyzer.transcript == SCRIPT
+
+
+def test_recent_pace_follows_the_speaker():
+    analyzer = live_transcription.RehearsalAnalyzer(pace_window_seconds=30)
+    slow = FakeTranscriber.from_text("word " * 100, words_per_minute=100).words
+    fast = [(content, start + 60, end + 60) for content, start, end in
+            FakeTranscriber.from_text("word " * 100, words_per_minute=200).words]
+
+    analyzer.update(make_result("0", slow, is_partial=False))
+    assert analyzer.stats()["recent_words_per_minute"] == pytest.approx(100)
+    analyzer.update(make_result("1", fast, is_partial=False))
+
+    assert analyzer.stats()["recent_words_per_minute"] == pytest.approx(200)
+    assert analyzer.stats()["words_per_minute"] == pytest.approx(200 * 60 / 90)
+
+
+def test_recording_is_streamed_in_chunks():
+    data = io.BytesIO()
+    with wave.open(data, "wb") as recording:
+        recording.setnchannels(1)
+        recording.setsampwidth(2)
+        recording.setframerate(SAMPLE_RATE)
+        recording.writeframes(b"\0\0" * SAMPLE_RATE)
+
+    sample_rate, chunks = live_transcription.pcm_chunks_from_wav(data.getvalue(), chunk_milliseconds=100)
+
+    assert sample_rate == SAMPLE_RATE
+    assert [len(chunk) for chunk in chunks] == [SAMPLE_RATE // 10 * 2] * 10
+
+
+def test_feedback_is_streamed_when_recording_stops():
+    transcriber = FakeTranscriber.from_text(SCRIPT)
+    analyzer = live_transcription.RehearsalAnalyzer()
+    for result in transcriber.transcribe(silence(60)):
+        analyzer.update(result)
+    client = FakeBedrockRuntimeClient(["Drop the filler words."])
+
+    stream = bedrock_stream.FeedbackStream(client, analyzer.transcript)
+
+    assert "".join(stream.feedback()) == "Drop the filler words."
+    assert SCRIPT in client.payloads[0]["messages"][0]["content"][0]["text"]
@@ -0,0 +1,109 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import importlib
+import json
+import types
+
+import pytest
+
+BUCKET = "psmb-bucket"
+OBJECT_KEY = "raw-audio-files/user-1/abc/keynote.mp4"
+TRANSCRIPT = "Good morning everyone, thank you for coming. " * 500
+
+
+@pytest.fixture
+def logger(lambda_modules):
+    return importlib.import_module("logger")
+
+
+def read_lines(output):
+    return [json.loads(line) for line in output.splitlines() if line.startswith("{")]
+
+
+def test_values_are_truncated_with_their_size(logger):
+    assert logger.truncate("short", limit=10) == "short"
+    assert logger.truncate("x" * 25, limit=10) == "xxxxxxxxxx... (25 characters)"
+    assert logger.truncate({"text": "x" * 25}, limit=10) == '{"text": "... (37 characters)'
+    assert logger.truncate("x" * 25, limit=0) == "x" * 25
+
+
+def test_lines_are_json_with_the_invocation_context(logger, capsys, monkeypatch):
+    monkeypatch.setattr(logger, "max_chars", 20)
+    logger.start_invocation(types.SimpleNamespace(aws_request_id="request-1"), step="Test")
+
+    logger.info("Transcript read", transcript="x" * 100, characters=100)
+    logger.debug("Event", event={"detail": {}})
+
+    [line] = read_lines(capsys.readouterr().out)
+    assert line["level"] == "INFO"
+    assert line["request_id"] == "request-1"
+    assert line["step"] == "Test"
+    assert line["transcript"] == "x" * 20 + "... (100 characters)"
+    assert line["characters"] == 100
+
+
+def test_debug_lines_are_logged_for_sampled_invocations(logger, capsys, monkeypatch):
+    monkeypatch.setattr(logger, "sample_rate", 0.5)
+    monkeypatch.setattr(logger.random, "random", lambda: 0.2)
+    logger.start_invocation()
+    logger.debug("Event", event={"detail": {}})
+
+    monkeypatch.setattr(logger.random, "random", lambda: 0.7)
+    logger.start_invocation()
+    logger.debug("Event", event={"detail": {}})
+
+    assert [line.get("sampled") for line in read_lines(capsys.readouterr().out)] == [True]
+
+
+def test_phase_timer_publishes_one_record(lambda_modules, capsys):
+    metrics = importlib.import_module("metrics")
+    ticks = iter([0.0, 0.010, 0.020, 0.025, 0.100, 0.130])
+    timer = metrics.PhaseTimer(clock=lambda: next(ticks))
+
+    with timer.phase("S3Read"):
+        pass
+    with timer.phase("S3Read"):
+        pass
+    with timer.phase("S3Write"):
+        pass
+    timer.publish({"Step": "Test"})
+    timer.publish({"Step": "Test"})
+
+    [record] = read_lines(capsys.readouterr().out)
+    assert record["S3ReadDuration"] == pytest.approx(15)
+    assert record["S3WriteDuration"] == pytest.approx(30)
+    assert record["_aws"]["CloudWatchMetrics"][0]["Metrics"][0]["Unit"] == "Milliseconds"
+    assert record["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["Step"]]
+
+
+def test_lambda_logs_sizes_and_phase_timings_not_payloads(prepare_bedrock_prompts, capsys):
+    transcription = {"results": {"transcripts": [{"transcript": TRANSCRIPT}]}}
+    prepare_bedrock_prompts.s3.put_object(Bucket=BUCKET, Key=f"transcribed-text-files/{OBJECT_KEY}-temp.json",
+                                          Body=json.dumps(transcription))
+
+    prepare_bedrock_prompts.lambda_handler({"detail": {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}},
+                                           types.SimpleNamespace(aws_request_id="request-1"))
+
+    output = capsys.readouterr().out
+    lines = read_lines(output)
+    assert len(output) < len(TRANSCRIPT)
+    assert all(line.get("level") != "DEBUG" for line in lines)
+    [timings] = [line for line in lines if "_aws" in line]
+    assert timings["Step"] == "CreateBedrockPrompt-SpeechFeedback"
+    assert {"S3ReadDuration", "PayloadBuildDuration", "S3WriteDuration"} <= set(timings)
+    assert all(line["request_id"] == "request-1" for line in lines if "_aws" not in line)
+
+
+def test_lambda_dumps_truncated_payloads_at_debug_level(prepare_bedrock_prompts, capsys, monkeypatch):
+    logger = importlib.import_module("logger")
+    monkeypatch.setattr(logger, "log_level", logger.levels["DEBUG"])
+    transcription = {"results": {"transcripts": [{"transcript": TRANSCRIPT}]}}
+    prepare_bedrock_prompts.s3.put_object(Bucket=BUCKET, Key=f"transcribed-text-files/{OBJECT_KEY}-temp.json",
+                                          Body=json.dumps(transcription))
+
+    prepare_bedrock_prompts.lambda_handler({"detail": {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}}, None)
+
+    [payload_line] = [line for line in read_lines(capsys.readouterr().out) if line.get("message") == "Bedrock prompt payload"]
+    assert payload_line["payload"].endswith("characters)")
+    assert len(payload_line["payload"]) < logger.max_chars + 30
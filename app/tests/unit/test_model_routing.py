@@ -0,0 +1,95 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import importlib
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+BUCKET = "psmb-bucket"
+OBJECT_KEY = "raw-audio-files/user-1/abc/talk.mp3"
+PARAMETER = "/psmb/bedrock_model_routes"
+LARGE_MODEL = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+FAST_MODEL = "anthropic.claude-3-haiku-20240307-v1:0"
+
+ROUTES = [
+    {"name": "short", "max_words": 600, "depths": ["quick", "standard"], "model_id": FAST_MODEL, "max_tokens": 2000},
+    {"name": "quick", "depths": ["quick"], "model_id": FAST_MODEL, "max_tokens": 3000},
+    {"name": "long", "model_id": LARGE_MODEL, "max_tokens": 4000}
+]
+
+
+@pytest.fixture
+def model_routing(aws_credentials, lambda_modules, monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTES_PARAMETER", PARAMETER)
+    monkeypatch.setenv("BEDROCK_MODEL_ID", LARGE_MODEL)
+    monkeypatch.setenv("BEDROCK_ROUTED_MODEL_IDS", FAST_MODEL)
+    with mock_aws():
+        ssm_client = boto3.client("ssm", region_name="us-east-1")
+        ssm_client.put_parameter(Name=PARAMETER, Value=json.dumps(ROUTES), Type="String")
+        yield importlib.import_module("model_routing")
+
+
+@pytest.mark.parametrize("words, depth, route, model_id, max_tokens", [
+    (120, "quick", "short", FAST_MODEL, 2000),
+    (600, "standard", "short", FAST_MODEL, 2000),
+    (601, "standard", "long", LARGE_MODEL, 4000),
+    (5000, "quick", "quick", FAST_MODEL, 3000),
+    (120, "detailed", "long", LARGE_MODEL, 4000),
+    # Unknown depths are routed as standard
+    (120, "exhaustive", "short", FAST_MODEL, 2000),
+])
+def test_routing_table(model_routing, words, depth, route, model_id, max_tokens):
+    assert model_routing.select_route(ROUTES, words, depth) == {"name": route, "model_id": model_id, "max_tokens": max_tokens}
+
+
+def test_speeches_matching_no_route_go_to_the_default_model(model_routing):
+    assert model_routing.select_route(ROUTES[:1], 601) == {"name": "default", "model_id": LARGE_MODEL, "max_tokens": 4000}
+    assert model_routing.select_route([], 10) == {"name": "default", "model_id": LARGE_MODEL, "max_tokens": 4000}
+
+
+def test_routes_to_models_without_a_branch_use_the_default_model(model_routing):
+    routes = [{"name": "tiny", "max_words": 100, "model_id": "amazon.titan-text-lite-v1", "max_tokens": 1000}]
+
+    assert model_routing.select_route(routes, 50) == {"name": "tiny", "model_id": LARGE_MODEL, "max_tokens": 1000}
+
+
+def test_routes_are_read_from_ssm_and_cached(model_routing, monkeypatch):
+    assert model_routing.get_route(100)["name"] == "short"
+
+    # Updated routes are only read once the cached ones have expired
+    model_routing.get_client("ssm").put_parameter(Name=PARAMETER, Value="[]", Type="String", Overwrite=True)
+    assert model_routing.get_route(100)["name"] == "short"
+    monkeypatch.setattr(model_routing, "routes_loaded_at", 0.0)
+    monkeypatch.setattr(model_routing, "routes_ttl_seconds", 0)
+    assert model_routing.get_route(100)["name"] == "default"
+
+
+def test_prompts_carry_the_route_of_the_speech(model_routing, monkeypatch):
+    s3_client = boto3.client("s3", region_name="us-east-1")
+    s3_client.create_bucket(Bucket=BUCKET)
+    prepare_bedrock_prompts = importlib.import_module("prepare_bedrock_prompts")
+    monkeypatch.setattr(prepare_bedrock_prompts, "s3", s3_client)
+    s3_client.put_object(Bucket=BUCKET, Key=OBJECT_KEY, Body=b"audio", Metadata={"analysis-depth": "detailed"})
+    s3_client.put_object(Bucket=BUCKET, Key=f"transcribed-text-files/{OBJECT_KEY}-temp.json",
+                         Body=json.dumps({"results": {"transcripts": [{"transcript": "Hello everyone, thank you for coming."}]}}))
+    detail = {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}
+
+    detailed = prepare_bedrock_prompts.lambda_handler({"detail": detail}, None)
+    assert detailed["route"] == {"name": "long", "model_id": LARGE_MODEL, "max_tokens": 4000}
+
+    s3_client.put_object(Bucket=BUCKET, Key=OBJECT_KEY, Body=b"audio", Metadata={"analysis-depth": "quick"})
+    quick = prepare_bedrock_prompts.lambda_handler({"detail": detail}, None)
+    assert quick["route"] == {"name": "short", "model_id": FAST_MODEL, "max_tokens": 2000}
+    payload = json.loads(s3_client.get_object(Bucket=BUCKET, Key=quick["input"].removeprefix(f"s3://{BUCKET}/"))["Body"].read())
+    assert payload["max_tokens"] == 2000
+
+    # The rewrite continues the feedback on the same model
+    s3_client.put_object(Bucket=BUCKET, Key="bedrock_prompts/output/feedback.json",
+                         Body=json.dumps({"content": [{"type": "text", "text": "Add a recap."}]}))
+    rewrite = prepare_bedrock_prompts.lambda_handler({"detail": detail, "feedback_response": {
+        "s3uri": quick, "bedrock_response": {"Body": f"s3://{BUCKET}/bedrock_prompts/output/feedback.json"}
+    }}, None)
+    assert rewrite["route"] == quick["route"]
@@ -0,0 +1,121 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+from botocore.exceptions import EndpointConnectionError
+
+from tests.unit.stubs import FakeStepFunctionsClient, add_task, client_error
+from webapp.utils.poller import ExecutionPoller
+
+
+def test_subscriptions_to_the_same_execution_share_api_calls():
+    client = FakeStepFunctionsClient(page_size=100)
+    add_task(client, "StartTranscriptionJob")
+    poller = ExecutionPoller(client)
+    poller._ensure_started = lambda: None
+
+    subscriptions = [poller.subscribe("arn:execution") for _ in range(50)]
+    poller.poll_once(now=0)
+
+    assert client.history_calls == 1
+    assert client.describe_calls == 1
+    for subscription in subscriptions:
+        update = subscription.get(timeout=1)
+        assert "StartTranscriptionJob" in update["markdown"]
+        assert not update["completed"]
+
+
+def test_idle_executions_back_off_and_reset_on_new_events():
+    client = FakeStepFunctionsClient(page_size=100)
+    last = add_task(client, "StartTranscriptionJob")
+    poller = ExecutionPoller(client, min_interval=1, max_interval=4, backoff_factor=2)
+    poller._ensure_started = lambda: None
+    poller.subscribe("arn:execution")
+
+    assert poller.poll_once(now=0) == 1
+    assert poller.poll_once(now=1) == 2
+    assert poller.poll_once(now=3) == 4
+    assert poller.poll_once(now=7) == 4
+
+    add_task(client, "GetTranscriptionJobStatus", last)
+    assert poller.poll_once(now=11) == 1
+    # Running executions are only described on the first poll
+    assert client.describe_calls == 1
+
+
+def test_throttling_delays_every_watch():
+    client = FakeStepFunctionsClient(page_size=100)
+    add_task(client, "StartTranscriptionJob")
+    poller = ExecutionPoller(client, min_interval=1, max_throttle_delay=8)
+    poller._ensure_started = lambda: None
+    poller.subscribe("arn:execution-1")
+    poller.subscribe("arn:execution-2")
+
+    client.throttled_calls = 1
+    assert poller.poll_once(now=0) == 1
+    assert poller.throttle_delay == 1
+
+    client.throttled_calls = 1
+    poller.poll_once(now=1)
+    assert poller.throttle_delay == 2
+    assert poller.poll_once(now=1.5) == 1.5
+
+
+def test_completed_execution_is_published_and_unwatched():
+    client = FakeStepFunctionsClient(page_size=100)
+    last = add_task(client, "StartTranscriptionJob")
+    poller = ExecutionPoller(client, min_interval=0.01)
+    subscription = poller.subscribe("arn:execution")
+
+    assert not subscription.get(timeout=5)["completed"]
+    client.status = "SUCCEEDED"
+    client.add_event("ExecutionSucceeded", last)
+
+    update = subscription.get(timeout=5)
+    assert update["completed"]
+    assert update["execution"]["status"] == "SUCCEEDED"
+    assert poller.watched_execution_arns() == []
+
+
+
+@pytest.mark.parametrize("error", [
+    client_error("ExecutionDoesNotExist", "GetExecutionHistory"),
+    EndpointConnectionError(endpoint_url="https://states.us-east-1.amazonaws.com"),
+])
+def test_failing_execution_is_published_as_an_error_and_unwatched(error):
+    client = FakeStepFunctionsClient(page_size=100)
+    add_task(client, "StartTranscriptionJob")
+    client.history_error = error
+    poller = ExecutionPoller(client, min_interval=1, max_failures=3)
+    poller._ensure_started = lambda: None
+    subscription = poller.subscribe("arn:execution")
+
+    assert poller.poll_once(now=0) == 1.5
+    assert poller.poll_once(now=1.5) == 2.25
+    assert subscription.updates.empty()
+    assert poller.poll_once(now=3.75) is None
+
+    update = subscription.get(timeout=1)
+    assert update["completed"]
+    assert update["execution"]["status"] == "UNKNOWN"
+    assert update["error"] == str(error)
+    assert poller.watched_execution_arns() == []
+
+
+def test_polling_thread_survives_unexpected_errors():
+    client = FakeStepFunctionsClient(page_size=100)
+    add_task(client, "StartTranscriptionJob")
+    poller = ExecutionPoller(client, min_interval=0.01)
+    poll_once = poller.poll_once
+    errors = [RuntimeError("Unexpected error")]
+
+    def failing_poll_once(now=None):
+        if errors:
+            raise errors.pop()
+        return poll_once(now)
+
+    poller.poll_once = failing_poll_once
+    subscription = poller.subscribe("arn:execution")
+
+    assert "StartTranscriptionJob" in subscription.get(timeout=5)["markdown"]
+    assert poller.is_running()
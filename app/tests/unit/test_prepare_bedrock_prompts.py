@@ -0,0 +1,112 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+
+from tests.unit.stubs import FakeS3Client
+
+BUCKET = "psmb-bucket"
+OBJECT_KEY = "raw-audio-files/user-1/abc/talk.mp3"
+
+
+def put_transcript(s3_client, transcript):
+    s3_client.put_object(Bucket=BUCKET, Key=f"transcribed-text-files/{OBJECT_KEY}-temp.json",
+                         Body=json.dumps({"results": {"transcripts": [{"transcript": transcript}]}}))
+
+
+def read_json(s3_client, s3_uri):
+    key = s3_uri.removeprefix(f"s3://{BUCKET}/")
+    return json.loads(s3_client.get_object(Bucket=BUCKET, Key=key)["Body"].read())
+
+
+def test_each_parallel_analysis_gets_its_own_prompt(prepare_bedrock_prompts):
+    s3_client = prepare_bedrock_prompts.s3
+    put_transcript(s3_client, "Umm hello everyone")
+    detail = {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}
+
+    prompts = {
+        analysis: prepare_bedrock_prompts.lambda_handler({"analysis": analysis, "detail": detail}, None)
+        for analysis in prepare_bedrock_prompts.speech_analyses
+    }
+
+    assert len({prompt["input"] for prompt in prompts.values()}) == len(prompts)
+    assert prompts["delivery"]["input"].endswith("user-1-abc-talk.mp3-speech_delivery_payload.json")
+    payload = read_json(s3_client, prompts["delivery"]["input"])
+    content = " ".join(block["text"] for block in payload["messages"][0]["content"])
+    assert prepare_bedrock_prompts.speech_analyses["delivery"]["instructions"] in content
+    assert "<speech>Umm hello everyone</speech>" in content
+
+
+def test_parallel_analyses_are_combined_in_order(prepare_bedrock_prompts):
+    s3_client = prepare_bedrock_prompts.s3
+    analyses_response = []
+    for analysis, text in [("structure", "Add a recap."), ("rewrite", "Hello everyone!")]:
+        key = f"bedrock_prompts/output/{analysis}.json"
+        s3_client.put_object(Bucket=BUCKET, Key=key, Body=json.dumps({"content": [{"text": text}]}))
+        analyses_response.append({"analysis": analysis, "Body": f"s3://{BUCKET}/{key}"})
+    event = {"detail": {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}, "analyses_response": analyses_response}
+
+    output = prepare_bedrock_prompts.lambda_handler(event, None)
+
+    assert output.startswith("Thank you for using Public Speaking Mentor AI Assistant!")
+    assert output.index("### Structure\n\n Add a recap.") < output.index("### Speech Rewrite Suggestion\n\n Hello everyone!")
+
+
+def bedrock_response(text):
+    return {"content": [{"type": "text", "text": text}]}
+
+
+def test_small_prompts_and_responses_stay_in_the_state(prepare_bedrock_prompts, monkeypatch):
+    s3_client = FakeS3Client()
+    monkeypatch.setattr(prepare_bedrock_prompts, "s3", s3_client)
+    monkeypatch.setattr(prepare_bedrock_prompts, "payload_inline_max_bytes", 64 * 1024)
+    put_transcript(s3_client, "Umm hello  everyone")
+    s3_client.calls.clear()
+    state = {"detail": {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}}
+
+    feedback_prompt = prepare_bedrock_prompts.lambda_handler(state, None)
+    assert "input" not in feedback_prompt
+    assert feedback_prompt["transcript"] == "Umm hello everyone"
+    assert "<speech>Umm hello everyone</speech>" in feedback_prompt["body"]["messages"][0]["content"][0]["text"]
+    # Only the transcription is read and the transcript text saved for the webapp
+    assert s3_client.calls == {"GetObject": 1, "PutObject": 1}
+    s3_client.calls.clear()
+
+    state["feedback_response"] = {"s3uri": feedback_prompt,
+                                  "bedrock_response": {"Body": bedrock_response("Fewer fillers.")}}
+    rewrite_prompt = prepare_bedrock_prompts.lambda_handler(state, None)
+    assert "Fewer fillers." in json.dumps(rewrite_prompt["body"])
+    assert "Umm hello everyone" in json.dumps(rewrite_prompt["body"])
+
+    state["rewrite_response"] = {"s3uri": rewrite_prompt,
+                                 "bedrock_response": {"Body": bedrock_response("Hello everyone!")}}
+    output = prepare_bedrock_prompts.lambda_handler(state, None)
+    assert "Fewer fillers." in output and "Hello everyone!" in output
+    # The rewrite and combine steps only look up the result cache metadata
+    assert s3_client.calls == {"HeadObject": 1}
+
+
+def test_large_prompts_are_written_to_s3(prepare_bedrock_prompts, monkeypatch):
+    s3_client = prepare_bedrock_prompts.s3
+    monkeypatch.setattr(prepare_bedrock_prompts, "payload_inline_max_bytes", 1024)
+    put_transcript(s3_client, "Hello everyone. " * 100)
+    detail = {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}
+
+    prompt = prepare_bedrock_prompts.lambda_handler({"detail": detail}, None)
+
+    assert "body" not in prompt and "transcript" not in prompt
+    assert read_json(s3_client, prompt["input"])["messages"][0]["content"][0]["text"].count("Hello everyone.") == 100
+
+
+def test_prompts_are_written_to_s3_when_the_state_is_near_its_limit(prepare_bedrock_prompts, monkeypatch):
+    s3_client = prepare_bedrock_prompts.s3
+    monkeypatch.setattr(prepare_bedrock_prompts, "payload_inline_max_bytes", 64 * 1024)
+    put_transcript(s3_client, "Hello everyone")
+    detail = {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}
+
+    small_state = prepare_bedrock_prompts.lambda_handler({"analysis": "delivery", "detail": detail}, None)
+    large_state = prepare_bedrock_prompts.lambda_handler({"analysis": "delivery", "detail": detail,
+                                                          "padding": "x" * 200 * 1024}, None)
+
+    assert "body" in small_state
+    assert "body" not in large_state and large_state["input"].endswith("speech_delivery_payload.json")
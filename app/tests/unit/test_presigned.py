@@ -0,0 +1,88 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import base64
+import json
+import time
+from datetime import datetime, timezone
+from urllib.parse import parse_qs, urlparse
+
+import boto3
+import pytest
+import requests
+from botocore.config import Config as BotoConfig
+from moto import mock_aws
+
+from webapp.utils import presigned
+
+BUCKET = "psmb-bucket"
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1", config=BotoConfig(signature_version="s3v4"))
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def decode_policy(presigned_post):
+    return json.loads(base64.b64decode(presigned_post["fields"]["policy"]))
+
+
+def test_presigned_post_is_scoped_to_the_user_upload_prefix(s3_client):
+    presigned_post = presigned.create_presigned_post(s3_client, BUCKET, "user-1", max_size=1024, expires_in=900)
+    policy = decode_policy(presigned_post)
+
+    assert presigned_post["prefix"].startswith("raw-audio-files/user-1/")
+    assert presigned_post["fields"]["key"] == presigned_post["prefix"] + "${filename}"
+    assert ["starts-with", "$key", presigned_post["prefix"]] in policy["conditions"]
+    assert ["content-length-range", 1, 1024] in policy["conditions"]
+    assert {"x-amz-meta-user-id": "user-1"} in policy["conditions"]
+    assert {"bucket": BUCKET} in policy["conditions"]
+
+
+def test_presigned_post_expires(s3_client):
+    before = time.time()
+    presigned_post = presigned.create_presigned_post(s3_client, BUCKET, "user-1", max_size=1024, expires_in=900)
+    expiration = datetime.strptime(decode_policy(presigned_post)["expiration"], "%Y-%m-%dT%H:%M:%SZ")
+
+    seconds_left = expiration.replace(tzinfo=timezone.utc).timestamp() - before
+    assert 898 <= seconds_left <= 901
+
+
+def test_browser_upload_is_found_under_its_prefix_only(s3_client):
+    first = presigned.create_presigned_post(s3_client, BUCKET, "user-1", max_size=1024, expires_in=900)
+    second = presigned.create_presigned_post(s3_client, BUCKET, "user-2", max_size=1024, expires_in=900)
+    assert presigned.find_uploaded_object(s3_client, BUCKET, first["prefix"]) is None
+
+    fields = dict(first["fields"], key=first["prefix"] + "speech.mp3")
+    response = requests.post(first["url"], data=fields, files={"file": ("speech.mp3", b"audio")}, timeout=10)
+
+    assert int(response.status_code) == 201
+    assert presigned.find_uploaded_object(s3_client, BUCKET, first["prefix"]) == first["prefix"] + "speech.mp3"
+    assert presigned.find_uploaded_object(s3_client, BUCKET, second["prefix"]) is None
+
+
+def test_presigned_multipart_upload(s3_client):
+    data = b"a" * (5 * 1024 * 1024) + b"b" * 10
+    upload = presigned.create_presigned_multipart_upload(
+        s3_client, BUCKET, "user-1", "long talk.mp4", len(data), expires_in=600, part_size=5 * 1024 * 1024
+    )
+    assert upload["key"].startswith("raw-audio-files/user-1/")
+    assert upload["key"].endswith("/longtalk.mp4")
+    assert len(upload["part_urls"]) == 2
+    for url in upload["part_urls"]:
+        query = parse_qs(urlparse(url).query)
+        assert query["X-Amz-Expires"] == ["600"]
+        assert query["uploadId"] == [upload["upload_id"]]
+
+    etags = []
+    for part_number, url in enumerate(upload["part_urls"]):
+        chunk = data[part_number * upload["part_size"]:(part_number + 1) * upload["part_size"]]
+        etags.append(requests.put(url, data=chunk, timeout=10).headers["ETag"])
+    presigned.complete_presigned_multipart_upload(s3_client, BUCKET, upload["key"], upload["upload_id"], etags)
+
+    assert s3_client.get_object(Bucket=BUCKET, Key=upload["key"])["Body"].read() == data
@@ -0,0 +1,101 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import importlib
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tests.unit.stubs import FakeS3Client
+
+BUCKET = "psmb-bucket"
+
+
+@pytest.fixture
+def prompt_cache(lambda_modules):
+    return importlib.import_module("prompt_cache")
+
+
+def payload(transcript, max_tokens=4000):
+    return {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": max_tokens,
+        "system": "You are a Public Speaking Mentor AI Assistant",
+        "messages": [{"role": "user", "content": transcript}],
+    }
+
+
+def read_metrics(output):
+    lines = [json.loads(line) for line in output.splitlines() if line.startswith("{")]
+    return [line for line in lines if "_aws" in line]
+
+
+def test_cache_key_ignores_whitespace_but_not_prompt_settings(prompt_cache):
+    normalize_transcript = importlib.import_module("speech_analysis.bedrock_prompts").normalize_transcript
+    key = prompt_cache.get_prompt_cache_key(payload(normalize_transcript("Hello  everyone,\n welcome ")))
+
+    assert key == prompt_cache.get_prompt_cache_key(payload(normalize_transcript("Hello everyone, welcome")))
+    assert key != prompt_cache.get_prompt_cache_key(payload("Hello everyone, welcome", max_tokens=2000))
+
+
+def test_lookup_misses_until_bedrock_writes_the_response(prompt_cache, capsys):
+    s3_client = FakeS3Client()
+    cache = prompt_cache.PromptCache(s3_client, BUCKET, ttl_days=30)
+
+    cache_key, cached = cache.lookup(payload("Hello everyone"), "speech_feedback")
+    assert not cached
+    # Bedrock writes its response to the output key returned on the miss
+    s3_client.put_object(Bucket=BUCKET, Key=cache.get_output_key(cache_key), Body="{}")
+    assert cache.lookup(payload("Hello everyone"), "speech_feedback") == (cache_key, True)
+
+    metrics = read_metrics(capsys.readouterr().out)
+    assert [(m["PromptCacheHit"], m["PromptCacheMiss"]) for m in metrics] == [(0, 1), (1, 0)]
+    assert metrics[0]["Prompt"] == "speech_feedback"
+    assert metrics[0]["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["Prompt"]]
+
+
+def test_expired_entries_are_misses(prompt_cache):
+    s3_client = FakeS3Client()
+    cache = prompt_cache.PromptCache(s3_client, BUCKET, ttl_days=30)
+    cache_key = prompt_cache.get_prompt_cache_key(payload("Hello everyone"))
+    s3_client.put_object(Bucket=BUCKET, Key=cache.get_output_key(cache_key), Body="{}")
+    s3_client.objects[(BUCKET, cache.get_output_key(cache_key))]["LastModified"] -= timedelta(days=31)
+
+    assert not cache.is_cached(cache_key)
+
+
+def test_lambda_points_bedrock_output_at_the_cache(prepare_bedrock_prompts, monkeypatch):
+    monkeypatch.setattr(prepare_bedrock_prompts, "prompt_cache_ttl_days", 30)
+    s3_client = prepare_bedrock_prompts.s3
+    transcript = {"results": {"transcripts": [{"transcript": "Hello   everyone"}]}}
+    for upload in ("first", "second"):
+        s3_client.put_object(Bucket=BUCKET, Key=f"transcribed-text-files/raw-audio-files/user-1/{upload}/talk.mp3-temp.json",
+                             Body=json.dumps(transcript))
+    event = {"detail": {"bucket": {"name": BUCKET}, "object": {"key": "raw-audio-files/user-1/first/talk.mp3"}}}
+
+    first = prepare_bedrock_prompts.lambda_handler(event, None)
+    assert first["cached"] is False
+    assert first["output"].startswith(f"s3://{BUCKET}/bedrock_prompts/cache/")
+    s3_client.put_object(Bucket=BUCKET, Key=first["output"].removeprefix(f"s3://{BUCKET}/"), Body="{}")
+
+    event["detail"]["object"]["key"] = "raw-audio-files/user-1/second/talk.mp3"
+    second = prepare_bedrock_prompts.lambda_handler(event, None)
+    assert second["cached"] is True
+    assert second["output"] == first["output"]
+    assert second["input"] != first["input"]
+
+
+def test_lambda_writes_responses_per_upload_without_cache(prepare_bedrock_prompts):
+    s3_client = prepare_bedrock_prompts.s3
+    s3_client.put_object(Bucket=BUCKET, Key="transcribed-text-files/raw-audio-files/user-1/abc/talk.mp3-temp.json",
+                         Body=json.dumps({"results": {"transcripts": [{"transcript": "Hello"}]}}))
+    event = {"detail": {"bucket": {"name": BUCKET}, "object": {"key": "raw-audio-files/user-1/abc/talk.mp3"}}}
+
+    response = prepare_bedrock_prompts.lambda_handler(event, None)
+
+    assert response == {
+        "input": f"s3://{BUCKET}/bedrock_prompts/user-1-abc-talk.mp3-speech_feedback_payload.json",
+        "output": f"s3://{BUCKET}/bedrock_prompts/output/user-1-abc-talk.mp3-speech_feedback_response.json",
+        "cached": False,
+    }
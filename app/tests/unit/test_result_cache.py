@@ -0,0 +1,65 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import base64
+import hashlib
+import json
+from datetime import datetime, timezone
+
+from speech_analysis.result_cache import get_content_hash, get_result_cache_key
+from tests.unit.stubs import FakeS3Client
+from webapp.utils.result_cache import ResultCache
+
+BUCKET = "psmb-bucket"
+
+
+class Clock:
+    def __init__(self, now=1_700_000_000):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_content_hash_is_the_hex_of_the_upload_checksum():
+    digest = hashlib.sha256(b"rehearsal").digest()
+    checksum = base64.b64encode(digest).decode("ascii")
+
+    assert get_content_hash(checksum) == digest.hex()
+    assert get_content_hash(f"{checksum}-4") == f"{digest.hex()}-4"
+
+
+def test_cached_result_is_returned_until_it_expires():
+    clock = Clock()
+    s3_client = FakeS3Client()
+    cache = ResultCache(s3_client, BUCKET, ttl_seconds=3600, clock=clock)
+    assert cache.get("abc") is None
+
+    entry = {"output": "Great speech", "object_key": "raw-audio-files/user-1/1/speech.mp3",
+             "created_at": datetime.fromtimestamp(clock.now, timezone.utc).isoformat()}
+    s3_client.put_object(Bucket=BUCKET, Key=get_result_cache_key("abc"), Body=json.dumps(entry))
+    clock.now += 3599
+    assert cache.get("abc") == "Great speech"
+    clock.now += 1
+    assert cache.get("abc") is None
+
+
+def test_lambda_caches_combined_output_by_content_hash(prepare_bedrock_prompts):
+    s3_client = prepare_bedrock_prompts.s3
+    object_key = "raw-audio-files/user-1/abc/speech.mp3"
+    s3_client.put_object(Bucket=BUCKET, Key=object_key, Body=b"audio", ChecksumAlgorithm="SHA256")
+    content_hash = hashlib.sha256(b"audio").hexdigest()
+    for name, text in [("feedback", "Speak slower."), ("rewrite", "Hello everyone!")]:
+        s3_client.put_object(Bucket=BUCKET, Key=f"bedrock_prompts/output/{name}.json",
+                             Body=json.dumps({"content": [{"text": text}]}))
+    event = {
+        "detail": {"bucket": {"name": BUCKET}, "object": {"key": object_key}},
+        "feedback_response": {"bedrock_response": {"Body": f"s3://{BUCKET}/bedrock_prompts/output/feedback.json"}},
+        "rewrite_response": {"bedrock_response": {"Body": f"s3://{BUCKET}/bedrock_prompts/output/rewrite.json"}},
+    }
+
+    output = prepare_bedrock_prompts.lambda_handler(event, None)
+
+    assert ResultCache(s3_client, BUCKET).get(content_hash) == output
+    entry = json.loads(s3_client.get_object(Bucket=BUCKET, Key=get_result_cache_key(content_hash))["Body"].read())
+    assert entry["object_key"] == object_key
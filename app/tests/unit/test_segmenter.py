@@ -0,0 +1,156 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import importlib
+import json
+import random
+
+import pytest
+
+from tests.unit.stubs import FakeS3Client
+
+BUCKET = "psmb-bucket"
+OBJECT_KEY = "raw-audio-files/user-1/abc/keynote.mp4"
+
+
+@pytest.fixture
+def segmenter(lambda_modules):
+    return importlib.import_module("segmenter")
+
+
+def synthetic_words(word_count, punctuated=True, seed=7):
+    # Sentences of 3 to 40 words, each word named after its position
+    rng = random.Random(seed)
+    words = []
+    while len(words) < word_count:
+        length = rng.randint(3, 40) if punctuated else word_count
+        words.extend(f"w{len(words) + i}" for i in range(length))
+        if punctuated:
+            words[-1] += "."
+    return words[:word_count]
+
+
+def transcription(words):
+    return {"results": {"transcripts": [{"transcript": " ".join(words)}]}}
+
+
+def assert_covers_in_order(chunks, word_count, max_words, overlap_words):
+    assert chunks[0]["first_word"] == 0
+    assert chunks[-1]["last_word"] == word_count - 1
+    for previous, chunk in zip(chunks, chunks[1:]):
+        overlap = previous["last_word"] - chunk["first_word"] + 1
+        assert 0 <= overlap <= overlap_words
+        assert chunk["last_word"] > previous["last_word"]
+    for chunk in chunks:
+        assert chunk["last_word"] - chunk["first_word"] + 1 <= max_words
+        assert len(chunk["text"].split()) == chunk["last_word"] - chunk["first_word"] + 1
+
+
+def test_100k_word_transcript_is_split_on_sentences_with_overlap(segmenter):
+    words = synthetic_words(100_000)
+
+    chunks = segmenter.segment_transcription(transcription(words), max_words=3000, overlap_words=150)
+
+    assert 34 <= len(chunks) <= 40
+    assert_covers_in_order(chunks, len(words), 3000, 150)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        # Chunks start on a sentence and repeat the last sentences of the previous chunk
+        assert words[chunk["first_word"] - 1].endswith(".")
+        assert chunk["first_word"] <= previous["last_word"]
+    assert chunks[1]["label"] == f"words {chunks[1]['first_word'] + 1}-{chunks[1]['last_word'] + 1}"
+
+
+def test_100k_words_without_punctuation_still_overlap(segmenter):
+    words = synthetic_words(100_000, punctuated=False)
+
+    chunks = segmenter.segment_transcription(transcription(words), max_words=3000, overlap_words=150)
+
+    assert_covers_in_order(chunks, len(words), 3000, 150)
+    assert all(previous["last_word"] - chunk["first_word"] + 1 == 150 for previous, chunk in zip(chunks, chunks[1:]))
+
+
+def test_transcribe_items_are_split_on_time(segmenter):
+    # 100k words spoken at 2.5 words per second, with punctuation items
+    items = []
+    for position, word in enumerate(synthetic_words(100_000)):
+        items.append({"type": "pronunciation", "start_time": str(position * 0.4), "end_time": str(position * 0.4 + 0.3),
+                      "alternatives": [{"content": word.rstrip(".")}]})
+        if word.endswith("."):
+            items.append({"type": "punctuation", "alternatives": [{"content": "."}]})
+    result = {"results": {"transcripts": [{"transcript": ""}], "items": items}}
+
+    chunks = segmenter.segment_transcription(result, max_words=3000, overlap_words=150, max_seconds=600)
+
+    assert_covers_in_order(chunks, 100_000, 3000, 150)
+    for chunk in chunks:
+        assert (chunk["last_word"] - chunk["first_word"]) * 0.4 + 0.3 <= 600
+    assert chunks[0]["label"].startswith("00:00-")
+    assert chunks[-1]["label"].endswith("-11:06:39")
+
+
+def test_short_transcript_is_a_single_chunk(segmenter):
+    chunks = segmenter.segment_transcription(transcription(["Hello", "everyone."]), max_words=3000, overlap_words=150)
+
+    assert [(chunk["text"], chunk["label"]) for chunk in chunks] == [("Hello everyone.", "words 1-2")]
+
+
+def test_lambda_prepares_a_prompt_per_chunk_and_reduces_the_feedback(prepare_bedrock_prompts, monkeypatch):
+    monkeypatch.setattr(prepare_bedrock_prompts, "chunk_max_words", 3000)
+    monkeypatch.setattr(prepare_bedrock_prompts, "chunk_overlap_words", 150)
+    s3_client = prepare_bedrock_prompts.s3
+    s3_client.put_object(Bucket=BUCKET, Key=f"transcribed-text-files/{OBJECT_KEY}-temp.json",
+                         Body=json.dumps(transcription(synthetic_words(100_000))))
+    detail = {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}
+
+    chunks = prepare_bedrock_prompts.lambda_handler({"segment_transcript": True, "detail": detail}, None)["chunks"]
+
+    assert len(chunks) > 30
+    payload = json.loads(s3_client.get_object(Bucket=BUCKET, Key=chunks[1]["input"].removeprefix(f"s3://{BUCKET}/"))["Body"].read())
+    assert f"this is part 2 of {len(chunks)}" in payload["messages"][0]["content"]
+
+    chunks_response = []
+    for chunk in chunks[:2]:
+        key = chunk["output"].removeprefix(f"s3://{BUCKET}/")
+        s3_client.put_object(Bucket=BUCKET, Key=key, Body=json.dumps({"content": [{"text": f"Feedback {chunk['index']}"}]}))
+        chunks_response.append({"index": chunk["index"], "label": chunk["label"], "Body": chunk["output"]})
+    output = prepare_bedrock_prompts.lambda_handler({"detail": detail, "chunks_response": chunks_response}, None)
+
+    assert output.index(f"### Part 1 ({chunks[0]['label']})\n\n Feedback 0") < output.index(f"### Part 2 ({chunks[1]['label']})\n\n Feedback 1")
+
+
+def test_lambda_returns_no_chunks_for_short_transcripts(prepare_bedrock_prompts, monkeypatch):
+    monkeypatch.setattr(prepare_bedrock_prompts, "chunk_max_words", 3000)
+    prepare_bedrock_prompts.s3.put_object(Bucket=BUCKET, Key=f"transcribed-text-files/{OBJECT_KEY}-temp.json",
+                                          Body=json.dumps(transcription(synthetic_words(500))))
+    detail = {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}
+
+    assert prepare_bedrock_prompts.lambda_handler({"segment_transcript": True, "detail": detail}, None) == {"chunks": []}
+
+
+def test_feedback_step_returns_the_chunks_of_long_transcripts(prepare_bedrock_prompts, monkeypatch):
+    monkeypatch.setattr(prepare_bedrock_prompts, "chunk_max_words", 3000)
+    monkeypatch.setattr(prepare_bedrock_prompts, "chunk_overlap_words", 150)
+    detail = {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}
+    for word_count, chunked in [(500, False), (10_000, True)]:
+        prepare_bedrock_prompts.s3.put_object(Bucket=BUCKET, Key=f"transcribed-text-files/{OBJECT_KEY}-temp.json",
+                                              Body=json.dumps(transcription(synthetic_words(word_count))))
+
+        prompt = prepare_bedrock_prompts.lambda_handler({"detail": detail}, None)
+
+        assert ("chunks" in prompt) is chunked
+        assert ("output" in prompt) is not chunked
+
+
+def test_feedback_step_reads_the_transcription_once_without_numpy(prepare_bedrock_prompts, monkeypatch):
+    s3_client = FakeS3Client()
+    monkeypatch.setattr(prepare_bedrock_prompts, "s3", s3_client)
+    monkeypatch.setattr(prepare_bedrock_prompts.speech_metrics, "enabled", False)
+    monkeypatch.setattr(prepare_bedrock_prompts, "chunk_max_words", 3000)
+    s3_client.put_object(Bucket=BUCKET, Key=f"transcribed-text-files/{OBJECT_KEY}-temp.json",
+                         Body=json.dumps(transcription(synthetic_words(10_000))))
+    s3_client.calls.clear()
+
+    prompt = prepare_bedrock_prompts.lambda_handler({"detail": {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}}, None)
+
+    assert len(prompt["chunks"]) > 1
+    assert s3_client.calls["GetObject"] == 1
@@ -0,0 +1,122 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import importlib
+import json
+import time
+
+import pytest
+
+BUCKET = "psmb-bucket"
+OBJECT_KEY = "raw-audio-files/user-1/abc/keynote.mp4"
+
+
+@pytest.fixture
+def speech_metrics(lambda_modules):
+    return importlib.import_module("speech_analysis.speech_metrics")
+
+
+def transcription(words, start_time=0.0, word_seconds=0.3, gap_seconds=0.1, pauses=None, confidence="0.99"):
+    """
+    Transcribe output of the given words, one every word_seconds + gap_seconds,
+    with a longer silence before the word positions given in pauses.
+    """
+    pauses = pauses or {}
+    items = []
+    time_ = start_time
+    for position, word in enumerate(words):
+        time_ += pauses.get(position, 0.0)
+        punctuation = word[-1] if word[-1] in ".,?!" else None
+        content = word.rstrip(".,?!")
+        items.append({"type": "pronunciation", "start_time": f"{time_:.3f}", "end_time": f"{time_ + word_seconds:.3f}",
+                      "alternatives": [{"confidence": confidence, "content": content}]})
+        if punctuation:
+            items.append({"type": "punctuation", "alternatives": [{"confidence": "0.0", "content": punctuation}]})
+        time_ += word_seconds + gap_seconds
+    return {"results": {"transcripts": [{"transcript": " ".join(words)}], "items": items}}
+
+
+SPEECH = ("Um, good morning everyone. Today I want to, uh, talk about the the future of work. "
+          "Um, the future of work is remote. And the future of work is, ah, flexible. "
+          "So I I think the future of work is bright.").split()
+
+
+def test_fillers_and_repetitions_are_counted(speech_metrics):
+    metrics = speech_metrics.compute_speech_metrics(transcription(SPEECH))
+
+    assert metrics["words"] == len(SPEECH)
+    assert metrics["fillers"] == {"um": 2, "ah": 1, "uh": 1}
+    assert metrics["filler_words"] == 4
+    assert metrics["repeated_words"] == 2
+    assert metrics["repeated_words_at"][0].startswith("the ")
+    assert metrics["repeated_phrases"] == {"future of work": 4, "the future of": 4, "of work is": 3}
+
+
+def test_pace_and_pauses_are_measured(speech_metrics):
+    # Two minutes at 150 words per minute, then one at 75, with two long pauses
+    words = ["word"] * 375
+    pauses = {300: 20.0, 320: 1.5}
+    metrics = speech_metrics.compute_speech_metrics(
+        transcription(words, word_seconds=0.3, gap_seconds=0.1, pauses=pauses))
+
+    assert metrics["words_per_minute_by_window"][:2] == [150, 150]
+    assert metrics["words_per_minute_by_window"][2] < 100
+    assert metrics["pauses"] == 2
+    assert metrics["pauses_by_length"] == [1, 0, 1]
+    assert metrics["longest_pause_seconds"] == 20.1
+    assert metrics["longest_pause_at"] == "01:59"
+    assert metrics["median_gap_seconds"] == pytest.approx(0.1)
+
+
+def test_low_confidence_words_are_reported(speech_metrics):
+    metrics = speech_metrics.compute_speech_metrics(transcription(SPEECH, confidence="0.3"))
+
+    assert metrics["low_confidence_words_percent"] == 100.0
+
+
+def test_transcripts_without_timings_have_no_metrics(speech_metrics):
+    assert speech_metrics.compute_speech_metrics({"results": {"transcripts": [{"transcript": "Hello"}]}}) is None
+
+
+def test_metrics_are_formatted_for_the_prompt(speech_metrics):
+    text = speech_metrics.format_speech_metrics(speech_metrics.compute_speech_metrics(transcription(SPEECH)))
+
+    assert "- Filler words: 4 (" in text
+    assert '"the future of" 4 times' in text
+    assert all(line.startswith("- ") for line in text.splitlines())
+
+
+def test_100k_words_are_measured_in_milliseconds(speech_metrics):
+    words = [f"w{position % 5000}" for position in range(100_000)]
+    data = transcription(words)
+
+    start = time.perf_counter()
+    metrics = speech_metrics.compute_speech_metrics(data)
+    elapsed = time.perf_counter() - start
+
+    assert metrics["words"] == 100_000
+    # Generous bound for slow CI machines, typically well under a second
+    assert elapsed < 5
+
+
+def test_feedback_prompt_includes_the_metrics(prepare_bedrock_prompts):
+    s3_client = prepare_bedrock_prompts.s3
+    s3_client.put_object(Bucket=BUCKET, Key=f"transcribed-text-files/{OBJECT_KEY}-temp.json",
+                         Body=json.dumps(transcription(SPEECH)))
+    detail = {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}
+
+    prompts = {
+        name: prepare_bedrock_prompts.lambda_handler(event, None)
+        for name, event in [("feedback", {"detail": detail}),
+                            ("structure", {"analysis": "structure", "detail": detail}),
+                            ("delivery", {"analysis": "delivery", "detail": detail})]
+    }
+
+    def content(prompt):
+        key = prompt["input"].removeprefix(f"s3://{BUCKET}/")
+        payload = json.loads(s3_client.get_object(Bucket=BUCKET, Key=key)["Body"].read())
+        return " ".join(block["text"] for block in payload["messages"][0]["content"])
+
+    assert "Filler words: 4" in content(prompts["feedback"])
+    assert "Filler words: 4" in content(prompts["delivery"])
+    assert "<metrics>" not in content(prompts["structure"])
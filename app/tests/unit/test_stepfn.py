@@ -0,0 +1,30 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_stepfn_imports_without_aws_connectivity():
+    # No credentials, region or config files: any AWS lookup at import time would fail
+    env = {key: value for key, value in os.environ.items() if not key.startswith("AWS_")}
+    env["AWS_CONFIG_FILE"] = os.devnull
+    env["AWS_SHARED_CREDENTIALS_FILE"] = os.devnull
+    env["AWS_EC2_METADATA_DISABLED"] = "true"
+    script = (
+        "import sys\n"
+        "import webapp.utils.stepfn as stepfn\n"
+        "assert stepfn.get_registry()._session is None\n"
+        "assert 'boto3' not in sys.modules\n"
+        "print(stepfn.get_execution_name('session'))\n"
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=APP_DIR, env=env, capture_output=True, universal_newlines=True
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.startswith("streamlit-session-")
@@ -0,0 +1,109 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import importlib
+import json
+import os
+
+import pytest
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "bedrock")
+BUCKET = "psmb-bucket"
+OBJECT_KEY = "raw-audio-files/user-1/abc/talk.mp3"
+
+TRANSCRIPT = ("Good morning everyone. Um, thank you for coming. Today I will talk about, uh, why every team "
+              "should practise their presentations. Practice builds confidence, and confidence builds trust. Let's start.")
+SPEECH_METRICS = ("- Duration: 00:14, 34 words, 146 words per minute overall\n"
+                  "- Filler words: 2 (5.9 per 100 words): um 1, uh 1")
+FEEDBACK = "Your opening is clear. Drop the filler words um and uh, and end with a call to action."
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, f"{name}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def bedrock_prompts(lambda_modules, monkeypatch):
+    module = importlib.import_module("speech_analysis.bedrock_prompts")
+    monkeypatch.setattr(module, "default_prompt_caching", True)
+    return module
+
+
+@pytest.fixture
+def token_usage(lambda_modules):
+    return importlib.import_module("token_usage")
+
+
+def cached_prefix(payload):
+    # The system prompt and the content blocks up to the last cache point
+    blocks = payload["messages"][0]["content"]
+    last_cache_point = max(i for i, block in enumerate(blocks) if "cache_control" in block)
+    return payload["system"], blocks[:last_cache_point + 1]
+
+
+def test_payloads_match_the_recorded_requests(bedrock_prompts):
+    assert bedrock_prompts.create_bedrock_payload_speech_feedback(TRANSCRIPT, SPEECH_METRICS) == load_fixture("speech_feedback_request")
+    assert bedrock_prompts.create_bedrock_payload_speech_rewrite(TRANSCRIPT, FEEDBACK) == load_fixture("speech_rewrite_request")
+
+
+def test_prompts_on_a_transcript_share_the_cached_prefix(bedrock_prompts):
+    prefix = cached_prefix(bedrock_prompts.create_bedrock_payload_speech_feedback(TRANSCRIPT, SPEECH_METRICS))
+
+    assert "<speech>" in prefix[1][-1]["text"]
+    assert cached_prefix(bedrock_prompts.create_bedrock_payload_speech_rewrite(TRANSCRIPT, FEEDBACK)) == prefix
+    for analysis in bedrock_prompts.speech_analyses:
+        payload = bedrock_prompts.create_bedrock_payload_speech_analysis(TRANSCRIPT, analysis, SPEECH_METRICS)
+        assert cached_prefix(payload) == prefix
+
+
+def test_cache_points_are_only_added_when_enabled(bedrock_prompts):
+    payload = bedrock_prompts.create_bedrock_payload_speech_feedback(TRANSCRIPT, SPEECH_METRICS, prompt_caching=False)
+
+    assert "cache_control" not in json.dumps(payload)
+    assert [block["text"] for block in payload["messages"][0]["content"]] == \
+        [block["text"] for block in load_fixture("speech_feedback_request")["messages"][0]["content"]]
+
+
+def test_usage_report_splits_cached_and_uncached_input_tokens(token_usage):
+    report = token_usage.usage_report([
+        ("speech_feedback", load_fixture("speech_feedback_response"), False),
+        ("speech_rewrite", load_fixture("speech_rewrite_response"), False),
+    ])
+
+    assert report["prompts"]["speech_feedback"]["cache_creation_input_tokens"] == 1310
+    assert report["prompts"]["speech_rewrite"]["cache_read_input_tokens"] == 1310
+    assert report["input_tokens"] == 72 + 168
+    assert report["total_input_tokens"] == 72 + 1310 + 168 + 1310
+    assert report["output_tokens"] == 412 + 655
+    assert report["cached_input_tokens_percent"] == 45.8
+
+
+def test_responses_from_the_prompt_cache_cost_no_tokens(token_usage):
+    report = token_usage.usage_report([
+        ("speech_feedback", load_fixture("speech_feedback_response"), True),
+        ("speech_rewrite", {"content": [{"type": "text", "text": "Hello"}]}, False),
+    ])
+
+    assert report["responses_from_cache"] == 1
+    assert report["prompts"] == {"speech_rewrite": {field: 0 for field in token_usage.usage_fields}}
+    assert report["total_input_tokens"] == 0 and report["cached_input_tokens_percent"] == 0.0
+
+
+def test_combine_step_publishes_the_token_usage(prepare_bedrock_prompts, capsys):
+    detail = {"bucket": {"name": BUCKET}, "object": {"key": OBJECT_KEY}}
+    event = {
+        "detail": detail,
+        "feedback_response": {"s3uri": {"cached": False},
+                              "bedrock_response": {"Body": load_fixture("speech_feedback_response")}},
+        "rewrite_response": {"s3uri": {"cached": False},
+                             "bedrock_response": {"Body": load_fixture("speech_rewrite_response")}},
+    }
+
+    prepare_bedrock_prompts.lambda_handler(event, None)
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+    report = next(line for line in lines if line.get("message") == "Bedrock token usage")
+    assert report["cache_read_input_tokens"] == 1310
+    metrics = next(line for line in lines if "CacheReadInputTokens" in line)
+    assert (metrics["InputTokens"], metrics["CacheWriteInputTokens"], metrics["OutputTokens"]) == (240, 1310, 1067)
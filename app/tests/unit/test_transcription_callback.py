@@ -0,0 +1,96 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import importlib
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+BUCKET = "psmb-bucket"
+
+
+class FakeTranscribeClient:
+    def __init__(self):
+        self.statuses = {}
+
+    def get_transcription_job(self, TranscriptionJobName):
+        return {"TranscriptionJob": {
+            "TranscriptionJobName": TranscriptionJobName,
+            "TranscriptionJobStatus": self.statuses[TranscriptionJobName],
+        }}
+
+
+class FakeStepFunctionsClient:
+    def __init__(self):
+        self.exceptions = boto3.client("stepfunctions", region_name="us-east-1").exceptions
+        self.outputs_by_token = {}
+
+    def send_task_success(self, taskToken, output):
+        if taskToken in self.outputs_by_token:
+            raise self.exceptions.TaskTimedOut({"Error": {"Code": "TaskTimedOut"}}, "SendTaskSuccess")
+        self.outputs_by_token[taskToken] = json.loads(output)
+
+
+@pytest.fixture
+def transcription_callback(aws_credentials, lambda_modules, monkeypatch):
+    monkeypatch.setenv("BUCKET_NAME", BUCKET)
+    with mock_aws():
+        module = importlib.import_module("transcription_callback")
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket=BUCKET)
+        monkeypatch.setattr(module, "s3", s3_client)
+        monkeypatch.setattr(module, "transcribe", FakeTranscribeClient())
+        monkeypatch.setattr(module, "sfn", FakeStepFunctionsClient())
+        yield module
+
+
+def job_state_change(job_name, status):
+    return {
+        "source": "aws.transcribe",
+        "detail-type": "Transcribe Job State Change",
+        "detail": {"TranscriptionJobName": job_name, "TranscriptionJobStatus": status},
+    }
+
+
+def test_job_state_change_resumes_the_waiting_execution(transcription_callback):
+    transcription_callback.transcribe.statuses["job-1"] = "IN_PROGRESS"
+    transcription_callback.lambda_handler({"TaskToken": "token-1", "TranscriptionJobName": "job-1"}, None)
+    assert transcription_callback.sfn.outputs_by_token == {}
+
+    transcription_callback.transcribe.statuses["job-1"] = "COMPLETED"
+    transcription_callback.lambda_handler(job_state_change("job-1", "COMPLETED"), None)
+
+    output = transcription_callback.sfn.outputs_by_token["token-1"]
+    assert output["TranscriptionJob"]["TranscriptionJobStatus"] == "COMPLETED"
+    listed = transcription_callback.s3.list_objects_v2(Bucket=BUCKET, Prefix="transcription-callbacks/")
+    assert listed["KeyCount"] == 0
+
+
+def test_job_ended_before_the_token_was_stored(transcription_callback):
+    transcription_callback.transcribe.statuses["job-1"] = "FAILED"
+    # The event arrives first and finds no execution waiting
+    transcription_callback.lambda_handler(job_state_change("job-1", "FAILED"), None)
+    assert transcription_callback.sfn.outputs_by_token == {}
+
+    transcription_callback.lambda_handler({"TaskToken": "token-1", "TranscriptionJobName": "job-1"}, None)
+
+    assert transcription_callback.sfn.outputs_by_token["token-1"]["TranscriptionJob"]["TranscriptionJobStatus"] == "FAILED"
+
+
+def test_execution_resumed_twice_is_ignored(transcription_callback):
+    transcription_callback.transcribe.statuses["job-1"] = "COMPLETED"
+    transcription_callback.lambda_handler({"TaskToken": "token-1", "TranscriptionJobName": "job-1"}, None)
+    transcription_callback.s3.put_object(Bucket=BUCKET, Key="transcription-callbacks/job-1", Body="token-1")
+
+    transcription_callback.lambda_handler(job_state_change("job-1", "COMPLETED"), None)
+
+    assert list(transcription_callback.sfn.outputs_by_token) == ["token-1"]
+
+
+def test_job_with_no_waiting_execution_is_ignored(transcription_callback):
+    # Jobs started outside of the state machine have no stored token
+    transcription_callback.lambda_handler(job_state_change("other-job", "COMPLETED"), None)
+
+    assert transcription_callback.sfn.outputs_by_token == {}
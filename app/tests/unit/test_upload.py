@@ -0,0 +1,171 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import io
+import os
+
+import boto3
+import pytest
+from boto3.s3.transfer import TransferConfig
+from moto import mock_aws
+
+from webapp.utils.upload import MB, UploadEngine, UploadError
+
+BUCKET = "psmb-bucket"
+
+
+class CountingReader(io.BytesIO):
+    """
+    File object counting the bytes read from it.
+    """
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class FlakyS3Client:
+    """
+    Wraps an S3 client and fails chosen upload_part calls, to simulate lost parts.
+    """
+
+    def __init__(self, client, failures_by_part):
+        self.client = client
+        self.failures_by_part = dict(failures_by_part)
+        self.uploaded_part_numbers = []
+
+    def upload_part(self, **kwargs):
+        part_number = kwargs["PartNumber"]
+        if self.failures_by_part.get(part_number, 0) > 0:
+            self.failures_by_part[part_number] -= 1
+            raise ConnectionError(f"Connection lost while sending part {part_number}")
+        self.uploaded_part_numbers.append(part_number)
+        return self.client.upload_part(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def transfer_config():
+    return TransferConfig(multipart_threshold=8 * MB, multipart_chunksize=5 * MB, max_concurrency=4)
+
+
+def read_object(client, key):
+    return client.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+
+
+def test_small_files_are_uploaded_in_one_request(s3_client):
+    data = os.urandom(1 * MB)
+    progress = []
+    engine = UploadEngine(s3_client, transfer_config())
+
+    engine.upload(io.BytesIO(data), BUCKET, "raw-audio-files/u/1/small.mp3", len(data),
+                  metadata={"user-id": "u"}, progress_callback=progress.append)
+
+    assert read_object(s3_client, "raw-audio-files/u/1/small.mp3") == data
+    assert progress == [len(data)]
+
+
+def test_multipart_upload_reports_progress_and_verifies_checksum(s3_client):
+    data = os.urandom(17 * MB)
+    progress = []
+    engine = UploadEngine(s3_client, transfer_config())
+
+    checksum = engine.upload(io.BytesIO(data), BUCKET, "raw-audio-files/u/1/talk.mp4", len(data),
+                             progress_callback=progress.append)
+
+    assert read_object(s3_client, "raw-audio-files/u/1/talk.mp4") == data
+    assert checksum.endswith("-4")
+    assert progress == sorted(progress)
+    assert progress[-1] == len(data)
+
+
+@pytest.mark.parametrize("size", [1 * MB, 17 * MB])
+def test_checksum_is_computed_from_a_single_read_before_the_object_is_stored(s3_client, size):
+    data = os.urandom(size)
+    fileobj = CountingReader(data)
+    checksums = []
+
+    def before_complete(checksum):
+        checksums.append(checksum)
+        return True
+
+    checksum = UploadEngine(s3_client, transfer_config()).upload(
+        fileobj, BUCKET, "raw-audio-files/u/1/talk.mp4", len(data), before_complete=before_complete
+    )
+
+    assert checksums == [checksum]
+    assert fileobj.bytes_read == len(data)
+    assert read_object(s3_client, "raw-audio-files/u/1/talk.mp4") == data
+
+
+@pytest.mark.parametrize("size", [1 * MB, 17 * MB])
+def test_upload_is_abandoned_when_before_complete_returns_false(s3_client, size):
+    data = os.urandom(size)
+
+    checksum = UploadEngine(s3_client, transfer_config()).upload(
+        io.BytesIO(data), BUCKET, "raw-audio-files/u/1/talk.mp4", len(data), before_complete=lambda checksum: False
+    )
+
+    assert checksum is None
+    assert s3_client.list_objects_v2(Bucket=BUCKET).get("KeyCount") == 0
+    assert not s3_client.list_multipart_uploads(Bucket=BUCKET).get("Uploads")
+
+
+def test_failed_parts_are_retried_individually(s3_client):
+    data = os.urandom(12 * MB)
+    client = FlakyS3Client(s3_client, {2: 2})
+    engine = UploadEngine(client, transfer_config(), max_part_attempts=3, retry_delay=0)
+
+    engine.upload(io.BytesIO(data), BUCKET, "raw-audio-files/u/1/talk.mp4", len(data))
+
+    assert read_object(s3_client, "raw-audio-files/u/1/talk.mp4") == data
+    assert sorted(client.uploaded_part_numbers) == [1, 2, 3]
+
+
+def test_interrupted_upload_resumes_with_missing_parts_only(s3_client):
+    data = os.urandom(12 * MB)
+    client = FlakyS3Client(s3_client, {3: 5})
+    engine = UploadEngine(client, transfer_config(), max_part_attempts=2, retry_delay=0)
+
+    with pytest.raises(UploadError) as interrupted:
+        engine.upload(io.BytesIO(data), BUCKET, "raw-audio-files/u/1/talk.mp4", len(data))
+    state = interrupted.value.state
+    assert sorted(client.uploaded_part_numbers) == [1, 2]
+
+    resumed_client = FlakyS3Client(s3_client, {})
+    UploadEngine(resumed_client, transfer_config()).upload(
+        io.BytesIO(data), BUCKET, state["key"], len(data), resume_state=state
+    )
+
+    assert resumed_client.uploaded_part_numbers == [3]
+    assert read_object(s3_client, "raw-audio-files/u/1/talk.mp4") == data
+
+
+def test_resuming_an_aborted_upload_starts_over(s3_client):
+    data = os.urandom(12 * MB)
+    engine = UploadEngine(FlakyS3Client(s3_client, {1: 1}), transfer_config(), max_part_attempts=1, retry_delay=0)
+    with pytest.raises(UploadError) as interrupted:
+        engine.upload(io.BytesIO(data), BUCKET, "raw-audio-files/u/1/talk.mp4", len(data))
+    engine.abort(interrupted.value.state)
+
+    UploadEngine(s3_client, transfer_config()).upload(
+        io.BytesIO(data), BUCKET, "raw-audio-files/u/1/talk.mp4", len(data), resume_state=interrupted.value.state
+    )
+
+    assert read_object(s3_client, "raw-audio-files/u/1/talk.mp4") == data
@@ -0,0 +1,43 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+
+from botocore.exceptions import ClientError
+
+# Object where the admission dispatcher records the position of each waiting upload
+QUEUE_POSITIONS_KEY = "admission-queue/positions.json"
+
+
+class AdmissionQueue:
+    """
+    Positions of the uploads waiting for their execution to be started.
+
+    With admission control on, uploads wait in an SQS queue until the
+    dispatcher has a free slot for them. Each dispatch rewrites
+    admission-queue/positions.json, so the webapp reads the position of an
+    upload with a single GetObject.
+    """
+
+    def __init__(self, s3_client, bucket_name):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+
+    def read_positions(self):
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=QUEUE_POSITIONS_KEY)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return json.loads(response["Body"].read())
+
+    def get_position(self, object_key):
+        """
+        Returns the position of an upload in the queue and the number of
+        uploads waiting, or None when the upload is not known to be waiting.
+        """
+        positions = self.read_positions()
+        if not positions or object_key not in positions["positions"]:
+            return None
+        return {"position": positions["positions"][object_key], "waiting": positions["waiting"]}
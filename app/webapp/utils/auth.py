@@ -1,10 +1,10 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-import boto3
-import json
 from streamlit_cognito_auth import CognitoAuthenticator
 
+from .aws_registry import get_registry
+
 
 class Auth:
 
@@ -14,12 +14,9 @@ class Auth:
         Get Cognito parameters from Secrets Manager and
         returns a CognitoAuthenticator object.
         """
-        # Get Cognito parameters from Secrets Manager
-        secretsmanager_client = boto3.client("secretsmanager")
-        response = secretsmanager_client.get_secret_value(
-            SecretId=secret_id,
-        )
-        secret_string = json.loads(response['SecretString'])
+        # Get Cognito parameters from Secrets Manager, cached for the whole process
+        registry = get_registry()
+        secret_string = registry.get_secret(secret_id)
         pool_id = secret_string['pool_id']
         app_client_id = secret_string['app_client_id']
         app_client_secret = secret_string['app_client_secret']
@@ -29,6 +26,7 @@ class Auth:
             pool_id=pool_id,
             app_client_id=app_client_id,
             app_client_secret=app_client_secret,
+            boto_client=registry.client("cognito-idp", region_name=pool_id.split("_")[0]),
         )
 
         return authenticator
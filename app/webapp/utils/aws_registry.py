@@ -0,0 +1,115 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import threading
+import time
+
+from .config_file import Config
+
+
+class TTLCache:
+    """
+    Thread-safe cache whose entries are reloaded lazily, on the first access
+    after they are older than the time to live.
+    """
+
+    def __init__(self, ttl_seconds, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self.clock() - entry[1] < self.ttl_seconds:
+                return entry[0]
+        # Load outside the lock so a slow call does not block unrelated keys
+        value = loader()
+        with self._lock:
+            self._entries[key] = (value, self.clock())
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class AwsRegistry:
+    """
+    Process-wide registry of boto3 clients and of the values the webapp reads
+    from AWS: account ID, SSM parameters and Secrets Manager secrets.
+
+    Clients are created once per service and region. Values are cached for
+    ttl_seconds and refreshed on the first access after they expire, so a
+    Streamlit rerun does not make any network call to resolve them.
+    """
+
+    def __init__(self, session=None, ttl_seconds=Config.AWS_CACHE_TTL_SECONDS, clock=time.monotonic):
+        self._session = session
+        self._clients = {}
+        self._lock = threading.Lock()
+        self.values = TTLCache(ttl_seconds, clock)
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                # boto3 is only imported once AWS is actually needed, to keep imports fast
+                import boto3
+                self._session = boto3.Session()
+            return self._session
+
+    @property
+    def region_name(self):
+        return self.session.region_name
+
+    def client(self, service_name, region_name=None):
+        session = self.session
+        key = (service_name, region_name)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = session.client(service_name, region_name=region_name)
+            return self._clients[key]
+
+    def get_account_id(self):
+        return self.values.get(
+            ("sts", "account_id"),
+            lambda: self.client("sts").get_caller_identity()["Account"],
+        )
+
+    def get_parameter(self, name):
+        return self.values.get(
+            ("ssm", name),
+            lambda: self.client("ssm").get_parameter(Name=name)["Parameter"]["Value"],
+        )
+
+    def get_secret(self, secret_id):
+        """
+        Returns the secret string of a Secrets Manager secret parsed as JSON.
+        """
+        return self.values.get(
+            ("secretsmanager", secret_id),
+            lambda: json.loads(
+                self.client("secretsmanager").get_secret_value(SecretId=secret_id)["SecretString"]
+            ),
+        )
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Returns the registry shared by every session of the process.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = AwsRegistry()
+        return _registry
@@ -0,0 +1,108 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import time
+
+from botocore.exceptions import ClientError
+
+from speech_analysis import bedrock_prompts, speech_metrics
+
+from .config_file import Config
+
+# Prefix where Transcribe writes the transcription of each uploaded object
+TRANSCRIPT_PREFIX = "transcribed-text-files/"
+
+
+def get_speech_metrics(transcription):
+    metrics = speech_metrics.compute_speech_metrics(transcription)
+    return speech_metrics.format_speech_metrics(metrics) if metrics else None
+
+
+def get_transcript_key(object_key):
+    return f"{TRANSCRIPT_PREFIX}{object_key}-temp.json"
+
+
+def read_transcription(s3_client, bucket_name, object_key):
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=get_transcript_key(object_key))
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+    return json.loads(response["Body"].read())
+
+
+def wait_for_transcription(s3_client, bucket_name, object_key, timeout=600, poll_interval=1, max_poll_interval=5):
+    """
+    Returns the Transcribe output of an uploaded object as soon as Transcribe
+    has written it, or None if it is not available after timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        transcription = read_transcription(s3_client, bucket_name, object_key)
+        if transcription is not None:
+            return transcription
+        if time.monotonic() + poll_interval > deadline:
+            return None
+        time.sleep(poll_interval) # nosemgrep
+        poll_interval = min(poll_interval * 2, max_poll_interval)
+
+
+def stream_text(client, model_id, payload):
+    """
+    Calls Bedrock with InvokeModelWithResponseStream and yields the text of
+    the response as it is generated.
+    """
+    response = client.invoke_model_with_response_stream(
+        modelId=model_id,
+        body=json.dumps(payload),
+        contentType="application/json",
+        accept="application/json",
+    )
+    for event in response["body"]:
+        if "chunk" not in event:
+            continue
+        message = json.loads(event["chunk"]["bytes"])
+        if message["type"] == "content_block_delta" and message["delta"]["type"] == "text_delta":
+            yield message["delta"]["text"]
+
+
+class FeedbackStream:
+    """
+    Streams the speech feedback on a transcript, then the speech rewrite
+    based on it, as the state machine asks for them one after the other.
+    """
+
+    def __init__(self, client, transcript, speech_metrics=None, model_id=Config.BEDROCK_MODEL_ID,
+                 prompt_caching=Config.BEDROCK_PROMPT_CACHING):
+        self.client = client
+        self.model_id = model_id
+        # The payload builders of the Lambda function, so the streamed feedback is
+        # asked for with exactly the same prompts as the state machine
+        self.prompts = bedrock_prompts
+        self.prompt_caching = prompt_caching
+        self.transcript = self.prompts.normalize_transcript(transcript)
+        self.speech_metrics = speech_metrics
+        self.speech_feedback = None
+
+    @classmethod
+    def from_transcription(cls, client, transcription, model_id=Config.BEDROCK_MODEL_ID):
+        transcript = transcription["results"]["transcripts"][0]["transcript"]
+        return cls(client, transcript, get_speech_metrics(transcription), model_id)
+
+    def feedback(self):
+        payload = self.prompts.create_bedrock_payload_speech_feedback(self.transcript, self.speech_metrics,
+                                                               self.prompt_caching)
+        parts = []
+        for text in stream_text(self.client, self.model_id, payload):
+            parts.append(text)
+            yield text
+        self.speech_feedback = "".join(parts)
+
+    def rewrite(self):
+        if self.speech_feedback is None:
+            raise RuntimeError("The speech feedback must be streamed before the rewrite")
+        payload = self.prompts.create_bedrock_payload_speech_rewrite(self.transcript, self.speech_feedback,
+                                                              self.prompt_caching)
+        yield from stream_text(self.client, self.model_id, payload)
@@ -10,4 +10,180 @@ class Config:
     # When you delete a secret, you cannot create another one immediately
     # with the same name. Change this value if you destroy your stack and need
     # to recreate it with the same STACK_NAME.
-    SECRETS_MANAGER_ID = f"{STACK_NAME}ParamCognitoSecret12346"
\ No newline at end of file
+    SECRETS_MANAGER_ID = f"{STACK_NAME}ParamCognitoSecret12346"
+
+    # Bedrock model used to analyse the speeches
+    BEDROCK_MODEL_ID = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+
+    # Prompts on a whole transcript are routed to a model and max_tokens by the
+    # number of words of the transcript and the analysis depth chosen at
+    # upload: quick, standard or detailed. The first route whose max_words and
+    # depths match is taken, and speeches matching none go to BEDROCK_MODEL_ID.
+    # The routes are deployed as the /psmb/bedrock_model_routes SSM parameter,
+    # whose thresholds and max_tokens can then be tuned without a deployment;
+    # only the models listed here get a branch in the state machine. No
+    # routing when empty. For example:
+    # [{"name": "short", "max_words": 600, "depths": ["quick", "standard"],
+    #   "model_id": "anthropic.claude-3-haiku-20240307-v1:0", "max_tokens": 2000}]
+    BEDROCK_MODEL_ROUTES = []
+
+    # Throttled Bedrock, Transcribe and Lambda calls of the state machine are
+    # retried up to THROTTLING_RETRY_MAX_ATTEMPTS times with jittered
+    # exponential backoff from RETRY_INTERVAL_SECONDS to RETRY_MAX_DELAY_SECONDS,
+    # instead of failing the whole execution.
+    THROTTLING_RETRY_MAX_ATTEMPTS = 6
+    RETRY_INTERVAL_SECONDS = 2
+    RETRY_MAX_DELAY_SECONDS = 60
+
+    # Model the Bedrock steps switch to when BEDROCK_MODEL_ID is still throttled
+    # after the retries, such as "anthropic.claude-3-haiku-20240307-v1:0".
+    # It is given the same prompts, so with BEDROCK_PROMPT_CACHING it must
+    # support prompt caching too. No fallback when empty.
+    BEDROCK_FALLBACK_MODEL_ID = None
+
+    # Mark the system prompt and transcript, which start every prompt on a
+    # transcript, as a Bedrock prompt cache point, so the rewrite and the
+    # other analyses of a speech do not process them again. Only enable it
+    # for a BEDROCK_MODEL_ID that supports prompt caching.
+    BEDROCK_PROMPT_CACHING = False
+
+    # Number of seconds the webapp caches the account ID, SSM parameters and
+    # secrets before reading them again from AWS.
+    AWS_CACHE_TTL_SECONDS = 300
+
+    # Uploads larger than the threshold are sent to S3 as multipart uploads of
+    # parts of UPLOAD_PART_SIZE_MB, with up to UPLOAD_MAX_CONCURRENCY parts in flight.
+    UPLOAD_MULTIPART_THRESHOLD_MB = 16
+    UPLOAD_PART_SIZE_MB = 8
+    UPLOAD_MAX_CONCURRENCY = 8
+
+    # "server" uploads recordings through the webapp, "direct" lets the browser
+    # upload them straight to S3 with a presigned POST that expires after
+    # PRESIGNED_UPLOAD_EXPIRES_SECONDS. Direct uploads need the bucket CORS rule
+    # created for WEBAPP_ORIGINS.
+    UPLOAD_MODE = "server"
+    PRESIGNED_UPLOAD_EXPIRES_SECONDS = 900
+    WEBAPP_ORIGINS = ["http://localhost:8080"]
+
+    # Sessions waiting for an execution check that the shared poller thread is
+    # still running when they get no update for EXECUTION_UPDATE_TIMEOUT_SECONDS.
+    EXECUTION_UPDATE_TIMEOUT_SECONDS = 30
+
+    # Results of analysed recordings are cached by content hash for
+    # RESULT_CACHE_TTL_DAYS, so uploading the same recording again returns the
+    # cached recommendations without a new execution. The cache is looked up
+    # by uploads through the webapp only, not by the "direct" UPLOAD_MODE.
+    # Set to 0 to disable.
+    RESULT_CACHE_TTL_DAYS = 30
+
+    # Bedrock responses are reused for PROMPT_CACHE_TTL_DAYS when the same
+    # normalised transcript is analysed with the same prompt and model
+    # settings, skipping the Bedrock calls. Set to 0 to disable.
+    PROMPT_CACHE_TTL_DAYS = 30
+
+    # How the state machine learns that a transcription job has ended:
+    # "callback" waits for the job state change event sent by Transcribe,
+    # "polling" checks the job after each of TRANSCRIPTION_POLL_DELAYS_SECONDS,
+    # then keeps checking at the last delay.
+    TRANSCRIPTION_COMPLETION = "callback"
+    # With "callback", the job is checked after waiting this long for its
+    # event, and waited for again while it is still running, so a lost
+    # event does not leave the execution waiting until its timeout.
+    TRANSCRIPTION_CALLBACK_TIMEOUT_MINUTES = 15
+    TRANSCRIPTION_POLL_DELAYS_SECONDS = [2, 5, 10, 20, 30]
+
+    # "sequential" asks Bedrock for the speech feedback, then for a rewrite
+    # based on it. "parallel" runs the SPEECH_ANALYSES side by side, the
+    # rewrite being one of them, and combines their results.
+    PIPELINE_MODE = "sequential"
+    SPEECH_ANALYSES = ["delivery", "language", "structure", "rewrite"]
+
+    # Transcripts longer than CHUNK_MAX_WORDS words are split on sentence
+    # boundaries into chunks of at most CHUNK_MAX_WORDS words and
+    # CHUNK_MAX_SECONDS of speech, overlapping by up to CHUNK_OVERLAP_WORDS
+    # words. Up to CHUNK_MAX_CONCURRENCY chunks are analysed at a time and
+    # their feedback is joined into one report, which has no Speech Rewrite
+    # Suggestion section. Chunking is off (0) by default: set CHUNK_MAX_WORDS
+    # close to the words the model can take in one prompt, such as 20000 for
+    # a 200K token context, to analyse longer talks in parts.
+    CHUNK_MAX_WORDS = 0
+    CHUNK_MAX_SECONDS = 1200
+    CHUNK_OVERLAP_WORDS = 150
+    CHUNK_MAX_CONCURRENCY = 4
+
+    # Bedrock prompts of up to PAYLOAD_INLINE_MAX_BYTES are passed to Bedrock
+    # in the Step Functions state instead of through S3, and the sequential
+    # pipeline keeps the transcript and the Bedrock responses in the state
+    # too. Larger prompts, and any that would take the state near its 256 KB
+    # limit, are still written to S3. Set to 0 to always go through S3.
+    PAYLOAD_INLINE_MAX_BYTES = 64 * 1024
+
+    # Uploads wait in an SQS queue and are admitted by a dispatcher while
+    # fewer than MAX_IN_FLIGHT_EXECUTIONS executions are running, taking the
+    # users in turn, so a burst of uploads does not exceed the Transcribe and
+    # Bedrock quotas. The webapp shows the position of a waiting upload.
+    ADMISSION_CONTROL = False
+    MAX_IN_FLIGHT_EXECUTIONS = 10
+    # A dispatch saves the uploads it receives and deletes their messages, so
+    # only a message that could not be saved, such as an event that is not an
+    # upload, is received again. It goes to the admission dead-letter queue
+    # after ADMISSION_MAX_RECEIVE_COUNT receives, which raises an alarm.
+    ADMISSION_MAX_RECEIVE_COUNT = 5
+
+    # Recordings uploaded under BATCH_PREFIX, such as those of a workshop,
+    # are analysed with the SPEECH_ANALYSES by Bedrock batch inference jobs,
+    # at a lower price than on-demand calls but within hours instead of
+    # minutes. Every BATCH_SCHEDULE_MINUTES the queued prompts are submitted
+    # as a job once there are BATCH_MIN_RECORDS of them, the minimum Bedrock
+    # accepts, or sent to Bedrock one at a time once the oldest has waited
+    # BATCH_MAX_WAIT_MINUTES. Recordings without results after
+    # BATCH_TIMEOUT_HOURS fail.
+    BATCH_INFERENCE = False
+    BATCH_PREFIX = "raw-audio-files/batch/"
+    BATCH_MIN_RECORDS = 100
+    BATCH_MAX_WAIT_MINUTES = 60
+    BATCH_SCHEDULE_MINUTES = 15
+    BATCH_JOB_POLL_MINUTES = 10
+    BATCH_TIMEOUT_HOURS = 24
+
+    # Filler words, pace, pauses and repetitions are measured from the word
+    # timings of the transcript with NumPy and given to the model, instead of
+    # having it count them. The Lambda function gets NumPy from this layer,
+    # for instance the AWS SDK for pandas layer for Python 3.12 on Arm64 of
+    # your region. Without it, the model counts them itself.
+    SPEECH_METRICS_LAYER_ARN = None
+
+    # "snapstart" or "provisioned" let the state machine invoke a published
+    # version of the prompts Lambda function with SnapStart, or with
+    # LAMBDA_PROVISIONED_CONCURRENCY execution environments kept initialised,
+    # and move the import of NumPy and the client creation to the init phase.
+    # "none" invokes $LATEST with regular cold starts.
+    LAMBDA_WARM_START = "none"
+    LAMBDA_PROVISIONED_CONCURRENCY = 2
+
+    # Log level of the Lambda functions. Events, transcripts and Bedrock
+    # payloads are only dumped at DEBUG level, or for a LAMBDA_LOG_SAMPLE_RATE
+    # share of the invocations, and every logged value is truncated to
+    # LAMBDA_LOG_MAX_CHARS characters (0 to never truncate).
+    LAMBDA_LOG_LEVEL = "INFO"
+    LAMBDA_LOG_MAX_CHARS = 1000
+    LAMBDA_LOG_SAMPLE_RATE = 0.0
+
+    # Stream the speech feedback from Bedrock to the webapp as soon as the
+    # transcript is available, instead of waiting for the state machine to
+    # finish. The state machine still runs, so this doubles the Bedrock calls
+    # of uploads that are not already in the prompt cache.
+    STREAMING_FEEDBACK = False
+
+    # Live rehearsal streams the microphone to Transcribe streaming in chunks
+    # of LIVE_CHUNK_MILLISECONDS of LIVE_SAMPLE_RATE_HZ audio, shows filler
+    # words and pace while the speaker talks, and streams the Bedrock feedback
+    # as soon as the recording stops. Needs the amazon-transcribe package, and
+    # streamlit-webrtc to stream from the microphone while recording, both in
+    # requirements.txt; without streamlit-webrtc, the recording is streamed
+    # once it is complete.
+    LIVE_REHEARSAL = False
+    LIVE_LANGUAGE_CODE = "en-US"
+    LIVE_SAMPLE_RATE_HZ = 16000
+    LIVE_CHUNK_MILLISECONDS = 100
+    LIVE_PACE_WORDS_PER_MINUTE = [120, 160]
@@ -0,0 +1,222 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Methods for displaying the state machine's execution history
+def get_task_entry(event):
+    # The "Task" is the event where we first see the "Entered" state and which has a name
+    if event["type"] == "WaitStateEntered":
+        return {
+            "task_id": event["id"],
+            "task_name": "Wait a few seconds to complete previous task",
+        }
+    elif (
+        "stateEnteredEventDetails" in event
+        and "name" in event["stateEnteredEventDetails"]
+    ):
+        return {
+            "task_id": event["id"],
+            "task_name": event["stateEnteredEventDetails"]["name"],
+        }
+    return None
+
+
+def find_task_id(event, events_by_id, task_by_event_id=None):
+    # Memo of event ID -> owning task, shared across calls so every event is resolved once
+    if task_by_event_id is None:
+        task_by_event_id = {}
+
+    # Go back through the event history until we find the original TaskStateEntered/WaitStateEntered
+    # event for this task, or an event whose task has already been resolved
+    unresolved_event_ids = []
+    while True:
+        task = task_by_event_id.get(event["id"]) or get_task_entry(event)
+        if task is not None:
+            break
+        unresolved_event_ids.append(event["id"])
+        previous_event_id = event["previousEventId"]
+        if previous_event_id not in events_by_id:
+            raise Exception(
+                f"Could not find previous event {previous_event_id} for event {event['id']}"
+            )
+        event = events_by_id[previous_event_id]
+
+    task_by_event_id[event["id"]] = task
+    for event_id in unresolved_event_ids:
+        task_by_event_id[event_id] = task
+    return task
+
+
+known_event_types = [
+    "TaskStateEntered",
+    "TaskScheduled",
+    "TaskStarted",
+    "TaskStartFailed",
+    "TaskFailed",
+    "TaskTimedOut",
+    "TaskSucceeded",
+    "WaitStateEntered",
+    "WaitStateExited",
+]
+
+# History events after which the execution status is no longer RUNNING
+execution_terminal_event_types = [
+    "ExecutionSucceeded",
+    "ExecutionFailed",
+    "ExecutionTimedOut",
+    "ExecutionAborted",
+]
+
+def get_task_status(event_type):
+    if (
+        event_type == "TaskStateEntered"
+        or event_type == "TaskScheduled"
+        or event_type == "TaskStarted"
+        or event_type == "WaitStateEntered"
+    ):
+        return ":arrows_counterclockwise:"
+    elif (
+        event_type == "TaskStartFailed"
+        or event_type == "TaskFailed"
+        or event_type == "TaskTimedOut"
+    ):
+        return ":no_entry:"
+    elif event_type == "TaskSucceeded" or event_type == "WaitStateExited":
+        return ":white_check_mark:"
+    raise Exception(f"Unknown event type {event_type}")
+
+
+def get_workflow_status_icon(status):
+    if status == "RUNNING":
+        return ":arrows_counterclockwise:"
+    elif status == "FAILED" or status == "TIMED_OUT" or status == "ABORTED":
+        return ":no_entry:"
+    elif status == "SUCCEEDED":
+        return ":white_check_mark:"
+    raise Exception(f"Unknown event type {status}")
+
+
+def update_task_status(task_status, execution_events, events_by_id, task_by_event_id=None):
+    if task_by_event_id is None:
+        task_by_event_id = {}
+
+    # Determine the state of each unique task and its unique task name
+    for event in execution_events:
+        if event["type"] not in known_event_types:
+            continue
+        task = find_task_id(event, events_by_id, task_by_event_id)
+        status = get_task_status(event["type"])
+        task_status[task["task_id"]] = {
+            "task_id": task["task_id"],
+            "task_name": task["task_name"],
+            "task_status": status,
+        }
+    return task_status
+
+
+def render_workflow_status_markdown(execution, task_status):
+    markdown = f"##### Status: {get_workflow_status_icon(execution['status'])} {execution['status'].title()}"
+    markdown += f"\n\n##### Tasks"
+
+    # Display the task status
+    task_ids = list(task_status.keys())
+    task_ids.sort()
+    for task_id in task_ids:
+        task = task_status[task_id]
+        markdown += f"\n\n{task['task_status']} {task['task_name'].replace(' (Invoke Model)', '')}"
+
+    return markdown
+
+
+def get_workflow_status_markdown(execution, execution_events):
+    # Keep a dictionary of events: event ID -> event details
+    events_by_id = {}
+    for event in execution_events:
+        events_by_id[event["id"]] = event
+
+    # Keep a dictionary of tasks: task ID -> state (running, failed, succeeded) and name
+    task_status = update_task_status({}, execution_events, events_by_id)
+
+    return render_workflow_status_markdown(execution, task_status)
+
+
+class ExecutionTracker:
+    """
+    Follows a single Step Functions execution across polls.
+
+    The tracker remembers the ID of the last history event it has seen and
+    reads the history in reverse order until it reaches that event again, so
+    each update only costs the events added since the previous one instead of
+    re-paginating the whole execution history.
+    """
+
+    def __init__(self, execution_arn, client):
+        self.execution_arn = execution_arn
+        self.client = client
+        self.execution = None
+        self.last_event_id = 0
+        self.events_by_id = {}
+        self.task_by_event_id = {}
+        self.task_status = {}
+
+    def fetch_new_events(self):
+        """
+        Returns the history events newer than the last seen event, oldest first.
+        """
+        new_events = []
+        request = {
+            "executionArn": self.execution_arn,
+            "reverseOrder": True,
+            "includeExecutionData": False,
+        }
+        while True:
+            page = self.client.get_execution_history(**request)
+            reached_last_seen = False
+            for event in page["events"]:
+                if event["id"] <= self.last_event_id:
+                    reached_last_seen = True
+                    break
+                new_events.append(event)
+            if reached_last_seen or not page.get("nextToken"):
+                break
+            request["nextToken"] = page["nextToken"]
+
+        new_events.reverse()
+        return new_events
+
+    def add_events(self, execution_events):
+        for event in execution_events:
+            self.events_by_id[event["id"]] = event
+        update_task_status(self.task_status, execution_events, self.events_by_id, self.task_by_event_id)
+        if execution_events:
+            self.last_event_id = max(self.last_event_id, execution_events[-1]["id"])
+
+    def update(self, include_history=True):
+        """
+        Refreshes the execution description and, optionally, the task status
+        from the new history events. Returns the execution description.
+        """
+        self.execution = self.client.describe_execution(executionArn=self.execution_arn)
+        if include_history:
+            self.add_events(self.fetch_new_events())
+        return self.execution
+
+    def refresh(self):
+        """
+        Fetches the new history events and only describes the execution on the
+        first refresh or once the history shows that the execution has ended,
+        so a running execution costs a single history call per refresh.
+        Returns the new events.
+        """
+        new_events = self.fetch_new_events()
+        self.add_events(new_events)
+        if self.execution is None or any(
+            event["type"] in execution_terminal_event_types for event in new_events
+        ):
+            self.execution = self.client.describe_execution(executionArn=self.execution_arn)
+        return new_events
+
+    def get_status_markdown(self):
+        return render_workflow_status_markdown(self.execution, self.task_status)
+
+    def is_completed(self):
+        return bool(self.execution and self.execution["status"] and self.execution["status"] != "RUNNING")
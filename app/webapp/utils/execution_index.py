@@ -0,0 +1,80 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+from .config_file import Config
+
+# Prefix watched by the EventBridge rule that starts the state machine
+RAW_AUDIO_PREFIX = "raw-audio-files/"
+# Prefix where the state machine records the execution ARN of each uploaded object
+EXECUTION_INDEX_PREFIX = "execution-index/"
+
+
+def get_upload_key(user_id, file_name, batch=False):
+    # Every upload gets its own key so an execution can be traced back to the session that started it
+    prefix = Config.BATCH_PREFIX if batch else RAW_AUDIO_PREFIX
+    return f"{prefix}{user_id}/{str(uuid.uuid4())[-12:]}/{file_name}"
+
+
+def get_execution_index_key(object_key):
+    return f"{EXECUTION_INDEX_PREFIX}{object_key}"
+
+
+class ExecutionIndex:
+    """
+    Maps uploaded objects to the Step Functions execution started for them.
+
+    The first state of the state machine writes the execution ARN to
+    execution-index/<object key>, so finding the execution of an upload is a
+    single GetObject instead of a scan of the running executions. The last
+    max_cached resolved ARNs are kept in memory and shared by every session
+    of the process.
+    """
+
+    def __init__(self, s3_client, bucket_name, max_cached=10000):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.max_cached = max_cached
+        self._execution_arns_by_key = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read_execution_arn(self, object_key):
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket_name, Key=get_execution_index_key(object_key)
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        return response["Body"].read().decode("utf-8").strip()
+
+    def get_execution_arn(self, object_key, timeout=60, poll_interval=0.5, max_poll_interval=4):
+        """
+        Returns the execution ARN of an uploaded object, waiting up to timeout
+        seconds for the state machine to record it. Returns None on timeout.
+        """
+        with self._lock:
+            if object_key in self._execution_arns_by_key:
+                self._execution_arns_by_key.move_to_end(object_key)
+                return self._execution_arns_by_key[object_key]
+
+        deadline = time.monotonic() + timeout
+        while True:
+            execution_arn = self.read_execution_arn(object_key)
+            if execution_arn:
+                with self._lock:
+                    self._execution_arns_by_key[object_key] = execution_arn
+                    while len(self._execution_arns_by_key) > self.max_cached:
+                        self._execution_arns_by_key.popitem(last=False)
+                return execution_arn
+            if time.monotonic() + poll_interval > deadline:
+                return None
+            time.sleep(poll_interval) # nosemgrep
+            poll_interval = min(poll_interval * 2, max_poll_interval)
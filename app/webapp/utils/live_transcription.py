@@ -0,0 +1,221 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""
+Live rehearsal: audio is streamed in chunks to a transcriber while the
+speaker talks, and the partial transcripts are analysed as they arrive.
+
+Transcribers take an iterator of 16-bit mono PCM chunks and yield results
+shaped like those of Amazon Transcribe streaming: each result belongs to a
+segment of speech, is sent as partial results while the segment is being
+transcribed, then once as a final result.
+"""
+import asyncio
+import io
+import queue
+import re
+import threading
+import wave
+from collections import Counter
+
+try:
+    from amazon_transcribe.client import TranscribeStreamingClient
+    from amazon_transcribe.model import TranscriptEvent
+except ImportError:
+    TranscribeStreamingClient = None
+
+from speech_analysis.speech_metrics import filler_words
+
+from .config_file import Config
+
+WORD = re.compile(r"[a-z']+")
+
+_END_OF_STREAM = object()
+
+
+def result_from_transcribe(result):
+    # Converts a result of the amazon-transcribe package, punctuation being appended to the previous word
+    items = []
+    for item in result.alternatives[0].items or []:
+        if item.item_type == "punctuation":
+            if items:
+                items[-1]["content"] += item.content
+            continue
+        items.append({"content": item.content, "start_time": item.start_time, "end_time": item.end_time})
+    return {
+        "result_id": result.result_id,
+        "is_partial": result.is_partial,
+        "start_time": result.start_time,
+        "end_time": result.end_time,
+        "transcript": result.alternatives[0].transcript,
+        "items": items,
+    }
+
+
+class TranscribeStreamingTranscriber:
+    """
+    Transcribes the audio chunks with Amazon Transcribe streaming, through
+    the asynchronous amazon-transcribe package run in a background thread.
+    """
+
+    def __init__(self, region, language_code=Config.LIVE_LANGUAGE_CODE, sample_rate=Config.LIVE_SAMPLE_RATE_HZ):
+        if TranscribeStreamingClient is None:
+            raise RuntimeError("Live transcription needs the amazon-transcribe package")
+        self.region = region
+        self.language_code = language_code
+        self.sample_rate = sample_rate
+
+    def transcribe(self, audio_chunks):
+        results = queue.Queue()
+        threading.Thread(target=asyncio.run, args=(self._stream(audio_chunks, results),), daemon=True).start()
+        while True:
+            result = results.get()
+            if result is _END_OF_STREAM:
+                return
+            if isinstance(result, Exception):
+                raise result
+            yield result
+
+    async def _stream(self, audio_chunks, results):
+        try:
+            client = TranscribeStreamingClient(region=self.region)
+            stream = await client.start_stream_transcription(
+                language_code=self.language_code,
+                media_sample_rate_hz=self.sample_rate,
+                media_encoding="pcm",
+            )
+
+            async def send_audio():
+                # Reading the next chunk may block until the microphone delivers it
+                loop = asyncio.get_running_loop()
+                chunks = iter(audio_chunks)
+                while (chunk := await loop.run_in_executor(None, next, chunks, None)) is not None:
+                    await stream.input_stream.send_audio_event(audio_chunk=chunk)
+                await stream.input_stream.end_stream()
+
+            async def receive_results():
+                async for event in stream.output_stream:
+                    if isinstance(event, TranscriptEvent):
+                        for result in event.transcript.results:
+                            results.put(result_from_transcribe(result))
+
+            await asyncio.gather(send_audio(), receive_results())
+        except Exception as e:
+            results.put(e)
+        finally:
+            results.put(_END_OF_STREAM)
+
+
+def pcm_chunks_from_wav(data, chunk_milliseconds=Config.LIVE_CHUNK_MILLISECONDS):
+    """
+    Returns the sample rate of a 16-bit mono WAV recording and an iterator of
+    its PCM audio in chunks of chunk_milliseconds.
+    """
+    recording = wave.open(io.BytesIO(data), "rb")
+    if recording.getsampwidth() != 2 or recording.getnchannels() != 1:
+        raise ValueError("Only 16-bit mono recordings can be transcribed live")
+    sample_rate = recording.getframerate()
+    frames_per_chunk = max(sample_rate * chunk_milliseconds // 1000, 1)
+
+    def chunks():
+        with recording:
+            while chunk := recording.readframes(frames_per_chunk):
+                yield chunk
+
+    return sample_rate, chunks()
+
+
+def pcm_chunks_from_receiver(audio_receiver, resampler, timeout=1):
+    """
+    Yields the microphone audio of a streamlit-webrtc audio receiver,
+    resampled to 16-bit mono PCM, until no frame arrives within timeout
+    seconds because the recording has stopped.
+    """
+    while True:
+        try:
+            frames = audio_receiver.get_frames(timeout=timeout)
+        except queue.Empty:
+            return
+        for frame in frames:
+            for resampled in resampler.resample(frame):
+                yield resampled.to_ndarray().tobytes()
+
+
+class RehearsalAnalyzer:
+    """
+    Incremental analysis of a live transcript: words, filler words and pace.
+
+    Results of a segment replace its previous result, so partial results are
+    not counted twice. Only the counts of the updated segment are recomputed,
+    which keeps each update proportional to the length of one segment.
+    """
+
+    def __init__(self, filler_words=filler_words, pace_window_seconds=30):
+        self.filler_words = [tuple(filler.split()) for filler in filler_words]
+        self.pace_window_seconds = pace_window_seconds
+        self.segments = {}
+        self.word_count = 0
+        self.fillers = Counter()
+        self.duration_seconds = 0.0
+
+    def count_fillers(self, words):
+        fillers = Counter()
+        for position in range(len(words)):
+            for filler in self.filler_words:
+                if tuple(words[position:position + len(filler)]) == filler:
+                    fillers[" ".join(filler)] += 1
+        return fillers
+
+    def update(self, result):
+        previous = self.segments.get(result["result_id"])
+        if previous:
+            self.word_count -= len(previous["words"])
+            self.fillers -= previous["fillers"]
+        words = WORD.findall(result["transcript"].lower())
+        segment = {
+            "transcript": result["transcript"],
+            "words": words,
+            "fillers": self.count_fillers(words),
+            "end_times": [item["end_time"] for item in result["items"]],
+            "end_time": result["end_time"],
+        }
+        self.segments[result["result_id"]] = segment
+        self.word_count += len(words)
+        self.fillers += segment["fillers"]
+        self.duration_seconds = max(self.duration_seconds, result["end_time"])
+
+    @property
+    def transcript(self):
+        return " ".join(segment["transcript"] for segment in self.segments.values() if segment["transcript"])
+
+    def recent_words_per_minute(self):
+        # Words ended in the last pace_window_seconds, the latest segments being last
+        window_start = self.duration_seconds - self.pace_window_seconds
+        recent_words = 0
+        for segment in reversed(list(self.segments.values())):
+            recent_words += sum(end_time > window_start for end_time in segment["end_times"])
+            if segment["end_time"] <= window_start:
+                break
+        window_seconds = min(self.pace_window_seconds, self.duration_seconds)
+        return recent_words / window_seconds * 60 if window_seconds else 0.0
+
+    def stats(self):
+        filler_count = sum(self.fillers.values())
+        return {
+            "words": self.word_count,
+            "duration_seconds": self.duration_seconds,
+            "words_per_minute": self.word_count / self.duration_seconds * 60 if self.duration_seconds else 0.0,
+            "recent_words_per_minute": self.recent_words_per_minute(),
+            "filler_words": filler_count,
+            "filler_words_per_100_words": filler_count / self.word_count * 100 if self.word_count else 0.0,
+            "fillers": dict(self.fillers.most_common()),
+        }
+
+
+def describe_pace(words_per_minute, target=Config.LIVE_PACE_WORDS_PER_MINUTE):
+    slowest, fastest = target
+    if words_per_minute < slowest:
+        return f"Speed up: aim for at least {slowest} words per minute"
+    if words_per_minute > fastest:
+        return f"Slow down: aim for at most {fastest} words per minute"
+    return "Good pace"
@@ -0,0 +1,235 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import logging
+import queue
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+from .execution_history import ExecutionTracker
+
+logger = logging.getLogger(__name__)
+
+# Error codes returned by Step Functions when the account is being throttled
+throttling_error_codes = [
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+]
+
+
+class Subscription:
+    """
+    Receives the status updates of one execution watched by an ExecutionPoller.
+
+    Each update is a dictionary with the execution description ("execution"),
+    the status markdown ("markdown") and whether the execution has ended
+    ("completed"). When the execution could not be polled, the last update is
+    completed and also has the error message ("error").
+    """
+
+    def __init__(self, poller, execution_arn):
+        self.poller = poller
+        self.execution_arn = execution_arn
+        self.updates = queue.Queue()
+
+    def get(self, timeout=None):
+        """
+        Blocks until the next update is available and returns the most recent one,
+        skipping intermediate updates the subscriber was too slow to consume.
+        """
+        update = self.updates.get(timeout=timeout)
+        while not update["completed"]:
+            try:
+                update = self.updates.get_nowait()
+            except queue.Empty:
+                break
+        return update
+
+    def close(self):
+        self.poller.unsubscribe(self)
+
+
+class _Watch:
+    def __init__(self, tracker, interval):
+        self.tracker = tracker
+        self.subscriptions = []
+        self.interval = interval
+        self.next_poll_at = 0
+        self.last_update = None
+        self.failures = 0
+
+
+class ExecutionPoller:
+    """
+    Polls every watched Step Functions execution from a single background thread.
+
+    Sessions subscribe to an execution ARN instead of polling it themselves.
+    Subscriptions to the same ARN share one ExecutionTracker, so the API calls
+    per tick depend on the number of distinct executions rather than on the
+    number of sessions. Executions without new events are polled less and less
+    often, and every watch backs off when Step Functions throttles the process.
+    A watch that fails max_failures times in a row for any other reason is
+    published as completed with the error and no longer polled.
+    """
+
+    def __init__(self, client, min_interval=1, max_interval=10, backoff_factor=1.5, max_throttle_delay=30,
+                 max_failures=5):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.max_throttle_delay = max_throttle_delay
+        self.max_failures = max_failures
+        self.throttle_delay = 0
+        self._watches = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def subscribe(self, execution_arn):
+        subscription = Subscription(self, execution_arn)
+        with self._lock:
+            watch = self._watches.get(execution_arn)
+            if watch is None:
+                watch = _Watch(ExecutionTracker(execution_arn, self.client), self.min_interval)
+                self._watches[execution_arn] = watch
+            elif watch.last_update:
+                # Late subscribers start from the latest known status
+                subscription.updates.put(watch.last_update)
+            watch.subscriptions.append(subscription)
+            # Poll the execution straight away for the new subscriber
+            watch.interval = self.min_interval
+            watch.next_poll_at = 0
+        self._ensure_started()
+        self._wakeup.set()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            watch = self._watches.get(subscription.execution_arn)
+            if watch and subscription in watch.subscriptions:
+                watch.subscriptions.remove(subscription)
+                if not watch.subscriptions:
+                    del self._watches[subscription.execution_arn]
+
+    def watched_execution_arns(self):
+        with self._lock:
+            return list(self._watches.keys())
+
+    def is_running(self):
+        with self._lock:
+            return self._thread is not None and self._thread.is_alive()
+
+    def ensure_running(self):
+        """
+        Restarts the polling thread if it has stopped, for subscribers that have
+        not received an update for a while.
+        """
+        if not self.is_running():
+            logger.warning("Restarting the execution poller thread")
+            self._ensure_started()
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ExecutionPoller", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                delay = self.poll_once()
+            except Exception:
+                # The thread is shared by every session, so it must outlive any polling error
+                logger.exception("Error polling the watched executions")
+                delay = self.min_interval
+            self._wakeup.wait(timeout=delay)
+            self._wakeup.clear()
+
+    def poll_once(self, now=None):
+        """
+        Polls the watches that are due and returns the number of seconds until
+        the next one is.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            due_watches = [watch for watch in self._watches.values() if watch.next_poll_at <= now]
+
+        throttled = False
+        for watch in due_watches:
+            try:
+                new_events = watch.tracker.refresh()
+            except Exception as e:
+                if isinstance(e, ClientError) and e.response.get("Error", {}).get("Code") in throttling_error_codes:
+                    # Back off every watch while Step Functions is throttling the process
+                    self.throttle_delay = min(max(self.throttle_delay * 2, self.min_interval), self.max_throttle_delay)
+                    logger.warning("Throttled polling execution %s, backing off %ss",
+                                   watch.tracker.execution_arn, self.throttle_delay)
+                    throttled = True
+                    break
+                watch.failures += 1
+                if watch.failures >= self.max_failures:
+                    logger.error("Giving up polling execution %s after %d errors: %s",
+                                 watch.tracker.execution_arn, watch.failures, e)
+                    self._publish_error(watch, e)
+                    continue
+                logger.warning("Error polling execution %s: %s", watch.tracker.execution_arn, e)
+                watch.interval = min(watch.interval * self.backoff_factor, self.max_interval)
+                watch.next_poll_at = now + watch.interval
+                continue
+            watch.failures = 0
+            self.throttle_delay = self.throttle_delay / 2 if self.throttle_delay >= self.min_interval else 0
+
+            if new_events:
+                watch.interval = self.min_interval
+            else:
+                watch.interval = min(watch.interval * self.backoff_factor, self.max_interval)
+            watch.next_poll_at = now + watch.interval + self.throttle_delay
+            self._publish(watch, bool(new_events))
+
+        if throttled:
+            with self._lock:
+                for watch in self._watches.values():
+                    watch.next_poll_at = max(watch.next_poll_at, now + self.throttle_delay)
+
+        with self._lock:
+            if not self._watches:
+                return None
+            return max(min(watch.next_poll_at for watch in self._watches.values()) - now, 0)
+
+    def _publish(self, watch, changed):
+        completed = watch.tracker.is_completed()
+        if not changed and not completed and watch.last_update:
+            return
+        update = {
+            "execution": watch.tracker.execution,
+            "markdown": watch.tracker.get_status_markdown(),
+            "completed": completed,
+        }
+        with self._lock:
+            watch.last_update = update
+            subscriptions = list(watch.subscriptions)
+            if completed:
+                # Nothing left to poll once the execution has ended
+                self._watches.pop(watch.tracker.execution_arn, None)
+        for subscription in subscriptions:
+            subscription.updates.put(update)
+
+    def _publish_error(self, watch, error):
+        execution = watch.tracker.execution or {"executionArn": watch.tracker.execution_arn}
+        update = {
+            "execution": {**execution, "status": "UNKNOWN"},
+            "markdown": f"##### Status: ❌ The execution status could not be read\n\n{error}",
+            "completed": True,
+            "error": str(error),
+        }
+        with self._lock:
+            watch.last_update = update
+            subscriptions = list(watch.subscriptions)
+            self._watches.pop(watch.tracker.execution_arn, None)
+        for subscription in subscriptions:
+            subscription.updates.put(update)
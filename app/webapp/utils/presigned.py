@@ -0,0 +1,111 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import html
+import uuid
+
+from .execution_index import RAW_AUDIO_PREFIX
+from .upload import MB, MIN_PART_SIZE
+
+
+def get_upload_prefix(user_id):
+    # Each presigned upload gets its own folder under the user's prefix
+    return f"{RAW_AUDIO_PREFIX}{user_id}/{str(uuid.uuid4())[-12:]}/"
+
+
+def create_presigned_post(s3_client, bucket, user_id, max_size, expires_in):
+    """
+    Returns a presigned POST that lets the browser upload a single file of at
+    most max_size bytes directly to S3, under a fresh upload prefix of the user.
+    S3 replaces ${filename} in the key with the name of the uploaded file and
+    rejects keys outside the prefix, larger files and expired requests.
+    """
+    prefix = get_upload_prefix(user_id)
+    presigned_post = s3_client.generate_presigned_post(
+        Bucket=bucket,
+        Key=prefix + "${filename}",
+        Fields={"x-amz-meta-user-id": user_id, "success_action_status": "201"},
+        Conditions=[
+            {"x-amz-meta-user-id": user_id},
+            {"success_action_status": "201"},
+            ["content-length-range", 1, max_size],
+        ],
+        ExpiresIn=expires_in,
+    )
+    presigned_post["prefix"] = prefix
+    return presigned_post
+
+
+def create_presigned_multipart_upload(s3_client, bucket, user_id, file_name, size, expires_in, part_size=8 * MB):
+    """
+    Starts a multipart upload under a fresh upload prefix of the user and
+    returns a presigned URL per part, so a client can PUT the parts directly
+    to S3 and hand the ETags back to complete_presigned_multipart_upload.
+    """
+    key = get_upload_prefix(user_id) + file_name.replace(" ", "")
+    part_size = max(part_size, MIN_PART_SIZE)
+    upload_id = s3_client.create_multipart_upload(Bucket=bucket, Key=key, Metadata={"user-id": user_id})["UploadId"]
+    part_count = max((size + part_size - 1) // part_size, 1)
+    part_urls = [
+        s3_client.generate_presigned_url(
+            "upload_part",
+            Params={"Bucket": bucket, "Key": key, "UploadId": upload_id, "PartNumber": part_number},
+            ExpiresIn=expires_in,
+        )
+        for part_number in range(1, part_count + 1)
+    ]
+    return {"key": key, "upload_id": upload_id, "part_size": part_size, "part_urls": part_urls}
+
+
+def complete_presigned_multipart_upload(s3_client, bucket, key, upload_id, etags):
+    parts = [{"ETag": etag, "PartNumber": part_number} for part_number, etag in enumerate(etags, start=1)]
+    s3_client.complete_multipart_upload(
+        Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+    )
+    return key
+
+
+def find_uploaded_object(s3_client, bucket, prefix):
+    """
+    Returns the key of the file uploaded under a presigned upload prefix, or
+    None while the browser has not finished uploading it.
+    """
+    response = s3_client.list_objects_v2(Bucket=bucket, Prefix=prefix, MaxKeys=1)
+    contents = response.get("Contents", [])
+    return contents[0]["Key"] if contents else None
+
+
+def render_presigned_post_form(presigned_post, accept="audio/*,video/*"):
+    """
+    Returns an HTML form that posts the chosen file straight to S3 with the
+    presigned POST, for rendering with streamlit.components.v1.html.
+    """
+    hidden_fields = "\n".join(
+        f'<input type="hidden" name="{html.escape(name)}" value="{html.escape(value)}">'
+        for name, value in presigned_post["fields"].items()
+    )
+    return f"""
+<form id="upload-form" action="{html.escape(presigned_post['url'])}" method="post" enctype="multipart/form-data"
+      style="font-family: sans-serif;">
+  {hidden_fields}
+  <input type="file" name="file" accept="{html.escape(accept)}" required>
+  <button type="submit">Upload File</button>
+  <p id="upload-status"></p>
+</form>
+<script>
+  const form = document.getElementById("upload-form");
+  const status = document.getElementById("upload-status");
+  form.addEventListener("submit", async (event) => {{
+    event.preventDefault();
+    status.textContent = "Uploading file...";
+    try {{
+      const response = await fetch(form.action, {{method: "POST", body: new FormData(form)}});
+      status.textContent = response.ok
+        ? "File uploaded successfully! Click Get Recommendations to follow the analysis."
+        : "Upload failed (" + response.status + "). Please try again.";
+    }} catch (error) {{
+      status.textContent = "Upload failed: " + error;
+    }}
+  }});
+</script>
+"""
@@ -0,0 +1,46 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import time
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+from speech_analysis.result_cache import get_result_cache_key
+
+from .config_file import Config
+
+
+class ResultCache:
+    """
+    Results of the state machine stored in S3 by content hash of the recording.
+
+    The CombineLLMChainingOutput step writes result-cache/<hash>.json for
+    every upload stored with a SHA-256 checksum, so a recording that was
+    already analysed is answered from the cache without storing it again or
+    starting an execution. Entries older than ttl_seconds are ignored and are eventually
+    removed by the bucket lifecycle rule on the prefix.
+    """
+
+    def __init__(self, s3_client, bucket_name, ttl_seconds=Config.RESULT_CACHE_TTL_DAYS * 24 * 3600, clock=time.time):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+
+    def get(self, content_hash):
+        """
+        Returns the cached output for a content hash, or None when there is no
+        fresh entry.
+        """
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=get_result_cache_key(content_hash))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+        entry = json.loads(response["Body"].read())
+        created_at = datetime.fromisoformat(entry["created_at"]).timestamp()
+        if self.clock() - created_at >= self.ttl_seconds:
+            return None
+        return entry["output"]
@@ -1,152 +1,84 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-import boto3
 import json
 import time
 import uuid
 
-session = boto3.Session()
-sfn_client = session.client("stepfunctions")
-sts_client = session.client("sts")
-s3_client = session.client("s3")
+from .aws_registry import get_registry
+from .execution_history import ExecutionTracker, get_workflow_status_markdown
+from .execution_index import get_upload_key
+from .upload import UploadEngine
 
-default_region = boto3.session.Session().region_name
-print(f"Default region: {default_region}")
+# Nothing is resolved at import time: clients, region and SSM parameters are
+# looked up on first use through the registry, so the module imports offline.
+def get_sfn_client():
+    return get_registry().client("stepfunctions")
 
+def get_s3_client():
+    return get_registry().client("s3")
+
+def get_bedrock_runtime_client():
+    return get_registry().client("bedrock-runtime")
+
+def get_default_region():
+    return get_registry().region_name
+
+# SSM parameters are cached by the registry, so these only reach SSM once per TTL
 def get_s3_bucket():
-    ssm_client = boto3.client('ssm')
-    response = ssm_client.get_parameter(Name="/psmb/s3_bucket")
-    s3_bucket = response['Parameter']['Value']
-    return s3_bucket
+    return get_registry().get_parameter("/psmb/s3_bucket")
 
 def get_sfn_name():
-    ssm_client = boto3.client('ssm')
-    response = ssm_client.get_parameter(Name="/psmb/statemachine_arn")
-    sfn_arn = response['Parameter']['Value']
+    sfn_arn = get_registry().get_parameter("/psmb/statemachine_arn")
     return sfn_arn.split(':')[-1] # return only the name from the arn
 
-S3_BUCKET = get_s3_bucket()
+# Account ID of the caller, cached by the registry unless a specific STS client is given
+def get_account_id(sts_client=None):
+    if sts_client is None:
+        return get_registry().get_account_id()
+    return sts_client.get_caller_identity()['Account']
+
+_upload_engine = None
+
+def get_upload_engine():
+    global _upload_engine
+    if _upload_engine is None:
+        _upload_engine = UploadEngine(get_s3_client())
+    return _upload_engine
 
 # Function to upload the audio/video file to S3 bucket
-def upload_to_s3(file):
+# Returns the object key, which identifies the execution started for the upload.
+# An interrupted upload raises an UploadError whose state can be passed back as resume_state.
+# before_complete is called with the checksum of the file before the object is created; when it
+# returns False, for a recording whose result is cached, nothing is stored and None is returned.
+# The analysis depth, when given, is used by the state machine to route the prompts to a model.
+def upload_to_s3(file, user_id, progress_callback=None, resume_state=None, before_complete=None, batch=False, analysis_depth=None):
     file_name = file.name.replace(" ", "")
-    bucket_name = S3_BUCKET
-    key = f'raw-audio-files/{file_name}'
+    bucket_name = get_s3_bucket()
+    key = resume_state["key"] if resume_state else get_upload_key(user_id, file_name, batch)
+    metadata = {"user-id": user_id}
+    if analysis_depth:
+        metadata["analysis-depth"] = analysis_depth
     try:
-        s3_client.upload_fileobj(file, bucket_name, key)
-        return True
+        checksum = get_upload_engine().upload(
+            file,
+            bucket_name,
+            key,
+            file.size,
+            metadata=metadata,
+            progress_callback=progress_callback,
+            resume_state=resume_state,
+            before_complete=before_complete,
+        )
+        return key if checksum else None
     except Exception as e:
         print(f"Error uploading payload to S3: {e}")
         raise
 
-# Methods for displaying the state machine's execution history
-def find_task_id(event, events_by_id):
-    # The "Task" is the event where we first see the "Entered" state and which has a name
-    if event["type"] == "WaitStateEntered":
-        return {
-            "task_id": event["id"],
-            "task_name": "Wait a few seconds to complete previous task",
-        }
-    elif (
-        "stateEnteredEventDetails" in event
-        and "name" in event["stateEnteredEventDetails"]
-    ):
-        return {
-            "task_id": event["id"],
-            "task_name": event["stateEnteredEventDetails"]["name"],
-        }
-    else:
-        # Go back through the event history until we find the original TaskStateEntered/WaitStateEntered event for this task
-        previous_event_id = event["previousEventId"]
-        if previous_event_id not in events_by_id:
-            raise Exception(
-                f"Could not find previous event {previous_event_id} for event {event['id']}"
-            )
-        return find_task_id(events_by_id[previous_event_id], events_by_id)
-
-
-known_event_types = [
-    "TaskStateEntered",
-    "TaskScheduled",
-    "TaskStarted",
-    "TaskStartFailed",
-    "TaskFailed",
-    "TaskTimedOut",
-    "TaskSucceeded",
-    "WaitStateEntered",
-    "WaitStateExited",
-]
-
-def get_task_status(event_type):
-    if (
-        event_type == "TaskStateEntered"
-        or event_type == "TaskScheduled"
-        or event_type == "TaskStarted"
-        or event_type == "WaitStateEntered"
-    ):
-        return ":arrows_counterclockwise:"
-    elif (
-        event_type == "TaskStartFailed"
-        or event_type == "TaskFailed"
-        or event_type == "TaskTimedOut"
-    ):
-        return ":no_entry:"
-    elif event_type == "TaskSucceeded" or event_type == "WaitStateExited":
-        return ":white_check_mark:"
-    raise Exception(f"Unknown event type {event_type}")
-
-
-def get_workflow_status_icon(status):
-    if status == "RUNNING":
-        return ":arrows_counterclockwise:"
-    elif status == "FAILED" or status == "TIMED_OUT" or status == "ABORTED":
-        return ":no_entry:"
-    elif status == "SUCCEEDED":
-        return ":white_check_mark:"
-    raise Exception(f"Unknown event type {status}")
-
-# def get_workflow_status_markdown(execution, execution_events):
-#     markdown = f"##### Status: {get_workflow_status_icon(execution['status'])} {execution['status'].title()}"
-#     return markdown
-
-def get_workflow_status_markdown(execution, execution_events):
-    markdown = f"##### Status: {get_workflow_status_icon(execution['status'])} {execution['status'].title()}"
-    markdown += f"\n\n##### Tasks"
-
-    # Keep a dictionary of events: event ID -> event details
-    events_by_id = {}
-    for event in execution_events:
-        events_by_id[event["id"]] = event
-
-    # Keep a dictionary of tasks: task ID -> state (running, failed, succeeded) and name
-    task_status = {}
-
-    # Determine the state of each unique task and its unique task name
-    for event in execution_events:
-        if event["type"] not in known_event_types:
-            continue
-        task = find_task_id(event, events_by_id)
-        status = get_task_status(event["type"])
-        task_status[task["task_id"]] = {
-            "task_id": task["task_id"],
-            "task_name": task["task_name"],
-            "task_status": status,
-        }
-
-    # Display the task status
-    task_ids = list(task_status.keys())
-    task_ids.sort()
-    for task_id in task_ids:
-        task = task_status[task_id]
-        markdown += f"\n\n{task['task_status']} {task['task_name'].replace(' (Invoke Model)', '')}"
-
-    return markdown
-
-
 # Construct the state machine ARN by querying the region and account ID
-def get_state_machine_arn(name, region=default_region, sts_client=sts_client):
-    return f"arn:aws:states:{region}:{sts_client.get_caller_identity()['Account']}:stateMachine:{name}"
+def get_state_machine_arn(name, region=None, sts_client=None):
+    region = region or get_default_region()
+    return f"arn:aws:states:{region}:{get_account_id(sts_client)}:stateMachine:{name}"
 
 
 # Construct a unique execution name from the Streamlit session ID
@@ -154,43 +86,20 @@ def get_execution_name(session_id):
     return f"streamlit-{session_id}-{str(uuid.uuid4())[-12:]}"
 
 
-def get_execution_arn(state_machine_name, execution_name, region=default_region, sts_client=sts_client):
-    return f"arn:aws:states:{region}:{sts_client.get_caller_identity()['Account']}:execution:{state_machine_name}:{execution_name}"
-
-def get_running_execution_arn(state_machine_name, region=default_region, sts_client=sts_client):
-    response = sfn_client.list_executions(
-        stateMachineArn=get_state_machine_arn(state_machine_name, region, sts_client),
-        maxResults=1000,
-        statusFilter="RUNNING",
-    )
-    if len(response["executions"]) > 0:
-        return response["executions"][0]["executionArn"]
-    else:
-        return None
-    
-
-def list_running_executions(state_machine_name, client=sfn_client, region=default_region, sts_client=sts_client):
-    response = client.list_executions(
-        stateMachineArn=get_state_machine_arn(state_machine_name, region, sts_client),
-        maxResults=1000,
-        statusFilter="RUNNING",
-    )
-
-    if len(response["executions"]) > 0:
-        return response["executions"][0]
-    else:
-        return None
-    
+def get_execution_arn(state_machine_name, execution_name, region=None, sts_client=None):
+    region = region or get_default_region()
+    return f"arn:aws:states:{region}:{get_account_id(sts_client)}:execution:{state_machine_name}:{execution_name}"
 
 
 def start_execution(
     state_machine_name,
     session_id,
     input,
-    client=sfn_client,
-    region=default_region,
-    sts_client=sts_client,
+    client=None,
+    region=None,
+    sts_client=None,
 ):
+    client = client or get_sfn_client()
     response = client.start_execution(
         stateMachineArn=get_state_machine_arn(state_machine_name, region, sts_client),
         name=get_execution_name(session_id),
@@ -199,61 +108,50 @@ def start_execution(
     return response["executionArn"]
 
 
-def continue_execution(task_token, task_output, client=sfn_client):
+def continue_execution(task_token, task_output, client=None):
+    client = client or get_sfn_client()
     client.send_task_success(
         taskToken=task_token,
         output=json.dumps(task_output),
     )
 
 
-def describe_execution(execution_arn, client=sfn_client):
-    execution = client.describe_execution(executionArn=execution_arn)
-    execution_events = []
-    paginator = client.get_paginator("get_execution_history")
-    for page in paginator.paginate(
-        executionArn=execution_arn, includeExecutionData=False
-    ):
-        execution_events += page["events"]
-    return get_workflow_status_markdown(execution, execution_events)
+def describe_execution(execution_arn, client=None):
+    client = client or get_sfn_client()
+    tracker = ExecutionTracker(execution_arn, client)
+    tracker.update()
+    return tracker.get_status_markdown()
 
 
-def poll_for_execution_completion(execution_arn, callback_fn=None, client=sfn_client):
+def poll_for_execution_completion(execution_arn, callback_fn=None, client=None):
+    client = client or get_sfn_client()
+    # The tracker only reads the history events added since the previous tick
+    tracker = ExecutionTracker(execution_arn, client)
     while True:
-        execution = client.describe_execution(executionArn=execution_arn)
+        execution = tracker.update(include_history=callback_fn is not None)
 
         if callback_fn:
-            execution_events = []
-            paginator = client.get_paginator("get_execution_history")
-            for page in paginator.paginate(
-                executionArn=execution_arn, includeExecutionData=False
-            ):
-                execution_events += page["events"]
-            
-            callback_fn(get_workflow_status_markdown(execution, execution_events))
+            callback_fn(tracker.get_status_markdown())
         
-        if execution["status"] and execution["status"] != "RUNNING":
+        if tracker.is_completed():
             return execution
         time.sleep(1) # nosemgrep 
 
 
 def poll_for_execution_task_token_or_completion(
-    execution_arn, callback_fn=None, client=sfn_client
+    execution_arn, callback_fn=None, client=None
 ):
+    client = client or get_sfn_client()
+    tracker = ExecutionTracker(execution_arn, client)
     while True:
         # Check if execution is still running
         # When the execution is waiting on a task token, its status is still RUNNING.
-        response = client.describe_execution(executionArn=execution_arn)
+        response = tracker.update(include_history=callback_fn is not None)
 
         if callback_fn:
-            execution_events = []
-            paginator = client.get_paginator("get_execution_history")
-            for page in paginator.paginate(
-                executionArn=execution_arn, includeExecutionData=False
-            ):
-                execution_events += page["events"]
-            callback_fn(get_workflow_status_markdown(response, execution_events))
-
-        if response["status"] and response["status"] != "RUNNING":
+            callback_fn(tracker.get_status_markdown())
+
+        if tracker.is_completed():
             return response
 
         # Check if execution is waiting on a task token
@@ -281,6 +179,7 @@ def poll_for_execution_task_token_or_completion(
         time.sleep(1) # nosemgrep 
 
 
-def is_execution_completed(execution_arn, client=sfn_client):
+def is_execution_completed(execution_arn, client=None):
+    client = client or get_sfn_client()
     response = client.describe_execution(executionArn=execution_arn)
     return response["status"] and response["status"] != "RUNNING"
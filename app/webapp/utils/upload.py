@@ -0,0 +1,237 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import base64
+import hashlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from botocore.exceptions import ClientError
+
+from .config_file import Config
+
+MB = 1024 * 1024
+# S3 rejects multipart uploads whose parts (other than the last one) are smaller than this
+MIN_PART_SIZE = 5 * MB
+
+
+class UploadError(Exception):
+    """
+    Raised when an upload could not be completed. The state attribute holds
+    what is needed to resume it with UploadEngine.upload(resume_state=...).
+    """
+
+    def __init__(self, message, state=None):
+        super().__init__(message)
+        self.state = state
+
+
+def sha256_base64(data):
+    return base64.b64encode(hashlib.sha256(data).digest()).decode("ascii")
+
+
+def composite_checksum(part_checksums):
+    # S3 checksum of a multipart object: the hash of the concatenated part hashes, suffixed with the part count
+    digests = b"".join(base64.b64decode(checksum) for checksum in part_checksums)
+    return f"{sha256_base64(digests)}-{len(part_checksums)}"
+
+
+def is_same_part(uploaded_part, data, checksum):
+    # ListParts returns the part checksum when the upload was created with one;
+    # otherwise fall back to the ETag, which is the MD5 of unencrypted or SSE-S3 parts
+    if uploaded_part.get("ChecksumSHA256"):
+        return uploaded_part["ChecksumSHA256"] == checksum
+    return uploaded_part.get("ETag", "").strip('"') == hashlib.md5(data, usedforsecurity=False).hexdigest()
+
+
+def default_transfer_config():
+    from boto3.s3.transfer import TransferConfig
+    return TransferConfig(
+        multipart_threshold=Config.UPLOAD_MULTIPART_THRESHOLD_MB * MB,
+        multipart_chunksize=Config.UPLOAD_PART_SIZE_MB * MB,
+        max_concurrency=Config.UPLOAD_MAX_CONCURRENCY,
+    )
+
+
+class UploadEngine:
+    """
+    Uploads files to S3 with parallel, individually retried and resumable
+    multipart uploads.
+
+    Part size, concurrency and the multipart threshold come from a boto3
+    TransferConfig. Every part is sent with its SHA-256 checksum, which S3
+    verifies on receipt, and the checksum of the completed object is compared
+    with the one computed locally. When a part still fails after
+    max_part_attempts, the multipart upload is left open and the UploadError
+    carries the state needed to resume it: only the parts that S3 does not
+    already have are sent again.
+
+    Progress callbacks receive the number of bytes uploaded so far and are
+    always called from the thread that called upload(), so they can update
+    Streamlit elements.
+
+    The checksum of the content is computed from the parts as they are read
+    for the upload, so the file is read only once. It is passed to the
+    before_complete callback before the object is created: when the callback
+    returns False, the upload is abandoned and no object is stored.
+    """
+
+    def __init__(self, s3_client, transfer_config=None, max_part_attempts=3, retry_delay=0.5):
+        self.s3_client = s3_client
+        self.transfer_config = transfer_config or default_transfer_config()
+        self.max_part_attempts = max_part_attempts
+        self.retry_delay = retry_delay
+
+    @property
+    def part_size(self):
+        return max(self.transfer_config.multipart_chunksize, MIN_PART_SIZE)
+
+    def upload(self, fileobj, bucket, key, size, metadata=None, progress_callback=None, resume_state=None, state_callback=None,
+               before_complete=None):
+        """
+        Uploads size bytes of fileobj to s3://bucket/key and returns the
+        checksum of the stored object, or None when before_complete returned
+        False.
+        """
+        if resume_state is None and size < self.transfer_config.multipart_threshold:
+            return self._put_object(fileobj, bucket, key, metadata, progress_callback, before_complete)
+        return self._multipart_upload(fileobj, bucket, key, size, metadata, progress_callback, resume_state, state_callback,
+                                      before_complete)
+
+    def abort(self, state):
+        self.s3_client.abort_multipart_upload(Bucket=state["bucket"], Key=state["key"], UploadId=state["upload_id"])
+
+    def _put_object(self, fileobj, bucket, key, metadata, progress_callback, before_complete):
+        fileobj.seek(0)
+        data = fileobj.read()
+        checksum = sha256_base64(data)
+        if before_complete and before_complete(checksum) is False:
+            return None
+        self._with_retries(lambda: self.s3_client.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=data,
+            Metadata=metadata or {},
+            ChecksumAlgorithm="SHA256",
+            ChecksumSHA256=checksum,
+        ))
+        if progress_callback:
+            progress_callback(len(data))
+        return checksum
+
+    def _multipart_upload(self, fileobj, bucket, key, size, metadata, progress_callback, resume_state, state_callback,
+                          before_complete):
+        state = None
+        if resume_state:
+            try:
+                uploaded_parts = self._list_uploaded_parts(resume_state)
+                state = resume_state
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "NoSuchUpload":
+                    raise
+                # The interrupted upload expired or was aborted, start over
+                print(f"Cannot resume upload {resume_state['upload_id']}, starting a new one")
+        if state is None:
+            response = self.s3_client.create_multipart_upload(
+                Bucket=bucket, Key=key, Metadata=metadata or {}, ChecksumAlgorithm="SHA256"
+            )
+            state = {
+                "bucket": bucket,
+                "key": key,
+                "size": size,
+                "part_size": self.part_size,
+                "upload_id": response["UploadId"],
+            }
+            uploaded_parts = {}
+        if state_callback:
+            state_callback(state)
+
+        part_size = state["part_size"]
+        part_count = max((size + part_size - 1) // part_size, 1)
+        read_lock = threading.Lock()
+        completed_parts = {}
+        uploaded_bytes = 0
+
+        def read_part(part_number):
+            offset = (part_number - 1) * part_size
+            with read_lock:
+                fileobj.seek(offset)
+                return fileobj.read(min(part_size, size - offset))
+
+        def upload_part(part_number):
+            data = read_part(part_number)
+            checksum = sha256_base64(data)
+            # Parts already stored by an interrupted upload are kept if their content is unchanged
+            uploaded = uploaded_parts.get(part_number)
+            if uploaded and is_same_part(uploaded, data, checksum):
+                return part_number, uploaded["ETag"], checksum, len(data)
+            response = self._with_retries(lambda: self.s3_client.upload_part(
+                Bucket=state["bucket"],
+                Key=state["key"],
+                UploadId=state["upload_id"],
+                PartNumber=part_number,
+                Body=data,
+                ChecksumAlgorithm="SHA256",
+                ChecksumSHA256=checksum,
+            ))
+            return part_number, response["ETag"], checksum, len(data)
+
+        with ThreadPoolExecutor(max_workers=self.transfer_config.max_concurrency) as executor:
+            pending = {executor.submit(upload_part, part_number) for part_number in range(1, part_count + 1)}
+            failure = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        part_number, etag, checksum, length = future.result()
+                    except Exception as e:
+                        failure = failure or e
+                        continue
+                    completed_parts[part_number] = {"ETag": etag, "PartNumber": part_number, "ChecksumSHA256": checksum}
+                    uploaded_bytes += length
+                if progress_callback and done:
+                    progress_callback(uploaded_bytes)
+                if failure:
+                    for future in pending:
+                        future.cancel()
+                    raise UploadError(f"Upload of s3://{bucket}/{key} interrupted: {failure}", state) from failure
+
+        parts = [completed_parts[part_number] for part_number in sorted(completed_parts)]
+        expected_checksum = composite_checksum([part["ChecksumSHA256"] for part in parts])
+        if before_complete and before_complete(expected_checksum) is False:
+            self.abort(state)
+            return None
+        response = self.s3_client.complete_multipart_upload(
+            Bucket=state["bucket"],
+            Key=state["key"],
+            UploadId=state["upload_id"],
+            MultipartUpload={"Parts": parts},
+        )
+        stored_checksum = response.get("ChecksumSHA256")
+        if stored_checksum and stored_checksum != expected_checksum:
+            raise UploadError(
+                f"Checksum mismatch for s3://{bucket}/{key}: expected {expected_checksum}, got {stored_checksum}"
+            )
+        return expected_checksum
+
+    def _list_uploaded_parts(self, state):
+        uploaded_parts = {}
+        request = {"Bucket": state["bucket"], "Key": state["key"], "UploadId": state["upload_id"]}
+        while True:
+            response = self.s3_client.list_parts(**request)
+            for part in response.get("Parts", []):
+                uploaded_parts[part["PartNumber"]] = part
+            if not response.get("IsTruncated"):
+                return uploaded_parts
+            request["PartNumberMarker"] = response["NextPartNumberMarker"]
+
+    def _with_retries(self, call):
+        for attempt in range(1, self.max_part_attempts + 1):
+            try:
+                return call()
+            except Exception as e:
+                if attempt == self.max_part_attempts:
+                    raise
+                print(f"Upload request failed (attempt {attempt}/{self.max_part_attempts}): {e}")
+                time.sleep(self.retry_delay * 2 ** (attempt - 1)) # nosemgrep
@@ -1,15 +1,32 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
+import queue
+import time
 import uuid
 import json
-import time
 import streamlit as st
+import streamlit.components.v1 as components
 from botocore.exceptions import ClientError
+from speech_analysis.result_cache import get_content_hash
 
+import utils.bedrock_stream as bedrock_stream
+import utils.live_transcription as live_transcription
+import utils.presigned as presigned
 import utils.stepfn as stepfn
+from utils.admission_queue import AdmissionQueue
 from utils.auth import Auth
 from utils.config_file import Config
+from utils.execution_index import ExecutionIndex
+from utils.poller import ExecutionPoller
+from utils.result_cache import ResultCache
+from utils.upload import UploadError
+
+try:
+    import av
+    from streamlit_webrtc import WebRtcMode, webrtc_streamer
+except ImportError:
+    webrtc_streamer = None
 
 
 st.set_page_config(layout="wide")
@@ -44,7 +61,6 @@ with st.sidebar:
 
 
 execution_status_container = None
-sfn_name = stepfn.get_sfn_name()
 
 
 # Populate a unique user ID to use for naming the Step Functions execution
@@ -79,13 +95,211 @@ def display_no_state_machine_status():
 #         execution_arn, display_state_machine_status
 #     )
 
-def get_state_machine_status():
-    execution_arn = stepfn.get_running_execution_arn(sfn_name)
+# One poller per process watches the executions of every session
+@st.cache_resource
+def get_execution_poller():
+    return ExecutionPoller(stepfn.get_sfn_client())
+
+
+# Uploads are mapped to their execution through the index written by the state machine
+@st.cache_resource
+def get_execution_index():
+    return ExecutionIndex(stepfn.get_s3_client(), stepfn.get_s3_bucket())
+
+
+# Recordings that were already analysed are answered from the result cache
+@st.cache_resource
+def get_result_cache():
+    return ResultCache(stepfn.get_s3_client(), stepfn.get_s3_bucket())
+
+
+# Uploads wait in the admission queue until there is a free execution slot
+@st.cache_resource
+def get_admission_queue():
+    return AdmissionQueue(stepfn.get_s3_client(), stepfn.get_s3_bucket())
+
+
+def wait_for_admission(object_key, timeout=60):
+    # Shows the queue position of the upload until its execution starts. Gives up
+    # after timeout seconds without the upload being queued or started.
+    deadline = time.monotonic() + timeout
+    while True:
+        execution_arn = get_execution_index().get_execution_arn(object_key, timeout=5)
+        if execution_arn is not None:
+            return execution_arn
+        queued = get_admission_queue().get_position(object_key)
+        if queued is not None:
+            deadline = time.monotonic() + timeout
+            display_state_machine_status(
+                f"⏳ Waiting to start: position {queued['position']} of {queued['waiting']} in the queue")
+        elif time.monotonic() >= deadline:
+            return None
+
+
+def get_state_machine_status(object_key):
+    if Config.ADMISSION_CONTROL:
+        execution_arn = wait_for_admission(object_key)
+    else:
+        execution_arn = get_execution_index().get_execution_arn(object_key)
     print(f"execution_arn: {execution_arn}")
+    if execution_arn is None:
+        return {"status": "NOT_STARTED"}
     st.session_state.psmb_exeuction_arn = execution_arn
-    return stepfn.poll_for_execution_completion(
-        execution_arn, display_state_machine_status
-    )
+    poller = get_execution_poller()
+    subscription = poller.subscribe(execution_arn)
+    try:
+        while True:
+            try:
+                update = subscription.get(timeout=Config.EXECUTION_UPDATE_TIMEOUT_SECONDS)
+            except queue.Empty:
+                # Idle executions publish no update, but the poller thread may also have died
+                poller.ensure_running()
+                continue
+            display_state_machine_status(update["markdown"])
+            if update["completed"]:
+                return update["execution"]
+    finally:
+        subscription.close()
+
+
+def stream_speech_recommendations(object_key):
+    # Returns False when the feedback could not be streamed, to fall back to the state machine output
+    with st.spinner("Transcribing your speech..."):
+        transcription = bedrock_stream.wait_for_transcription(
+            stepfn.get_s3_client(), stepfn.get_s3_bucket(), object_key
+        )
+    if transcription is None:
+        return False
+
+    stream = bedrock_stream.FeedbackStream.from_transcription(stepfn.get_bedrock_runtime_client(), transcription)
+    try:
+        st.subheader("🚀 Speech Recommendations")
+        st.write_stream(stream.feedback())
+        st.subheader("Speech Rewrite Suggestion")
+        st.write_stream(stream.rewrite())
+    except ClientError as e:
+        print(f"Error streaming speech recommendations: {e}")
+        st.warning("The speech recommendations could not be streamed, waiting for the analysis to complete.")
+        return False
+    st.success("Done!")
+    return True
+
+
+def display_speech_recommendations(object_key):
+    if Config.STREAMING_FEEDBACK and stream_speech_recommendations(object_key):
+        return
+
+    # Start polling Step Function status
+    with st.spinner("Wait for it..."):
+        if "psmb_exeuction_arn" in st.session_state:
+            del st.session_state["psmb_exeuction_arn"]
+        display_no_state_machine_status()
+
+        response = get_state_machine_status(object_key)
+
+        st.session_state.psmb_exeuction_status = response["status"]
+        if response["status"] == "SUCCEEDED":
+            output = json.loads(response["output"])
+            st.session_state.psmb_content = output
+
+    if st.session_state.psmb_exeuction_status == "SUCCEEDED":
+        st.success("Done!")
+        st.subheader("🚀 Speech Recommendations")
+        st.write(st.session_state.psmb_content)
+    else:
+        st.error("The speech recommendations could not be generated. Please try again.")
+
+
+def direct_upload():
+    # The browser posts the file straight to S3, the webapp only confirms it has arrived
+    if "psmb_presigned_post" not in st.session_state:
+        st.session_state.psmb_presigned_post = presigned.create_presigned_post(
+            stepfn.get_s3_client(),
+            stepfn.get_s3_bucket(),
+            st.session_state.user_id,
+            max_size=200 * 1024 * 1024,  # 200MB limit
+            expires_in=Config.PRESIGNED_UPLOAD_EXPIRES_SECONDS,
+        )
+    presigned_post = st.session_state.psmb_presigned_post
+    components.html(presigned.render_presigned_post_form(presigned_post), height=120)
+
+    if st.button("Get Recommendations"):
+        object_key = presigned.find_uploaded_object(
+            stepfn.get_s3_client(), stepfn.get_s3_bucket(), presigned_post["prefix"]
+        )
+        if object_key is None:
+            st.error("No uploaded file found yet. Please upload your file first.")
+            return
+        # The next upload gets a new presigned POST and upload prefix
+        del st.session_state["psmb_presigned_post"]
+        display_speech_recommendations(object_key)
+
+
+def display_rehearsal_stats(container, analyzer):
+    stats = analyzer.stats()
+    with container.container():
+        words_col, pace_col, fillers_col = st.columns(3)
+        words_col.metric("Words", stats["words"])
+        pace_col.metric("Words per minute", f"{stats['recent_words_per_minute']:.0f}")
+        fillers_col.metric("Filler words", stats["filler_words"])
+        if stats["words"]:
+            st.caption(live_transcription.describe_pace(stats["recent_words_per_minute"]))
+        if stats["fillers"]:
+            st.caption(", ".join(f"{filler}: {count}" for filler, count in stats["fillers"].items()))
+        st.write(analyzer.transcript)
+
+
+def transcribe_rehearsal(audio_chunks, sample_rate, analyzer, stats_container):
+    transcriber = live_transcription.TranscribeStreamingTranscriber(stepfn.get_default_region(), sample_rate=sample_rate)
+    for result in transcriber.transcribe(audio_chunks):
+        analyzer.update(result)
+        stats_container.empty()
+        display_rehearsal_stats(stats_container, analyzer)
+
+
+def live_rehearsal():
+    # Streams the audio to Transcribe while the speaker talks, then the Bedrock feedback on the full transcript
+    if live_transcription.TranscribeStreamingClient is None:
+        st.error("Live rehearsal needs the amazon-transcribe package. Please install the requirements of the webapp.")
+        return
+    stats_container = st.empty()
+    if webrtc_streamer is not None:
+        webrtc_ctx = webrtc_streamer(key="psmb-live-rehearsal", mode=WebRtcMode.SENDONLY,
+                                     media_stream_constraints={"audio": True, "video": False})
+        if webrtc_ctx.state.playing:
+            # The analyzer is kept in the session, as stopping the recording reruns the
+            # script and interrupts the transcription below
+            analyzer = live_transcription.RehearsalAnalyzer()
+            st.session_state.psmb_rehearsal_analyzer = analyzer
+            sample_rate = Config.LIVE_SAMPLE_RATE_HZ
+            resampler = av.AudioResampler(format="s16", layout="mono", rate=sample_rate)
+            audio_chunks = live_transcription.pcm_chunks_from_receiver(webrtc_ctx.audio_receiver, resampler)
+            transcribe_rehearsal(audio_chunks, sample_rate, analyzer, stats_container)
+            del st.session_state["psmb_rehearsal_analyzer"]
+        else:
+            # The first run after the recording stopped gives the feedback on what was transcribed
+            analyzer = st.session_state.pop("psmb_rehearsal_analyzer", None)
+            if analyzer is None:
+                st.info("Start recording, and stop it to get recommendations on your rehearsal.")
+                return
+            display_rehearsal_stats(stats_container, analyzer)
+    else:
+        recording = st.audio_input("Record your rehearsal")
+        if recording is None:
+            return
+        sample_rate, audio_chunks = live_transcription.pcm_chunks_from_wav(recording.getvalue())
+        analyzer = live_transcription.RehearsalAnalyzer()
+        transcribe_rehearsal(audio_chunks, sample_rate, analyzer, stats_container)
+
+    if not analyzer.transcript:
+        st.warning("No speech was transcribed. Please try again.")
+        return
+    stream = bedrock_stream.FeedbackStream(stepfn.get_bedrock_runtime_client(), analyzer.transcript)
+    st.subheader("🚀 Speech Recommendations")
+    st.write_stream(stream.feedback())
+    st.subheader("Speech Rewrite Suggestion")
+    st.write_stream(stream.rewrite())
+    st.success("Done!")
 
 
 demo_col, behind_the_scenes_col = st.columns(spec=[1, 1], gap="large")
@@ -105,10 +319,18 @@ with behind_the_scenes_col:
     
 
 with demo_col:
-    
+
+    if Config.LIVE_REHEARSAL and st.toggle("Live rehearsal"):
+        live_rehearsal()
+        st.stop()
+
     st.info(
         "Please upload your Audio or Video files to generate recommendations about your speech delivery."
     )
+    if Config.UPLOAD_MODE == "direct":
+        direct_upload()
+        st.stop()
+
     # File uploader
     #uploaded_file = st.file_uploader("Choose a file", type=["audio/*", "video/*"], accept_multiple_files=False)
     uploaded_file = st.file_uploader("Choose an Audio or Video file", accept_multiple_files=False)
@@ -120,36 +342,66 @@ with demo_col:
             # File size validation
             if uploaded_file.size <= 200 * 1024 * 1024:  # 200MB limit
                 # Submit button
+                batch = Config.BATCH_INFERENCE and st.checkbox(
+                    "Workshop batch: analyse with the other recordings of the batch, at a lower cost but within hours")
+                # Short speeches and quick reviews are routed to a faster model
+                analysis_depth = None
+                if Config.BEDROCK_MODEL_ROUTES:
+                    analysis_depth = st.radio("Analysis depth", ["quick", "standard", "detailed"], index=1,
+                                              format_func=str.capitalize, horizontal=True)
                 submitted = st.button("Upload File")
                 if submitted:
-                    # Display spinner
-                    with st.spinner("Uploading file..."):
+                    # The checksum of the file, computed as it is uploaded, identifies a recording
+                    # already analysed, which is then not stored and gets no new execution
+                    cached_outputs = []
+
+                    def find_cached_output(checksum):
+                        cached_output = get_result_cache().get(get_content_hash(checksum))
+                        if cached_output is not None:
+                            cached_outputs.append(cached_output)
+                        return cached_output is None
+
+                    # Display upload progress
+                    progress_bar = st.progress(0.0, text="Uploading file...")
+
+                    def display_upload_progress(uploaded_bytes):
+                        progress_bar.progress(min(uploaded_bytes / uploaded_file.size, 1.0), text="Uploading file...")
+
+                    # Interrupted uploads are resumed when the same file is uploaded again
+                    interrupted_uploads = st.session_state.setdefault("psmb_interrupted_uploads", {})
+                    upload_id = f"{uploaded_file.name}-{uploaded_file.size}"
+                    try:
                         # Call function to upload file to S3
-                        stepfn.upload_to_s3(uploaded_file)
+                        object_key = stepfn.upload_to_s3(
+                            uploaded_file,
+                            st.session_state.user_id,
+                            progress_callback=display_upload_progress,
+                            resume_state=interrupted_uploads.get(upload_id),
+                            before_complete=find_cached_output if Config.RESULT_CACHE_TTL_DAYS else None,
+                            batch=batch,
+                            analysis_depth=analysis_depth,
+                        )
+                    except UploadError as e:
+                        if e.state:
+                            interrupted_uploads[upload_id] = e.state
+                        st.error("The upload was interrupted. Click Upload File again to resume it.")
+                        st.stop()
+                    interrupted_uploads.pop(upload_id, None)
+                    progress_bar.empty()
+                    if cached_outputs:
+                        st.success(f"File '{uploaded_file.name}' was already analysed!")
+                        st.subheader("🚀 Speech Recommendations")
+                        st.write(cached_outputs[0])
+                        st.stop()
 
                     # Display result
                     st.success(f"File '{uploaded_file.name}' uploaded successfully!")
 
-                    # Start polling Step Function status
-                    with st.spinner("Wait for it..."):
-                        if "psmb_exeuction_arn" in st.session_state:
-                            del st.session_state["psmb_exeuction_arn"]
-                        display_no_state_machine_status()
-
-                        time.sleep(2)   # nosemgrep  
-                        response = get_state_machine_status()
-
-                        st.session_state.psmb_exeuction_status = response["status"]
-                        if response["status"] == "SUCCEEDED":
-                            output = json.loads(response["output"])
-                            st.session_state.psmb_content = output
-
-                    if st.session_state.psmb_exeuction_status == "SUCCEEDED":
-                        st.success("Done!")
-                        st.subheader("🚀 Speech Recommendations")
-                        st.write(st.session_state.psmb_content)
-                    else:
-                        st.error("The speech recommendations could not be generated. Please try again.")
+                    # Batch results are published to the SNS topic once the batch job has ended
+                    if batch:
+                        st.info("Your recording is queued with the workshop batch. Its speech recommendations will be sent once the batch has been analysed.")
+                        st.stop()
+                    display_speech_recommendations(object_key)
             else:
                 st.error("File size exceeds the 10MB limit.")
         else: